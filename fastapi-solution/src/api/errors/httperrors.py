@@ -5,3 +5,10 @@ from fastapi import HTTPException
 GenreHTTPNotFoundError = HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Genre(s) not found')
 FilmHTTPNotFoundError = HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Film(s) not found')
 PersonHTTPNotFoundError = HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Person(s) not found')
+InvalidCursorHTTPError = HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Invalid or expired page cursor')
+AdminHTTPForbiddenError = HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Invalid admin token')
+StorageHTTPUnavailableError = HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                                            detail='Storage is temporarily unavailable')
+StorageHTTPOverloadedError = HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                                           detail='Storage is overloaded, retry later')
+DeadlineHTTPExceededError = HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT, detail='Request deadline exceeded')
@@ -37,6 +37,7 @@ class ListResponseModel(BaseModel):
     current_page: int
     total_page: int
     page_size: int
+    next_cursor: Optional[str] = None
 
 
 class FilmRespModel(BaseModel):
@@ -56,3 +57,25 @@ class FilmsResponseModel(BaseModel):
     page_number: int
     page_size: int
     records: List[FilmRespModel]
+    next_cursor: Optional[str] = None
+
+
+class IdsRequestModel(BaseModel):
+    ids: List[str] = Field(..., min_items=1, max_items=100)
+
+
+class FilmsBatchResponseModel(BaseModel):
+    records: List[Optional[FilmRespModel]]
+
+
+class PersonsBatchResponseModel(BaseModel):
+    records: List[Optional[Person]]
+
+
+class GenresBatchResponseModel(BaseModel):
+    records: List[Optional[Genre]]
+
+
+class CacheGenerationModel(BaseModel):
+    index: str
+    generation: int
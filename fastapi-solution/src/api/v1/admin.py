@@ -0,0 +1,75 @@
+import secrets
+from enum import Enum
+from typing import Optional
+
+from api.errors.httperrors import AdminHTTPForbiddenError
+from api.models.resp_models import CacheGenerationModel
+from core import config
+from fastapi import APIRouter, Depends, Header, Path
+from pkg.cache_generation.generations import (CacheGenerations,
+                                              get_cache_generations)
+from pkg.snapshot.index_snapshot import IndexSnapshot
+from pydantic import Required
+from services.genre import GENRES_INDEX_NAME, get_genre_snapshot
+
+router = APIRouter()
+
+IndexName = Enum('IndexName', {name: name for name in config.CACHE_GENERATION_INDEXES}, type=str)
+
+
+async def check_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """Проверка токена служебных методов, без токена в настройках они недоступны.
+
+    Args:
+        x_admin_token: значение заголовка X-Admin-Token
+    """
+    if not config.ADMIN_API_TOKEN or x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), config.ADMIN_API_TOKEN.encode()
+    ):
+        raise AdminHTTPForbiddenError
+
+
+@router.post(
+    '/cache/generations/{index_name}',
+    response_model=CacheGenerationModel,
+    dependencies=[Depends(check_admin_token)],
+    tags=["admin"],
+    responses={
+        200: {
+            "description": "New cache generation of the index",
+        },
+        403: {
+            "description": "Forbidden",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid admin token"}
+                }
+            },
+        },
+    },
+)
+async def bump_cache_generation(
+        index_name: IndexName = Path(
+            default=Required,
+            title="Index name",
+            description="Index that has been reloaded.",
+            example="movies",
+        ),
+        generations: CacheGenerations = Depends(get_cache_generations),
+        genre_snapshot: Optional[IndexSnapshot] = Depends(get_genre_snapshot)) -> CacheGenerationModel:
+    """Увеличение поколения кэша индекса после переиндексации.
+
+    Все записи кэша, построенные по данным индекса, становятся недостижимыми,
+    снимок жанров в памяти этого экземпляра перезагружается сразу.
+
+    Args:
+        index_name: IndexName
+        generations: CacheGenerations
+        genre_snapshot: снимок индекса жанров
+    Returns: CacheGenerationModel
+
+    """
+    generation = await generations.bump(index_name.value)
+    if index_name.value == GENRES_INDEX_NAME and genre_snapshot is not None:
+        await genre_snapshot.load()
+    return CacheGenerationModel(index=index_name.value, generation=generation)
@@ -1,17 +1,53 @@
 import math
 from enum import Enum
 from pydantic import Required
-from typing import List, Union
+from typing import List, Optional, Tuple, Union
 
 from fastapi import APIRouter, Depends, Query, Path
 
 from api.errors.httperrors import FilmHTTPNotFoundError
-from api.models.resp_models import FilmRespModel, FilmsResponseModel
+from api.models.resp_models import (FilmRespModel, FilmsBatchResponseModel,
+                                    FilmsResponseModel, IdsRequestModel)
+from pkg.fieldsets.fieldsets import SparseFields, project
 from pkg.pagination.pagination import Paginator
+from pkg.server_timing import server_timing
+from pkg.server_timing.server_timing import TimedORJSONResponse
 from services.films import FilmService, get_film_service
 
 router = APIRouter()
 
+film_fields = SparseFields(FilmRespModel)
+
+
+def _film_persons(persons: Optional[List[dict]]) -> Optional[List[dict]]:
+    if persons is None:
+        return None
+    return [{"id": person["id"], "name": person["name"]} for person in persons]
+
+
+def film_response(source: dict, fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """
+    Project film _source from es or cache straight to FilmRespModel shape
+    (with aliases, as it is serialized), without pydantic validation:
+    the data has been indexed by our ETL and is trusted.
+    With fields only these fields are returned.
+    A film without the required title is still rejected by FilmRespModel.
+    """
+    record = {
+        "id": source["id"],
+        "imdb_rating": float(source.get("imdb_rating") or 0),
+        "genre": source.get("genre"),
+        "title": source.get("title"),
+        "description": source.get("description"),
+        "director": source.get("director"),
+        "actors": _film_persons(source.get("actors")),
+        "writers": _film_persons(source.get("writers")),
+    }
+    if record["title"] is None and (not fields or "title" in fields):
+        # raises ValidationError, as the response validation did
+        FilmRespModel.parse_obj(record)
+    return project(record, fields) if fields else record
+
 
 @router.get(
     '/{film_id}',
@@ -38,15 +74,43 @@ async def film_details(
             description="UUID of the film to get",
             example="2a090dde-f688-46fe-a9f4-b781a985275e",
         ),
+        fields: Optional[Tuple[str, ...]] = Depends(film_fields),
         film_service: FilmService = Depends(get_film_service)
 ) -> FilmRespModel:
     """
     Get film detail info by film uuid.
+    With fields only requested fields are returned.
     """
-    film = await film_service.get_by_id(film_id)
+    film = await film_service.get_source_by_id(film_id, fields)
     if not film:
         raise FilmHTTPNotFoundError
-    return FilmRespModel.parse_obj(film.dict())
+    with server_timing.timed("validate"):
+        content = film_response(film, fields)
+    # the ready response is not validated again against response_model
+    return TimedORJSONResponse(content)
+
+
+@router.post(
+    '/batch',
+    response_model=FilmsBatchResponseModel,
+    tags=["films"],
+    responses={
+        200: {
+            "description": "Films requested by IDs in request order, null for not found ones",
+        },
+    },
+)
+async def films_batch(
+        request: IdsRequestModel,
+        film_service: FilmService = Depends(get_film_service)
+) -> FilmsBatchResponseModel:
+    """
+    Get films detail info by list of film uuids.
+    """
+    films = await film_service.get_sources_by_ids(request.ids)
+    with server_timing.timed("validate"):
+        records = [film_response(film) if film else None for film in films]
+    return TimedORJSONResponse({"records": records})
 
 
 class FilmRating(str, Enum):
@@ -82,25 +146,32 @@ async def get_films_list(
             description="Sorting order by imdb rating.",
         ),
         paginator: Paginator = Depends(),
+        fields: Optional[Tuple[str, ...]] = Depends(film_fields),
         film_service: FilmService = Depends(get_film_service)
 ) -> FilmsResponseModel:
     """
     Get filtered films list with pagination.
+    With fields only requested fields of the films are returned.
     """
-    total_count, films = await film_service.get_list(
+    total_count, films, next_cursor = await film_service.get_list_sources(
         name,
         genres,
         sort,
         paginator.page_number,
-        paginator.page_size
+        paginator.page_size,
+        paginator.cursor,
+        fields
     )
 
-    films_res = [FilmRespModel.parse_obj(film.dict()) for film in films]
-
-    return FilmsResponseModel(
+    page = dict(
         total_count=total_count,
         page_count=math.ceil(total_count / paginator.page_size),
         page_number=paginator.page_number,
         page_size=paginator.page_size,
-        records=films_res
     )
+    if paginator.cursor is not None:
+        page["next_cursor"] = next_cursor
+
+    with server_timing.timed("validate"):
+        records = [film_response(film, fields) for film in films]
+    return TimedORJSONResponse({**page, "records": records})
@@ -1,14 +1,19 @@
-from typing import Optional
+from typing import List, Optional
 
+import orjson
 from api.errors.httperrors import GenreHTTPNotFoundError
-from api.models.resp_models import Genre, ListResponseModel
+from api.models.resp_models import (Genre, GenresBatchResponseModel,
+                                    IdsRequestModel, ListResponseModel)
 from fastapi import APIRouter, Depends, Path, Query
+from fastapi.responses import Response
 from pkg.pagination.pagination import Paginator
+from pkg.server_timing import server_timing
 from pydantic import Required
 from services.genre import GenreService, get_genre_service
 
 router = APIRouter()
 
+JSON_MEDIA_TYPE = "application/json"
 
 
 @router.get(
@@ -45,15 +50,51 @@ async def genre_details(
         genre_service: GenreService
     Returns: Genre
     """
+    if genre_service.snapshot_loaded:
+        data = genre_service.get_serialized_by_id(genre_id)
+        if data is None:
+            raise GenreHTTPNotFoundError
+        return Response(content=data, media_type=JSON_MEDIA_TYPE)
+
     genre = await genre_service.get_by_id(genre_id)
     if not genre:
         raise GenreHTTPNotFoundError
-    return Genre(id=genre.id, name=genre.name)
+    with server_timing.timed("validate"):
+        return Genre(id=genre.id, name=genre.name)
+
+
+@router.post(
+    '/batch',
+    response_model=GenresBatchResponseModel,
+    tags=["genre"],
+    responses={
+        200: {
+            "description": "Genres requested by IDs in request order, null for not found ones",
+        },
+    },
+)
+async def genres_batch(
+        request: IdsRequestModel,
+        genre_service: GenreService = Depends(get_genre_service)
+) -> GenresBatchResponseModel:
+    """Получение жанров по списку ID.
+
+    Args:
+        request: IdsRequestModel
+        genre_service: GenreService
+    Returns: GenresBatchResponseModel
+    """
+    genres = await genre_service.get_by_ids(request.ids)
+    with server_timing.timed("validate"):
+        return GenresBatchResponseModel(
+            records=[Genre(id=genre.id, name=genre.name) if genre else None for genre in genres]
+        )
 
 
 @router.get(
     '/',
     response_model=ListResponseModel,
+    response_model_exclude_unset=True,
     tags=["genre"],
     responses={
         200: {
@@ -83,14 +124,41 @@ async def genre_list(
     """
 
     offset_from = (paginator.page_number-1) * paginator.page_size
-    total, genre = await genre_service.get_list(paginator.page_size,
-                                                offset_from)
+    from_snapshot = genre_service.serves_from_snapshot(paginator.cursor)
+    if from_snapshot:
+        total, genre, next_cursor = genre_service.get_serialized_list(paginator.page_size,
+                                                                      offset_from,
+                                                                      paginator.cursor)
+    else:
+        total, genre, next_cursor = await genre_service.get_list(paginator.page_size,
+                                                                 offset_from,
+                                                                 paginator.cursor)
     if not genre:
         raise GenreHTTPNotFoundError
 
-    return ListResponseModel(
-        records=[Genre(id=p.id, name=p.name) for p in genre],
+    page = dict(
         total_count=total,
         current_page=paginator.page_number,
         total_page=int(total / paginator.page_size)+1,
         page_size=paginator.page_size)
+    if paginator.cursor is not None:
+        page['next_cursor'] = next_cursor
+
+    if from_snapshot:
+        return _serialized_list_response(genre, page)
+    with server_timing.timed("validate"):
+        return ListResponseModel(records=[Genre(id=p.id, name=p.name) for p in genre], **page)
+
+
+def _serialized_list_response(records: List[bytes], page: dict) -> Response:
+    """Ответ со списком уже сериализованных записей, как у ListResponseModel.
+
+    Args:
+        records: записи в json
+        page: параметры страницы ответа
+
+    Returns: Response
+    """
+    with server_timing.timed("serialize"):
+        body = b'{"records":[' + b','.join(records) + b'],' + orjson.dumps(page)[1:]
+    return Response(content=body, media_type=JSON_MEDIA_TYPE)
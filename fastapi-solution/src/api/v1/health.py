@@ -0,0 +1,198 @@
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
+from aioredis import Redis
+from db.redis import get_redis
+from pkg.cache_storage.health import get_redis_health
+from pkg.cache_storage.lru_storage import (LRUCacheService,
+                                           get_cache_storage_service)
+from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.cache_warmer.warmer import CacheWarmer, get_cache_warmer
+from pkg.snapshot.index_snapshot import IndexSnapshot
+from pkg.storage.elastic_storage import get_elastic_storage_service
+from pkg.storage.storage import ABSStorage
+from services.genre import get_genre_snapshot
+
+router = APIRouter()
+
+
+@router.get(
+    '/ready',
+    tags=["health"],
+    responses={
+        200: {
+            "description": "Service is ready to receive traffic",
+            "content": {"application/json": {"example": {"status": "ready"}}},
+        },
+        503: {
+            "description": "Cache is warming up",
+            "content": {"application/json": {"example": {"status": "warming_up"}}},
+        },
+    },
+)
+async def readiness(cache_warmer: CacheWarmer = Depends(get_cache_warmer)) -> ORJSONResponse:
+    """Проверка готовности сервиса: готов после прогрева кэша.
+
+    Args:
+        cache_warmer: CacheWarmer
+    Returns: ORJSONResponse
+
+    """
+    if not cache_warmer.ready:
+        return ORJSONResponse(status_code=HTTPStatus.SERVICE_UNAVAILABLE, content={"status": "warming_up"})
+    return ORJSONResponse(content={"status": "ready"})
+
+
+@router.get(
+    '/snapshots',
+    tags=["health"],
+    responses={
+        200: {
+            "description": "State of in-memory index snapshots",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "genres": {
+                            "loaded": True,
+                            "records": 26,
+                            "generation": 3,
+                            "age_seconds": 12.5,
+                            "last_error_at": None,
+                        }
+                    }
+                }
+            },
+        },
+    },
+)
+async def snapshots(genre_snapshot: Optional[IndexSnapshot] = Depends(get_genre_snapshot)) -> ORJSONResponse:
+    """Состояние снимков индексов в памяти: загружен ли и насколько устарел.
+
+    Args:
+        genre_snapshot: снимок индекса жанров
+    Returns: ORJSONResponse
+
+    """
+    content = {}
+    if genre_snapshot is not None:
+        content[genre_snapshot.index_name] = genre_snapshot.stats()
+    return ORJSONResponse(content=content)
+
+
+@router.get(
+    '/caches',
+    tags=["health"],
+    responses={
+        200: {
+            "description": "Hit ratio and size of the in-process (L1) cache",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "l1": {
+                            "hits": 1520,
+                            "misses": 310,
+                            "entries": 284,
+                            "size_bytes": 1048576,
+                        }
+                    }
+                }
+            },
+        },
+    },
+)
+async def caches(cache_storage: ABSCacheStorage = Depends(get_cache_storage_service)) -> ORJSONResponse:
+    """Попадания и промахи локального кэша, количество и размер записей.
+
+    Args:
+        cache_storage: кэш сервисов, без локального кэша ответ пустой
+    Returns: ORJSONResponse
+
+    """
+    content = {}
+    if isinstance(cache_storage, LRUCacheService):
+        content["l1"] = cache_storage.stats()
+    return ORJSONResponse(content=content)
+
+
+@router.get(
+    '/breakers',
+    tags=["health"],
+    responses={
+        200: {
+            "description": "State of storage circuit breakers and of the cache storage",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "elastic": {
+                            "state": "closed",
+                            "failures": 0,
+                            "retry_after_seconds": 0.0,
+                        },
+                        "redis": {
+                            "state": "up",
+                            "failures": 0,
+                        },
+                    }
+                }
+            },
+        },
+    },
+)
+async def breakers(storage: ABSStorage = Depends(get_elastic_storage_service),
+                   redis: Optional[Redis] = Depends(get_redis)) -> ORJSONResponse:
+    """Состояние circuit breaker хранилища (закрыт, открыт или пропускает
+    пробные запросы) и доступность Redis.
+
+    Args:
+        storage: хранилище
+        redis: подключение к Redis, None для кэша в памяти процесса
+    Returns: ORJSONResponse
+
+    """
+    content = {}
+    breaker = getattr(storage, "breaker", None)
+    if breaker is not None:
+        content[breaker.name] = breaker.stats()
+    if redis is not None:
+        health = get_redis_health(redis)
+        content[health.name] = health.stats()
+    return ORJSONResponse(content=content)
+
+
+@router.get(
+    '/limits',
+    tags=["health"],
+    responses={
+        200: {
+            "description": "State of adaptive concurrency limiters of the storage",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "elastic": {
+                            "limit": 24,
+                            "in_flight": 3,
+                            "queued": 0,
+                            "latency_ms": 4.2,
+                            "base_latency_ms": 2.9,
+                        },
+                    }
+                }
+            },
+        },
+    },
+)
+async def limits(storage: ABSStorage = Depends(get_elastic_storage_service)) -> ORJSONResponse:
+    """Текущий лимит одновременных запросов к хранилищу, очередь и задержка.
+
+    Args:
+        storage: хранилище
+    Returns: ORJSONResponse
+
+    """
+    content = {}
+    limiter = getattr(storage, "limiter", None)
+    if limiter is not None:
+        content[limiter.name] = limiter.stats()
+    return ORJSONResponse(content=content)
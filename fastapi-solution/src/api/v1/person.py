@@ -1,15 +1,22 @@
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 
 from api.errors.httperrors import (FilmHTTPNotFoundError,
                                    PersonHTTPNotFoundError)
-from api.models.resp_models import FilmByPersonModel, ListResponseModel, Person
+from api.models.resp_models import (FilmByPersonModel, IdsRequestModel,
+                                    ListResponseModel, Person,
+                                    PersonsBatchResponseModel)
 from fastapi import APIRouter, Depends, Path, Query
+from pkg.fieldsets.fieldsets import SparseFields, project
 from pkg.pagination.pagination import Paginator
+from pkg.server_timing import server_timing
+from pkg.server_timing.server_timing import TimedORJSONResponse
 from pydantic import Required
 from services.person import PersonService, get_person_service
 
 router = APIRouter()
 
+person_fields = SparseFields(Person)
+
 
 @router.get(
     '/{person_id}',
@@ -36,23 +43,60 @@ async def person_details(
             example="f111a93f-0a31-4b6f-bf3b-3a7177915bef",
             default=Required,
         ),
+        fields: Optional[Tuple[str, ...]] = Depends(person_fields),
         person_service: PersonService = Depends(get_person_service)) -> Person:
     """Получение персоны по ID.
 
     Args:
         person_id: str
+        fields: поля ответа, если заданы - возвращаются только они
         person_service: PersonService
     Returns: Person
 
     """
-    person = await person_service.get_by_id(person_id)
+    person = await person_service.get_by_id(person_id, fields)
     if not person:
         raise PersonHTTPNotFoundError
-    return Person(id=person.id, full_name=person.full_name)
+    if fields:
+        return TimedORJSONResponse(project(person.dict(), fields))
+    with server_timing.timed("validate"):
+        return Person(id=person.id, full_name=person.full_name)
+
+
+@router.post(
+    '/batch',
+    response_model=PersonsBatchResponseModel,
+    tags=["person"],
+    responses={
+        200: {
+            "description": "Persons requested by IDs in request order, null for not found ones",
+        },
+    },
+)
+async def persons_batch(
+        request: IdsRequestModel,
+        person_service: PersonService = Depends(get_person_service)) -> PersonsBatchResponseModel:
+    """Получение персон по списку ID.
+
+    Args:
+        request: IdsRequestModel
+        person_service: PersonService
+    Returns: PersonsBatchResponseModel
+
+    """
+    persons = await person_service.get_by_ids(request.ids)
+    with server_timing.timed("validate"):
+        return PersonsBatchResponseModel(
+            records=[
+                Person(id=person.id, full_name=person.full_name) if person else None
+                for person in persons
+            ]
+        )
 
 
 @router.get('/',
             response_model=ListResponseModel,
+            response_model_exclude_unset=True,
             tags=["person"],
             responses={
                 200: {
@@ -70,12 +114,14 @@ async def person_details(
             )
 async def person_list(
         paginator: Paginator = Depends(),
+        fields: Optional[Tuple[str, ...]] = Depends(person_fields),
         person_service: PersonService = Depends(
             get_person_service)) -> ListResponseModel:
     """Получение списка персон.
 
     Args:
         paginator: Paginator
+        fields: поля ответа, если заданы - возвращаются только они
         person_service: PersonService
 
     Returns: List[Person]:
@@ -83,22 +129,27 @@ async def person_list(
     """
 
     offset_from = (paginator.page_number-1) * paginator.page_size
-    total, list_person = await person_service.get_list(paginator.page_size,
-                                                       offset_from)
+    total, list_person, next_cursor = await person_service.get_list(paginator.page_size,
+                                                                    offset_from,
+                                                                    paginator.cursor,
+                                                                    fields)
     if not list_person:
         raise PersonHTTPNotFoundError
 
-    return ListResponseModel(
-        records=[Person(id=p.id, full_name=p.full_name) for p in list_person],
+    page = dict(
         total_count=total,
         current_page=paginator.page_number,
         total_page=int(total / paginator.page_size)+1,
         page_size=paginator.page_size)
+    if paginator.cursor is not None:
+        page['next_cursor'] = next_cursor
+    return _persons_response(page, list_person, fields)
 
 
 @router.get(
     '/search/{person_name}',
     response_model=ListResponseModel,
+    response_model_exclude_unset=True,
     tags=["person"],
     responses={
         200: {
@@ -123,6 +174,7 @@ async def person_by_name(
             min_length=2,
         ),
         paginator: Paginator = Depends(),
+        fields: Optional[Tuple[str, ...]] = Depends(person_fields),
         person_service: PersonService = Depends(
             get_person_service)) -> ListResponseModel:
     """Поиск персон по имени.
@@ -130,31 +182,37 @@ async def person_by_name(
     Args:
         name: str
         paginator: Paginator
+        fields: поля ответа, если заданы - возвращаются только они
         person_service: PersonService
 
     Returns: List[Person]
     """
     offset_from = (paginator.page_number-1) * paginator.page_size
-    total, list_person = await person_service.get_by_name(
+    total, list_person, next_cursor = await person_service.get_by_name(
         name=name,
         page_size=paginator.page_size,
-        offset_from=offset_from
+        offset_from=offset_from,
+        cursor=paginator.cursor,
+        fields=fields
     )
 
     if not list_person:
         raise PersonHTTPNotFoundError
 
-    return ListResponseModel(
-        records=[Person(id=p.id, full_name=p.full_name) for p in list_person],
+    page = dict(
         total_count=total,
         current_page=paginator.page_number,
         total_page=int(total / paginator.page_size),
         page_size=paginator.page_size)
+    if paginator.cursor is not None:
+        page['next_cursor'] = next_cursor
+    return _persons_response(page, list_person, fields)
 
 
 @router.get(
     '/{person_id}/film',
     response_model=ListResponseModel,
+    response_model_exclude_unset=True,
     tags=["person"],
     responses={
         200: {
@@ -192,19 +250,44 @@ async def film_by_person_id(
 
     """
     offset_from = (paginator.page_number-1) * paginator.page_size
-    total, film_list = await person_service.get_film_by_person(
+    total, film_list, next_cursor = await person_service.get_film_by_person(
         person_id=person_id,
         page_size=paginator.page_size,
-        offset_from=offset_from)
+        offset_from=offset_from,
+        cursor=paginator.cursor)
 
     if not film_list:
         raise FilmHTTPNotFoundError
 
-    return ListResponseModel(
-        records=[FilmByPersonModel(id=f.id, title=f.title,
-                                   imdb_rating=f.imdb_rating) for f in
-                 film_list],
-        total_count=total,
-        current_page=paginator.page_number,
-        total_page=int(total / paginator.page_size),
-        page_size=paginator.page_size)
+    with server_timing.timed("validate"):
+        response = ListResponseModel(
+            records=[FilmByPersonModel(id=f.id, title=f.title,
+                                       imdb_rating=f.imdb_rating) for f in
+                     film_list],
+            total_count=total,
+            current_page=paginator.page_number,
+            total_page=int(total / paginator.page_size),
+            page_size=paginator.page_size)
+    if paginator.cursor is not None:
+        response.next_cursor = next_cursor
+    return response
+
+
+def _persons_response(page: dict, persons: list, fields: Optional[Tuple[str, ...]]):
+    """Ответ со списком персон: полный или только с запрошенными полями.
+
+    Args:
+        page: параметры страницы ответа
+        persons: List[Person]
+        fields: поля ответа
+
+    Returns: ListResponseModel или TimedORJSONResponse
+    """
+    if fields:
+        return TimedORJSONResponse(
+            {**page, 'records': [project(p.dict(), fields) for p in persons]}
+        )
+    with server_timing.timed("validate"):
+        return ListResponseModel(
+            records=[Person(id=p.id, full_name=p.full_name) for p in persons],
+            **page)
@@ -12,10 +12,115 @@ PROJECT_NAME = os.getenv('PROJECT_NAME', 'movies')
 # Настройки Redis
 REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+# Таймаут обращений к Redis (мс, 0 - без таймаута). После N ошибок подряд
+# Redis считается недоступным: кэш пропускается сразу, а доступность
+# проверяется в фоне раз в M сек
+REDIS_TIMEOUT_MS = float(os.getenv('REDIS_TIMEOUT_MS', 250))
+REDIS_HEALTH_FAILURE_THRESHOLD = int(os.getenv('REDIS_HEALTH_FAILURE_THRESHOLD', 3))
+REDIS_HEALTH_PROBE_SECONDS = float(os.getenv('REDIS_HEALTH_PROBE_SECONDS', 1))
 
 # Настройки Elasticsearch
 ELASTIC_HOST = os.getenv('ES_HOST', '127.0.0.1')
 ELASTIC_PORT = int(os.getenv('ES_PORT', 9200))
+# Время жизни point in time между запросами страниц по курсору
+ELASTIC_PIT_KEEP_ALIVE = os.getenv('ES_PIT_KEEP_ALIVE', '1m')
+# Количество запоминаемых сериализованных тел поисковых запросов
+ELASTIC_QUERY_CACHE_SIZE = int(os.getenv('ES_QUERY_CACHE_SIZE', 1024))
+# Объединение параллельных поисков в _msearch: окно сбора (мс) и размер пачки
+ELASTIC_MSEARCH_ENABLED = os.getenv('ES_MSEARCH_ENABLED', 'false').lower() == 'true'
+ELASTIC_MSEARCH_WINDOW_MS = float(os.getenv('ES_MSEARCH_WINDOW_MS', 2))
+ELASTIC_MSEARCH_MAX_BATCH_SIZE = int(os.getenv('ES_MSEARCH_MAX_BATCH_SIZE', 50))
+# Circuit breaker запросов к ES: после N ошибок подряд запросы отклоняются
+# (отдаются устаревшие записи кэша или 503) в течение M сек, затем
+# пропускаются пробные запросы
+ELASTIC_BREAKER_ENABLED = os.getenv('ES_BREAKER_ENABLED', 'true').lower() == 'true'
+ELASTIC_BREAKER_FAILURE_THRESHOLD = int(os.getenv('ES_BREAKER_FAILURE_THRESHOLD', 5))
+ELASTIC_BREAKER_RECOVERY_SECONDS = float(os.getenv('ES_BREAKER_RECOVERY_SECONDS', 10))
+ELASTIC_BREAKER_HALF_OPEN_CALLS = int(os.getenv('ES_BREAKER_HALF_OPEN_CALLS', 1))
+
+# Адаптивное ограничение числа одновременных запросов к ES: лимит
+# подстраивается под задержку ответов (от MIN до MAX), остальные запросы
+# ждут в очереди, а если ожидание не укладывается в срок запроса - 503
+ELASTIC_LIMIT_ENABLED = os.getenv('ES_LIMIT_ENABLED', 'true').lower() == 'true'
+ELASTIC_LIMIT_INITIAL = int(os.getenv('ES_LIMIT_INITIAL', 20))
+ELASTIC_LIMIT_MIN = int(os.getenv('ES_LIMIT_MIN', 2))
+ELASTIC_LIMIT_MAX = int(os.getenv('ES_LIMIT_MAX', 200))
+ELASTIC_LIMIT_QUEUE_SIZE = int(os.getenv('ES_LIMIT_QUEUE_SIZE', 100))
+ELASTIC_LIMIT_LATENCY_TOLERANCE = float(os.getenv('ES_LIMIT_LATENCY_TOLERANCE', 2))
+
+# Время жизни записей кэша (сек): после мягкого срока запись отдаётся
+# устаревшей и обновляется в фоне, после жёсткого - удаляется из Redis
+CACHE_SOFT_TTL_SECONDS = int(os.getenv('CACHE_SOFT_TTL_SECONDS', 60 * 5))
+CACHE_HARD_TTL_SECONDS = int(os.getenv('CACHE_HARD_TTL_SECONDS', 60 * 30))
+# Время жизни отметки "не найдено" (запрос по несуществующему id или пустой
+# поиск): пока она в кэше, такие запросы не доходят до хранилища
+CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv('CACHE_NEGATIVE_TTL_SECONDS', 30))
+
+# Поколения кэша индексов: входят в ключи кэша и увеличиваются после
+# переиндексации, локальные значения перечитываются из Redis раз в N сек
+CACHE_GENERATION_INDEXES = ('movies', 'person', 'genres')
+CACHE_GENERATION_REFRESH_SECONDS = float(os.getenv('CACHE_GENERATION_REFRESH_SECONDS', 1))
+
+# Локальный (in-process) кэш перед Redis
+CACHE_L1_ENABLED = os.getenv('CACHE_L1_ENABLED', 'true').lower() == 'true'
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', 10000))
+CACHE_L1_MAX_BYTES = int(os.getenv('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024))
+
+# Кэш готовых ответов API: время жизни (сек) по префиксу пути,
+# пути без ttl (или с ttl 0) не кэшируются
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_TTL_BY_PATH = {
+    '/api/v1/films': int(os.getenv('RESPONSE_CACHE_FILMS_TTL', 60)),
+    '/api/v1/person': int(os.getenv('RESPONSE_CACHE_PERSON_TTL', 60)),
+    # жанры отдаются из снимка в памяти, кэшировать ответы не нужно
+    '/api/v1/genre': int(os.getenv('RESPONSE_CACHE_GENRE_TTL', 0)),
+}
+
+# Снимок индекса жанров в памяти: перечитывается раз в N сек, а при смене
+# поколения кэша жанров - при ближайшей проверке
+GENRE_SNAPSHOT_ENABLED = os.getenv('GENRE_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+GENRE_SNAPSHOT_REFRESH_SECONDS = float(os.getenv('GENRE_SNAPSHOT_REFRESH_SECONDS', 300))
+GENRE_SNAPSHOT_CHECK_SECONDS = float(os.getenv('GENRE_SNAPSHOT_CHECK_SECONDS', 5))
+
+# Прогрев кэша при старте: самые частые GET запросы API копятся в Redis
+# (сбрасываются раз в N сек) и повторяются при следующем запуске
+CACHE_WARMUP_ENABLED = os.getenv('CACHE_WARMUP_ENABLED', 'true').lower() == 'true'
+CACHE_WARMUP_TOP_N = int(os.getenv('CACHE_WARMUP_TOP_N', 500))
+CACHE_WARMUP_CONCURRENCY = int(os.getenv('CACHE_WARMUP_CONCURRENCY', 10))
+CACHE_WARMUP_TIMEOUT_SECONDS = float(os.getenv('CACHE_WARMUP_TIMEOUT_SECONDS', 60))
+POPULAR_REQUESTS_MAX_ENTRIES = int(os.getenv('POPULAR_REQUESTS_MAX_ENTRIES', 2000))
+POPULAR_REQUESTS_FLUSH_SECONDS = float(os.getenv('POPULAR_REQUESTS_FLUSH_SECONDS', 10))
+
+# Заголовок Server-Timing с длительностями этапов обработки запроса
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+
+# Срок обработки запроса (сек): по умолчанию, по префиксу пути и наибольший,
+# который клиент может задать заголовком X-Request-Timeout. После срока
+# обработка отменяется, клиент получает 504
+REQUEST_TIMEOUT_SECONDS = float(os.getenv('REQUEST_TIMEOUT_SECONDS', 3))
+REQUEST_TIMEOUT_MAX_SECONDS = float(os.getenv('REQUEST_TIMEOUT_MAX_SECONDS', 30))
+REQUEST_TIMEOUT_BY_PATH = {
+    '/api/v1/admin': float(os.getenv('REQUEST_TIMEOUT_ADMIN_SECONDS', 30)),
+}
+
+# Метрики в формате Prometheus на /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Токен для служебных (admin) методов API, если пустой - методы недоступны (403)
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+# Хранилище и кэш в памяти процесса вместо Elasticsearch и Redis
+# (STORAGE_BACKEND=memory, CACHE_BACKEND=memory) для замеров без внешних сервисов:
+# данные из json файла {"индекс": [документы]} или синтетические,
+# задержка каждого обращения имитирует сетевой запрос
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'elastic')
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+MEMORY_STORAGE_DATA_PATH = os.getenv('MEMORY_STORAGE_DATA_PATH', '')
+MEMORY_STORAGE_FILMS = int(os.getenv('MEMORY_STORAGE_FILMS', 1000))
+MEMORY_STORAGE_PERSONS = int(os.getenv('MEMORY_STORAGE_PERSONS', 500))
+MEMORY_STORAGE_GENRES = int(os.getenv('MEMORY_STORAGE_GENRES', 20))
+MEMORY_STORAGE_LATENCY_MS = float(os.getenv('MEMORY_STORAGE_LATENCY_MS', 0))
+MEMORY_CACHE_LATENCY_MS = float(os.getenv('MEMORY_CACHE_LATENCY_MS', 0))
 
 # Корень проекта
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
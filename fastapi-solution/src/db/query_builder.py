@@ -0,0 +1,148 @@
+"""Построение поисковых запросов к Elasticsearch.
+
+Условия, не влияющие на релевантность, попадают в filter контекст:
+для них не считается score, а результаты кэшируются в filter cache ES.
+Сериализованные тела запросов запоминаются по параметрам запроса.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+import orjson
+from core import config
+
+SORT_ASC = "asc"
+SORT_DESC = "desc"
+
+
+@dataclass(frozen=True)
+class Match:
+    """Полнотекстовое совпадение значения поля."""
+    field: str
+    value: str
+
+    def to_dict(self) -> dict:
+        return {"match": {self.field: self.value}}
+
+
+@dataclass(frozen=True)
+class Nested:
+    """Условие на поле вложенного (nested) документа."""
+    path: str
+    clause: "Clause"
+
+    def to_dict(self) -> dict:
+        return {"nested": {"path": self.path, "query": self.clause.to_dict()}}
+
+
+@dataclass(frozen=True)
+class AnyOf:
+    """Выполнено хотя бы одно из условий."""
+    clauses: Tuple["Clause", ...]
+
+    def to_dict(self) -> dict:
+        return {
+            "bool": {
+                "should": [clause.to_dict() for clause in self.clauses],
+                "minimum_should_match": 1
+            }
+        }
+
+
+Clause = Union[Match, Nested, AnyOf]
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """Параметры поискового запроса.
+
+    :param must: условия, от которых зависит релевантность
+    :param filters: условия без подсчёта релевантности
+    :param sort: сортировка (поле, порядок), без неё - по релевантности
+    :param offset_from: смещение первой записи страницы
+    :param page_size: размер страницы
+    """
+    must: Tuple[Clause, ...] = ()
+    filters: Tuple[Clause, ...] = ()
+    sort: Optional[Tuple[str, str]] = None
+    offset_from: int = 0
+    page_size: int = 10
+
+    def to_dict(self) -> dict:
+        must = list(self.must)
+        filters = list(self.filters)
+        if self.sort is not None:
+            # при сортировке по полю релевантность не используется
+            filters = must + filters
+            must = []
+
+        bool_query = {}
+        if must:
+            bool_query["must"] = [clause.to_dict() for clause in must]
+        if filters:
+            bool_query["filter"] = [clause.to_dict() for clause in filters]
+
+        body = {
+            "query": {"bool": bool_query} if bool_query else {"match_all": {}},
+            "from": self.offset_from,
+            "size": self.page_size,
+        }
+        if self.sort is not None:
+            field, order = self.sort
+            body["sort"] = [{field: {"order": order}}]
+        return body
+
+    def to_json(self) -> str:
+        """Сериализованное тело запроса, одно на одинаковые параметры."""
+        return _serialize(self)
+
+
+@lru_cache(maxsize=config.ELASTIC_QUERY_CACHE_SIZE)
+def _serialize(query: SearchQuery) -> str:
+    return orjson.dumps(query.to_dict()).decode()
+
+
+def match_all(offset_from: int, page_size: int) -> SearchQuery:
+    return SearchQuery(offset_from=offset_from, page_size=page_size)
+
+
+def films_query(
+        name: Optional[str],
+        genres: Optional[Tuple[str, ...]],
+        order: str,
+        offset_from: int,
+        page_size: int) -> SearchQuery:
+    """Фильмы по названию и жанрам, отсортированные по рейтингу."""
+    must = (Match("title", name),) if name else ()
+    filters = ()
+    if genres:
+        filters = (AnyOf(tuple(Match("genre", genre) for genre in sorted(set(genres)))),)
+    return SearchQuery(
+        must=must,
+        filters=filters,
+        sort=("imdb_rating", order),
+        offset_from=offset_from,
+        page_size=page_size
+    )
+
+
+def films_by_person_query(person_id: str, offset_from: int, page_size: int) -> SearchQuery:
+    """Фильмы, в которых персона - актёр или сценарист."""
+    return SearchQuery(
+        filters=(
+            AnyOf((
+                Nested("actors", Match("actors.id", person_id)),
+                Nested("writers", Match("writers.id", person_id)),
+            )),
+        ),
+        offset_from=offset_from,
+        page_size=page_size
+    )
+
+
+def persons_by_name_query(name: str, offset_from: int, page_size: int) -> SearchQuery:
+    return SearchQuery(
+        must=(Match("full_name", name),),
+        offset_from=offset_from,
+        page_size=page_size
+    )
@@ -1,21 +1,50 @@
+import asyncio
 import logging
+from typing import List, Optional
 
 import aioredis
 import uvicorn
+from api.errors.httperrors import (DeadlineHTTPExceededError,
+                                  InvalidCursorHTTPError,
+                                  StorageHTTPOverloadedError,
+                                  StorageHTTPUnavailableError)
 from api.metadata.tags_metadata import tags_metadata
-from api.v1 import films, genre, person
+from api.v1 import admin, films, genre, health, person
 from core import config
 from core.logger import LOGGING
 from db import elastic, redis
 from elasticsearch import AsyncElasticsearch
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.openapi.utils import get_openapi
 from fastapi.responses import ORJSONResponse
+from pkg.cache_generation.generations import get_cache_generations
+from pkg.cache_storage.lru_storage import get_cache_storage_service
+from pkg.cache_storage.memory_storage import get_memory_cache_service
+from pkg.cache_storage.redis_storage import get_redis_storage_service
+from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.cache_warmer.popular_requests import (PopularRequests,
+                                               PopularRequestsMiddleware,
+                                               get_popular_requests)
+from pkg.cache_warmer.warmer import get_cache_warmer
+from pkg.circuit_breaker.circuit_breaker import (CircuitOpenError,
+                                                 retry_after_header)
+from pkg.concurrency_limit.limiter import LimitExceededError
+from pkg.deadline.deadline import DeadlineExceededError, DeadlineMiddleware
+from pkg.metrics.metrics import CONTENT_TYPE, REGISTRY
+from pkg.metrics.middleware import MetricsMiddleware
+from pkg.pagination.cursor import InvalidCursorError
+from pkg.response_cache.response_cache import ResponseCacheMiddleware
+from pkg.server_timing.server_timing import (ServerTimingMiddleware,
+                                             TimedORJSONResponse)
+from pkg.storage.elastic_storage import get_elastic_storage_service
+from pkg.storage.memory_storage import get_memory_storage_service
+from pkg.storage.storage import ABSStorage
+from services.genre import get_genre_snapshot
 
 app = FastAPI(
     docs_url='/api/openapi',
     openapi_url='/api/openapi.json',
-    default_response_class=ORJSONResponse,
+    default_response_class=TimedORJSONResponse,
 )
 
 
@@ -35,19 +64,155 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+# хранилище и кэш в памяти процесса подменяют ES и Redis во всех зависимостях
+if config.STORAGE_BACKEND == 'memory':
+    app.dependency_overrides[get_elastic_storage_service] = get_memory_storage_service
+if config.CACHE_BACKEND == 'memory':
+    app.dependency_overrides[get_redis_storage_service] = get_memory_cache_service
+
+
+def get_storage() -> ABSStorage:
+    if config.STORAGE_BACKEND == 'memory':
+        return get_memory_storage_service()
+    return get_elastic_storage_service(elastic=elastic.es)
+
+
+def get_response_cache_storage() -> ABSCacheStorage:
+    # именованные аргументы: те же экземпляры, что и при внедрении через Depends
+    if config.CACHE_BACKEND == 'memory':
+        return get_cache_storage_service(backend=get_memory_cache_service())
+    return get_cache_storage_service(backend=get_redis_storage_service(redis=redis.redis))
+
+
+def get_app_popular_requests() -> Optional[PopularRequests]:
+    return get_popular_requests(redis=redis.redis)
+
+
+async def get_response_cache_key_suffix() -> str:
+    # ответ может зависеть от любого индекса: в ключе поколения всех индексов
+    generations = await get_cache_generations(redis=redis.redis).get_all()
+    return ":g" + ".".join(str(generation) for generation in generations.values())
+
+
+if config.RESPONSE_CACHE_ENABLED:
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        storage_provider=get_response_cache_storage,
+        ttl_by_path=config.RESPONSE_CACHE_TTL_BY_PATH,
+        # страницы по курсору привязаны к PIT с ограниченным временем жизни
+        skip_query_params=("page[cursor]",),
+        key_suffix_provider=get_response_cache_key_suffix,
+    )
+
+# снаружи кэша ответов: учитываются и ответы из него
+app.add_middleware(
+    PopularRequestsMiddleware,
+    popular_requests_provider=get_app_popular_requests,
+    path_prefixes=('/api/v1/films', '/api/v1/person', '/api/v1/genre'),
+    skip_query_params=("page[cursor]",),
+)
+
+if config.SERVER_TIMING_ENABLED:
+    # снаружи кэша ответов, чтобы заголовок не попадал в кэш
+    app.add_middleware(ServerTimingMiddleware)
+
+# снаружи кэша ответов: срок ограничивает и запись ответа в кэш
+app.add_middleware(
+    DeadlineMiddleware,
+    default_timeout=config.REQUEST_TIMEOUT_SECONDS,
+    max_timeout=config.REQUEST_TIMEOUT_MAX_SECONDS,
+    timeout_by_path=config.REQUEST_TIMEOUT_BY_PATH,
+)
+
+if config.METRICS_ENABLED:
+    # подключается последним: замеряет и ответы из кэша ответов
+    app.add_middleware(MetricsMiddleware, routes_provider=lambda: app.routes)
+
+    @app.get('/metrics', include_in_schema=False)
+    async def metrics() -> Response:
+        return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return ORJSONResponse(
+        status_code=InvalidCursorHTTPError.status_code,
+        content={"detail": InvalidCursorHTTPError.detail},
+    )
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # данных нет в кэше, а хранилище недоступно: отказ сразу, без ожидания
+    return ORJSONResponse(
+        status_code=StorageHTTPUnavailableError.status_code,
+        content={"detail": StorageHTTPUnavailableError.detail},
+        headers={"Retry-After": retry_after_header(exc.retry_after)},
+    )
+
+
+@app.exception_handler(LimitExceededError)
+async def limit_exceeded_handler(request: Request, exc: LimitExceededError):
+    # хранилище перегружено: отказ сразу, а не после срока запроса в очереди
+    return ORJSONResponse(
+        status_code=StorageHTTPOverloadedError.status_code,
+        content={"detail": StorageHTTPOverloadedError.detail},
+        headers={"Retry-After": retry_after_header(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+    return ORJSONResponse(
+        status_code=DeadlineHTTPExceededError.status_code,
+        content={"detail": DeadlineHTTPExceededError.detail},
+    )
+
+
+background_tasks: List[asyncio.Task] = []
+
 
 @app.on_event('startup')
 async def startup():
-    redis.redis = await aioredis.create_redis_pool((config.REDIS_HOST, config.REDIS_PORT), minsize=10, maxsize=20)
-    elastic.es = AsyncElasticsearch(
-        hosts=[f'{config.ELASTIC_HOST}:{config.ELASTIC_PORT}'])
+    if config.CACHE_BACKEND != 'memory':
+        redis.redis = await aioredis.create_redis_pool((config.REDIS_HOST, config.REDIS_PORT), minsize=10, maxsize=20)
+    if config.STORAGE_BACKEND != 'memory':
+        elastic.es = AsyncElasticsearch(
+            hosts=[f'{config.ELASTIC_HOST}:{config.ELASTIC_PORT}'])
+
+    popular_requests = get_app_popular_requests()
+    if popular_requests is not None:
+        background_tasks.append(
+            asyncio.ensure_future(popular_requests.flush_periodically(config.POPULAR_REQUESTS_FLUSH_SECONDS))
+        )
+    genre_snapshot = get_genre_snapshot(
+        elastic=get_storage(),
+        generations=get_cache_generations(redis=redis.redis)
+    )
+    if genre_snapshot is not None:
+        # первая загрузка сразу, до неё жанры отдаются через кэш и ES
+        background_tasks.append(
+            asyncio.ensure_future(genre_snapshot.refresh_periodically(config.GENRE_SNAPSHOT_CHECK_SECONDS))
+        )
+    cache_warmer = get_cache_warmer()
+    if config.CACHE_WARMUP_ENABLED and popular_requests is not None:
+        background_tasks.append(asyncio.ensure_future(cache_warmer.run(popular_requests, app)))
+    else:
+        cache_warmer.ready = True
 
 
 @app.on_event('shutdown')
 async def shutdown():
-    redis.redis.close()
-    await redis.redis.wait_closed()
-    await elastic.es.close()
+    for task in background_tasks:
+        task.cancel()
+    popular_requests = get_app_popular_requests()
+    if popular_requests is not None:
+        await popular_requests.flush()
+    if redis.redis is not None:
+        redis.redis.close()
+        await redis.redis.wait_closed()
+    if elastic.es is not None:
+        await elastic.es.close()
 
 
 # Подключаем роутер к серверу, указав префикс /v1/films
@@ -55,4 +220,6 @@ async def shutdown():
 app.include_router(films.router, prefix='/api/v1/films')
 app.include_router(person.router, prefix='/api/v1/person', tags=['person'])
 app.include_router(genre.router, prefix='/api/v1/genre', tags=['genre'])
+app.include_router(admin.router, prefix='/api/v1/admin', tags=['admin'])
+app.include_router(health.router, prefix='/api/v1/health', tags=['health'])
 
@@ -1,6 +1,11 @@
+import hashlib
+from typing import Type, TypeVar
+
 from orjson import orjson
 from pydantic import BaseModel
 
+ModelType = TypeVar("ModelType", bound="Base")
+
 
 def orjson_dumps(v, *, default):
     return orjson.dumps(v, default=default).decode()
@@ -10,3 +15,23 @@ class Base(BaseModel):
     class Config:
         json_loads = orjson.loads
         json_dumps = orjson_dumps
+
+    @classmethod
+    def validated(cls, data: dict) -> dict:
+        """Проверка данных моделью: только заданные поля, с приведёнными типами."""
+        return cls(**data).dict(exclude_unset=True)
+
+    @classmethod
+    def trusted(cls: Type[ModelType], data: dict) -> ModelType:
+        """Модель из данных, уже проверенных validated, без повторной проверки."""
+        return cls.construct(**data)
+
+
+def schema_version(*models: Type[BaseModel]) -> str:
+    """Отпечаток схем моделей: меняется вместе с полями и валидаторами."""
+    digest = hashlib.sha1()
+    for model in models:
+        digest.update(orjson.dumps(model.schema(), option=orjson.OPT_SORT_KEYS))
+        for field, validators in sorted(model.__validators__.items()):
+            digest.update(f"{field}:{','.join(v.func.__qualname__ for v in validators)}".encode())
+    return digest.hexdigest()[:12]
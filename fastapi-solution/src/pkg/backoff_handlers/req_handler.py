@@ -1,8 +1,11 @@
 from logging import Logger
 
+from pkg.metrics.metrics import BACKOFF_RETRIES
+
 
 def create_backoff_hdlr(logger: Logger):
     def backoff_req_hdlr(details):
+        BACKOFF_RETRIES.inc(details["target"].__qualname__)
         logger.info("Backing off {wait:0.1f} seconds after {tries} tries "
               "calling function {target} with args {args} and kwargs "
               "{kwargs}".format(**details))
@@ -0,0 +1,89 @@
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from aioredis import Redis
+from core import config
+from db.redis import get_redis
+from fastapi import Depends
+from pkg.cache_storage.health import CacheHealth, get_redis_health
+from pkg.deadline import deadline
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY_PREFIX = "cache_generation:"
+
+
+class CacheGenerations:
+    """Поколения кэша индексов хранилища.
+
+    Поколение индекса входит в ключи кэша, построенные по его данным:
+    увеличение поколения после переиндексации делает все старые записи
+    недостижимыми сразу. Значения хранятся в Redis и перечитываются
+    не чаще, чем раз в refresh_interval секунд, без Redis (кэш в памяти
+    процесса) - только в памяти процесса. Пока Redis недоступен (health),
+    используются последние прочитанные значения.
+    """
+
+    def __init__(self,
+                 redis: Optional[Redis],
+                 index_names: Iterable[str],
+                 refresh_interval: float,
+                 health: Optional[CacheHealth] = None) -> None:
+        self.redis = redis
+        self.health = health
+        self.index_names = tuple(index_names)
+        self.refresh_interval = refresh_interval
+        self._generations: Dict[str, int] = {}
+        self._refreshed_at: Optional[float] = None
+
+    async def get(self, index_name: str) -> int:
+        await self._refresh_if_needed()
+        return self._generations.get(index_name, 0)
+
+    async def get_all(self) -> Dict[str, int]:
+        await self._refresh_if_needed()
+        return {index_name: self._generations.get(index_name, 0) for index_name in self.index_names}
+
+    async def bump(self, index_name: str) -> int:
+        if self.redis is None:
+            generation = self._generations.get(index_name, 0) + 1
+        else:
+            generation = await self.redis.incr(f"{GENERATION_KEY_PREFIX}{index_name}")
+        self._generations[index_name] = generation
+        logger.info(f"cache generation of index {index_name} bumped to {generation}")
+        return generation
+
+    async def _refresh_if_needed(self):
+        if self.redis is None or (self.health is not None and not self.health.up):
+            return
+        now = time.monotonic()
+        if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        # параллельные запросы пока используют текущие значения
+        self._refreshed_at = now
+        operation = self.redis.mget(
+            *[f"{GENERATION_KEY_PREFIX}{index_name}" for index_name in self.index_names]
+        )
+        try:
+            values = await (operation if self.health is None else self.health.call(operation, deadline.timeout()))
+        except Exception:
+            logger.exception("error while getting cache generations from redis")
+            return
+        self._generations = {
+            index_name: int(value or 0)
+            for index_name, value in zip(self.index_names, values)
+        }
+
+
+@lru_cache()
+def get_cache_generations(
+        redis: Redis = Depends(get_redis),
+) -> CacheGenerations:
+    return CacheGenerations(
+        redis,
+        config.CACHE_GENERATION_INDEXES,
+        config.CACHE_GENERATION_REFRESH_SECONDS,
+        get_redis_health(redis) if redis is not None else None
+    )
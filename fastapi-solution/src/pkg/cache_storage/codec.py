@@ -0,0 +1,64 @@
+import time
+from typing import Any, NamedTuple, Optional, Union
+
+import orjson
+
+
+# Запись "данных нет" (не найдено по id, пустой поиск). Не json, поэтому
+# не совпадает ни с одной записью encode_entry в любом кэш хранилище
+TOMBSTONE = b"\x00tombstone"
+
+
+class CacheEntry(NamedTuple):
+    payload: Any
+    stale: bool
+    # данные записаны при той же версии схемы моделей и уже проверены
+    trusted: bool = False
+
+
+def encode_entry(payload: Any, soft_ttl: int, schema: Optional[str] = None) -> bytes:
+    """Упаковка данных для записи в кэш.
+
+    Вместе с данными сохраняется время "мягкого" устаревания, после
+    которого запись ещё отдаётся, но требует обновления из хранилища,
+    и версия схемы, по которой данные были проверены.
+
+    :param payload: данные (json-сериализуемые)
+    :param soft_ttl: через сколько секунд запись считается устаревшей
+    :param schema: версия схемы моделей данных
+    :return: bytes
+    """
+    entry = {
+        "soft_expire": time.time() + soft_ttl,
+        "payload": payload,
+    }
+    if schema is not None:
+        entry["schema"] = schema
+    return orjson.dumps(entry)
+
+
+def is_tombstone(data: Union[str, bytes]) -> bool:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return data == TOMBSTONE
+
+
+def decode_entry(data: Union[str, bytes], schema: Optional[str] = None) -> CacheEntry:
+    """Распаковка записи кэша.
+
+    Записи в старом формате (без времени устаревания) считаются
+    устаревшими, чтобы они были перезаписаны при первом чтении.
+    Записи с другой версией схемы не считаются проверенными.
+
+    :param data: значение из кэша
+    :param schema: текущая версия схемы моделей данных
+    :return: CacheEntry
+    """
+    entry = orjson.loads(data)
+    if not isinstance(entry, dict) or "soft_expire" not in entry:
+        return CacheEntry(payload=entry, stale=True)
+    return CacheEntry(
+        payload=entry["payload"],
+        stale=entry["soft_expire"] <= time.time(),
+        trusted=schema is not None and entry.get("schema") == schema
+    )
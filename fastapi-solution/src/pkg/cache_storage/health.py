@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+from aioredis import Redis
+from core import config
+from pkg.metrics.metrics import CACHE_HEALTH_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+
+class CacheHealth:
+    """Доступность кэш хранилища.
+
+    После failure_threshold ошибок (или таймаутов) подряд хранилище
+    считается недоступным: обращения к нему пропускаются сразу, без
+    ожидания соединения. Пока оно недоступно, фоновая проверка probe
+    раз в probe_interval секунд решает, можно ли возобновить обращения.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            probe: Callable[[], Awaitable],
+            failure_threshold: int,
+            probe_interval: float,
+            timeout: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+        self.up = True
+        self._failures = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def success(self):
+        self._failures = 0
+
+    def failure(self):
+        self._failures += 1
+        if self.up and self._failures >= self.failure_threshold:
+            self.up = False
+            logger.warning(f"cache storage {self.name} is down, requests are skipped until it recovers")
+            CACHE_HEALTH_TRANSITIONS.inc(self.name, "down")
+            self._probe_task = asyncio.ensure_future(self._probe_until_up())
+
+    async def call(self, operation: Awaitable, timeout: Optional[float] = None):
+        """Обращение к хранилищу с таймаутом и учётом результата.
+
+        :param operation: обращение к хранилищу
+        :param timeout: таймаут этого обращения (оставшийся срок запроса),
+            если он меньше собственного - его истечение не считается ошибкой
+        :raises: ошибки и asyncio.TimeoutError обращения
+        """
+        limited = timeout is not None and (not self.timeout or timeout < self.timeout)
+        if not limited:
+            timeout = self.timeout
+        try:
+            if timeout:
+                result = await asyncio.wait_for(operation, timeout)
+            else:
+                result = await operation
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            if not limited:
+                self.failure()
+            raise
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": "up" if self.up else "down",
+            "failures": self._failures,
+        }
+
+    async def _probe_until_up(self):
+        while not self.up:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await asyncio.wait_for(self.probe(), self.timeout or self.probe_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.info(f"cache storage {self.name} is still down")
+                continue
+            self._failures = 0
+            self.up = True
+            logger.warning(f"cache storage {self.name} is up again")
+            CACHE_HEALTH_TRANSITIONS.inc(self.name, "up")
+
+
+@lru_cache()
+def get_redis_health(redis: Redis) -> CacheHealth:
+    """Одно состояние доступности на каждое подключение к Redis."""
+    return CacheHealth(
+        "redis",
+        redis.ping,
+        failure_threshold=config.REDIS_HEALTH_FAILURE_THRESHOLD,
+        probe_interval=config.REDIS_HEALTH_PROBE_SECONDS,
+        timeout=config.REDIS_TIMEOUT_MS / 1000 or None,
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+from core import config
+from fastapi import Depends
+from pkg.cache_storage.codec import is_tombstone
+from pkg.cache_storage.redis_storage import (cache_result,
+                                            get_redis_storage_service)
+from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.metrics.metrics import CACHE_REQUESTS, cache_key_prefix
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записей в локальном кэше по префиксу ключа (сек).
+# Ключи без известного префикса живут DEFAULT_TTL_SECONDS.
+TTL_BY_PREFIX_SECONDS = {
+    "film_by_person": 30,
+    "films_": 10,
+    "film_": 30,
+    "person_list": 30,
+    "person_id_": 30,
+    "person_": 30,
+    "genre_list": 60,
+    "response_": 30,
+}
+DEFAULT_TTL_SECONDS = 30
+# метка уровня кэша в метриках
+CACHE_TIER = "l1"
+
+
+class LRUCacheService(ABSCacheStorage):
+    """Локальный (in-process) LRU кэш перед основным кэш хранилищем.
+
+    Ограничен по количеству записей и по суммарному размеру в байтах,
+    у каждой записи свой срок жизни, зависящий от префикса ключа.
+    Попадания и промахи считаются в stats() и в метрике cache_requests_total.
+    """
+
+    def __init__(
+            self,
+            backend: ABSCacheStorage,
+            max_entries: int,
+            max_bytes: int,
+            ttl_by_prefix: Optional[Dict[str, int]] = None,
+            default_ttl: int = DEFAULT_TTL_SECONDS,
+    ) -> None:
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # более длинные префиксы проверяются первыми: "films_" раньше "film_"
+        self.ttl_by_prefix = sorted(
+            (ttl_by_prefix or {}).items(),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, key: str) -> int:
+        for prefix, ttl in self.ttl_by_prefix:
+            if key.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    async def get_data(self, key: str) -> Optional[bytes]:
+        data = self._get_local(key)
+        CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), cache_result(data))
+        if data is not None:
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        data = await self.backend.get_data(key)
+        if data:
+            await self._backfill(key, data)
+        return data
+
+    async def get_many_data(self, keys: List[str]) -> List[Optional[bytes]]:
+        result = [self._get_local(key) for key in keys]
+        for key, data in zip(keys, result):
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), cache_result(data))
+        missed = [position for position, data in enumerate(result) if data is None]
+        self.hits += len(keys) - len(missed)
+        self.misses += len(missed)
+        if not missed:
+            return result
+
+        backend_data = await self.backend.get_many_data([keys[position] for position in missed])
+        backfills = []
+        for position, data in zip(missed, backend_data):
+            if data:
+                backfills.append(self._backfill(keys[position], data))
+            result[position] = data
+        await asyncio.gather(*backfills)
+        return result
+
+    async def get_ttl(self, key: str) -> Optional[float]:
+        return await self.backend.get_ttl(key)
+
+    async def set_data(self, key: str, data: Union[str, bytes], expire: Optional[int] = None):
+        self._set_local(key, data, expire)
+        await self.backend.set_data(key, data, expire=expire)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+        }
+
+    async def _backfill(self, key: str, data: Union[str, bytes]):
+        """Запись прочитанных из основного хранилища данных в локальный кэш.
+
+        Отметка "не найдено" хранится не дольше, чем ей осталось жить
+        в основном хранилище (и не дольше CACHE_NEGATIVE_TTL_SECONDS).
+        """
+        expire = None
+        if is_tombstone(data):
+            expire = config.CACHE_NEGATIVE_TTL_SECONDS
+            remaining = await self.backend.get_ttl(key)
+            if remaining is not None:
+                expire = min(expire, remaining)
+            if expire <= 0:
+                return
+        self._set_local(key, data, expire)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _set_local(self, key: str, data: Union[str, bytes], expire: Optional[float] = None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        ttl = self.ttl_for(key)
+        if expire:
+            ttl = min(ttl, expire)
+        if ttl <= 0 or len(data) > self.max_bytes:
+            return
+
+        self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, data)
+        self.size_bytes += len(data)
+
+        while (
+            len(self._entries) > self.max_entries
+            or self.size_bytes > self.max_bytes
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+
+@lru_cache()
+def get_cache_storage_service(
+        backend: ABSCacheStorage = Depends(get_redis_storage_service),
+) -> ABSCacheStorage:
+    if not config.CACHE_L1_ENABLED:
+        return backend
+    return LRUCacheService(
+        backend,
+        max_entries=config.CACHE_L1_MAX_ENTRIES,
+        max_bytes=config.CACHE_L1_MAX_BYTES,
+        ttl_by_prefix=TTL_BY_PREFIX_SECONDS,
+    )
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+from core import config
+from pkg.cache_storage.storage import ABSCacheStorage
+
+EXPIRATION_TIME_SECONDS = config.CACHE_HARD_TTL_SECONDS
+
+
+class InMemoryCacheService(ABSCacheStorage):
+    """Кэш в памяти процесса вместо Redis, с тем же сроком жизни записей.
+
+    latency - задержка (сек) каждого обращения, имитирующая сетевой запрос.
+    Размер не ограничен, предназначен для замеров и профилирования
+    без внешних сервисов.
+    """
+
+    def __init__(self, latency: float = 0) -> None:
+        self.latency = latency
+        self._entries: Dict[str, Tuple[float, bytes]] = {}
+
+    async def _wait(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return data
+
+    async def get_data(self, key: str) -> Optional[bytes]:
+        await self._wait()
+        return self._get(key)
+
+    async def get_many_data(self, keys: List[str]) -> List[Optional[bytes]]:
+        await self._wait()
+        return [self._get(key) for key in keys]
+
+    async def get_ttl(self, key: str) -> Optional[float]:
+        await self._wait()
+        if self._get(key) is None:
+            return 0.0
+        return self._entries[key][0] - time.monotonic()
+
+    async def set_data(self, key: str, data: Union[str, bytes], expire: Optional[int] = None):
+        await self._wait()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._entries[key] = (time.monotonic() + (expire or EXPIRATION_TIME_SECONDS), data)
+
+
+@lru_cache()
+def get_memory_cache_service() -> InMemoryCacheService:
+    return InMemoryCacheService(latency=config.MEMORY_CACHE_LATENCY_MS / 1000)
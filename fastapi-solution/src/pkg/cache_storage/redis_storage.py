@@ -1,41 +1,124 @@
+import asyncio
 import logging
 from functools import lru_cache
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 from aioredis import Redis
+from core import config
 from db.redis import get_redis
 from fastapi import Depends
+from pkg.cache_storage.codec import is_tombstone
+from pkg.cache_storage.health import CacheHealth, get_redis_health
 from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.deadline import deadline
+from pkg.metrics.metrics import (CACHE_REQUEST_DURATION, CACHE_REQUESTS,
+                                cache_key_prefix)
+from pkg.server_timing import server_timing
 
 logger = logging.getLogger(__name__)
 
-EXPIRATION_TIME_SECONDS = 60 * 5
+EXPIRATION_TIME_SECONDS = config.CACHE_HARD_TTL_SECONDS
+
+
+# метка уровня кэша в метриках
+CACHE_TIER = "redis"
+
+
+def cache_result(data: Optional[Union[str, bytes]]) -> str:
+    """Результат чтения из кэша для метрик: данные, отметка "не найдено" или промах."""
+    if not data:
+        return "miss"
+    return "tombstone" if is_tombstone(data) else "hit"
 
 
 class RedisCacheService(ABSCacheStorage):
-    def __init__(self, redis: Redis) -> None:
+    """Кэш в Redis, ошибки Redis не прерывают запрос.
+
+    С health обращения ограничены по времени, а пока Redis недоступен -
+    пропускаются сразу (результат "skipped" в метриках). Обращения
+    не дольше оставшегося срока запроса, после срока - пропускаются.
+    """
+
+    def __init__(self, redis: Redis, health: Optional[CacheHealth] = None) -> None:
         self.redis = redis
+        self.health = health
+
+    @property
+    def available(self) -> bool:
+        return (self.health is None or self.health.up) and not deadline.expired()
+
+    async def _call(self, operation):
+        timeout = deadline.timeout()
+        if self.health is not None:
+            return await self.health.call(operation, timeout)
+        if timeout is not None:
+            return await asyncio.wait_for(operation, timeout)
+        return await operation
 
     async def get_data(self, key: str) -> Optional[Union[str, bytes]]:
+        if not self.available:
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), "skipped")
+            return None
         logger.info(f"getting data from redis by key: {key}")
         try:
-            data = await self.redis.get(key)
+            with CACHE_REQUEST_DURATION.time("get"), server_timing.timed("cache"):
+                data = await self._call(self.redis.get(key))
         except Exception:
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), "error")
             logger.exception("error while getting data from redis")
         else:
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), cache_result(data))
             if not data:
                 logger.info(f"data not found in redis.")
             return data
 
-    async def set_data(self, key: str, data: Union[str, bytes]):
+    async def get_many_data(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not self.available:
+            for key in keys:
+                CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), "skipped")
+            return [None] * len(keys)
+        logger.info(f"getting {len(keys)} keys from redis")
+        try:
+            with CACHE_REQUEST_DURATION.time("mget"), server_timing.timed("cache"):
+                result = await self._call(self.redis.mget(*keys))
+        except Exception:
+            for key in keys:
+                CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), "error")
+            logger.exception("error while getting data from redis")
+            return [None] * len(keys)
+        for key, data in zip(keys, result):
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), cache_result(data))
+        return result
+
+    async def get_ttl(self, key: str) -> Optional[float]:
+        """Оставшееся время жизни записи (сек), None - нет срока или ошибка."""
+        if not self.available:
+            return None
+        try:
+            with CACHE_REQUEST_DURATION.time("pttl"):
+                ttl_ms = await self._call(self.redis.pttl(key))
+        except Exception:
+            logger.exception("error while getting ttl from redis")
+            return None
+        # -2 - записи нет, -1 - запись без срока
+        if ttl_ms == -2:
+            return 0.0
+        return ttl_ms / 1000 if ttl_ms >= 0 else None
+
+    async def set_data(self, key: str, data: Union[str, bytes], expire: Optional[int] = None):
+        if not self.available:
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), "skipped")
+            return
         logger.info(f"inserting data to redis cache with key: {key}")
         try:
-            await self.redis.set(
-                key,
-                data,
-                expire=EXPIRATION_TIME_SECONDS
-            )
+            with CACHE_REQUEST_DURATION.time("set"), server_timing.timed("cache"):
+                await self._call(self.redis.set(
+                    key,
+                    data,
+                    expire=expire or EXPIRATION_TIME_SECONDS
+                ))
         except Exception:
+            CACHE_REQUESTS.inc(CACHE_TIER, cache_key_prefix(key), "set_error")
             logger.exception("error while inserting data in redis")
         else:
             logger.info(f"successfully added to reddis.")
@@ -45,4 +128,4 @@ class RedisCacheService(ABSCacheStorage):
 def get_redis_storage_service(
         redis: Redis = Depends(get_redis),
 ) -> RedisCacheService:
-    return RedisCacheService(redis)
+    return RedisCacheService(redis, get_redis_health(redis))
@@ -7,6 +7,14 @@ class ABSCacheStorage(ABC):
     def get_data(self, **kwargs):
         pass
 
+    @abstractmethod
+    def get_many_data(self, **kwargs):
+        pass
+
     @abstractmethod
     def set_data(self, **kwargs):
         pass
+
+    @abstractmethod
+    def get_ttl(self, **kwargs):
+        pass
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional
+
+from aioredis import Redis
+from core import config
+from db.redis import get_redis
+from fastapi import Depends
+from pkg.response_cache.response_cache import (has_query_param,
+                                               query_param_prefixes)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+POPULAR_REQUESTS_KEY = "popular_requests"
+
+# запросы при прогреве кэша не должны попадать в статистику
+recording_enabled: ContextVar[bool] = ContextVar("recording_enabled", default=True)
+
+
+class PopularRequests:
+    """Счётчик самых частых GET запросов API для прогрева кэша.
+
+    Запросы считаются локально и периодически добавляются в sorted set
+    в Redis, в котором остаются только max_entries самых частых.
+    Элемент множества - путь и строка параметров запроса.
+    """
+
+    def __init__(self, redis: Redis, max_entries: int) -> None:
+        self.redis = redis
+        self.max_entries = max_entries
+        self._counts: Counter = Counter()
+
+    def record(self, target: str):
+        self._counts[target] += 1
+
+    async def flush(self):
+        if not self._counts:
+            return
+        counts, self._counts = self._counts, Counter()
+        pipeline = self.redis.pipeline()
+        for target, count in counts.items():
+            pipeline.zincrby(POPULAR_REQUESTS_KEY, count, target)
+        pipeline.zremrangebyrank(POPULAR_REQUESTS_KEY, 0, -self.max_entries - 1)
+        try:
+            await pipeline.execute()
+        except Exception:
+            logger.exception("error while saving popular requests to redis")
+
+    async def flush_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def top(self, count: int) -> List[str]:
+        """Самые частые запросы: путь?параметры."""
+        try:
+            targets = await self.redis.zrevrange(POPULAR_REQUESTS_KEY, 0, count - 1, encoding="utf-8")
+        except Exception:
+            logger.exception("error while getting popular requests from redis")
+            return []
+        return targets
+
+
+class PopularRequestsMiddleware:
+    """Учёт успешных GET запросов с путями из path_prefixes в PopularRequests.
+
+    Подключается снаружи кэша ответов, чтобы учитывались и ответы из него.
+    Запросы с параметрами из skip_query_params (страницы по курсору)
+    не учитываются: такие ответы не кэшируются.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            popular_requests_provider: Callable[[], Optional[PopularRequests]],
+            path_prefixes: Iterable[str],
+            skip_query_params: Iterable[str] = (),
+    ) -> None:
+        self.app = app
+        self.popular_requests_provider = popular_requests_provider
+        self.path_prefixes = tuple(path_prefixes)
+        self.skip_query_params = query_param_prefixes(skip_query_params)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.path_prefixes)
+            or has_query_param(scope["query_string"], self.skip_query_params)
+            or not recording_enabled.get()
+        ):
+            await self.app(scope, receive, send)
+            return
+        popular_requests = self.popular_requests_provider()
+        if popular_requests is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        if status == 200:
+            query_string = scope["query_string"]
+            popular_requests.record(
+                f"{scope['path']}?{query_string.decode('latin-1')}" if query_string else scope["path"]
+            )
+
+
+@lru_cache()
+def get_popular_requests(
+        redis: Redis = Depends(get_redis),
+) -> Optional[PopularRequests]:
+    # без Redis (кэш в памяти процесса) запросы не учитываются
+    if redis is None:
+        return None
+    return PopularRequests(redis, config.POPULAR_REQUESTS_MAX_ENTRIES)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+from core import config
+from pkg.cache_warmer.popular_requests import (PopularRequests,
+                                               recording_enabled)
+from starlette.types import ASGIApp, Message
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """Прогрев кэша повтором самых частых запросов API внутри процесса.
+
+    Запросы проходят через приложение целиком (кэш ответов, сервисы),
+    выполняются не более чем по concurrency одновременно,
+    пока прогрев не закончен (или не истёк timeout) ready - False.
+    """
+
+    def __init__(self, top_n: int, concurrency: int, timeout: float) -> None:
+        self.top_n = top_n
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.ready = False
+
+    async def run(self, popular_requests: PopularRequests, app: ASGIApp):
+        recording_enabled.set(False)
+        try:
+            await asyncio.wait_for(self._warm_up(popular_requests, app), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"cache warm-up has not finished in {self.timeout} sec")
+        except Exception:
+            logger.exception("error while warming up cache")
+        finally:
+            self.ready = True
+
+    async def _warm_up(self, popular_requests: PopularRequests, app: ASGIApp):
+        targets = await popular_requests.top(self.top_n)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._replay(semaphore, app, target) for target in targets))
+        logger.info(f"cache warmed up by {len(targets)} popular requests")
+
+    @staticmethod
+    async def _replay(semaphore: asyncio.Semaphore, app: ASGIApp, target: str):
+        path, _, query_string = target.partition("?")
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "root_path": "",
+            "path": path,
+            "query_string": query_string.encode("latin-1"),
+            "headers": [],
+            "client": None,
+            "server": None,
+        }
+        status = None
+        request_received = False
+        response_complete = asyncio.Event()
+
+        async def receive() -> Message:
+            nonlocal request_received
+            if not request_received:
+                request_received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # как у сервера: отключение клиента - только после ответа
+            await response_complete.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete.set()
+
+        async with semaphore:
+            try:
+                await app(scope, receive, send)
+            except Exception:
+                logger.exception(f"error while replaying {target}")
+                return
+        if status != 200:
+            logger.warning(f"popular request {target} replayed with status {status}")
+
+
+@lru_cache()
+def get_cache_warmer() -> CacheWarmer:
+    return CacheWarmer(
+        top_n=config.CACHE_WARMUP_TOP_N,
+        concurrency=config.CACHE_WARMUP_CONCURRENCY,
+        timeout=config.CACHE_WARMUP_TIMEOUT_SECONDS
+    )
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from pkg.metrics.metrics import (CIRCUIT_BREAKER_REJECTED,
+                                 CIRCUIT_BREAKER_TRANSITIONS)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонён: хранилище считается недоступным."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"circuit breaker {name} is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Автомат closed -> open -> half_open -> closed вокруг вызовов хранилища.
+
+    После failure_threshold ошибок подряд вызовы recovery_timeout секунд
+    отклоняются сразу (CircuitOpenError), затем пропускается не больше
+    half_open_max_calls пробных вызовов: успех закрывает автомат,
+    ошибка снова открывает. Ошибкой считается исключение, для которого
+    is_failure возвращает True, остальные исключения (ответ хранилища
+    с ошибкой запроса, истёкший срок запроса) состояние не меняют.
+    Время берётся из clock (в тестах - подменяемые часы).
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int,
+            recovery_timeout: float,
+            half_open_max_calls: int = 1,
+            is_failure: Callable[[Exception], bool] = lambda exc: True,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+        self.clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.recovery_timeout:
+            self._set_state(HALF_OPEN)
+        return self._state
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CLOSED
+
+    def retry_after(self) -> float:
+        """Через сколько секунд автомат пропустит пробный вызов."""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.recovery_timeout - self.clock())
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Вызов через автомат.
+
+        :raises CircuitOpenError: автомат открыт или этот вызов его открыл
+        """
+        probe = self._before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # отмена запроса ничего не говорит о состоянии хранилища
+            self._release(probe)
+            raise
+        except Exception as exc:
+            self._release(probe)
+            if not self.is_failure(exc):
+                raise
+            self._on_failure()
+            if self._state != CLOSED:
+                raise CircuitOpenError(self.name, self.retry_after()) from exc
+            raise
+        self._release(probe)
+        self._on_success()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "retry_after_seconds": round(self.retry_after(), 3),
+        }
+
+    def _before_call(self) -> bool:
+        """Проверка перед вызовом.
+
+        :return: True для пробного вызова в состоянии half_open
+        """
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        CIRCUIT_BREAKER_REJECTED.inc(self.name)
+        raise CircuitOpenError(self.name, self.retry_after() or self.recovery_timeout)
+
+    def _release(self, probe: bool):
+        if probe:
+            self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    def _on_success(self):
+        self._failures = 0
+        self._set_state(CLOSED)
+
+    def _on_failure(self):
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = self.clock()
+            self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        logger.warning(f"circuit breaker {self.name}: {self._state} -> {state}")
+        CIRCUIT_BREAKER_TRANSITIONS.inc(self.name, state)
+        self._state = state
+        if state == HALF_OPEN:
+            self._half_open_calls = 0
+
+
+def retry_after_header(retry_after: float) -> str:
+    """Значение заголовка Retry-After: целые секунды, не меньше 1."""
+    return str(max(1, math.ceil(retry_after)))
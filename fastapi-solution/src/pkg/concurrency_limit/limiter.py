@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from pkg.deadline import deadline
+from pkg.metrics.metrics import (CONCURRENCY_LIMIT_QUEUE_WAIT,
+                                 CONCURRENCY_LIMIT_REJECTED)
+
+logger = logging.getLogger(__name__)
+
+# Вес последнего замера в сглаженной задержке
+LATENCY_SMOOTHING = 0.1
+# Во сколько раз за секунду может вырасти базовая задержка: без этого
+# однажды замеренный минимум держал бы лимит низким после изменения нагрузки
+BASE_LATENCY_DRIFT_PER_SECOND = 1.01
+
+T = TypeVar("T")
+
+
+class LimitExceededError(Exception):
+    """Вызов отклонён: очередь ограничителя заполнена или ожидание
+    в ней не уложится в срок запроса."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"concurrency limit {name} exceeded")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Адаптивное ограничение числа одновременных вызовов хранилища (AIMD).
+
+    Выполняется не больше limit вызовов, остальные ждут в очереди
+    (не больше max_queue, по порядку прихода). Пока лимит используется
+    хотя бы наполовину, он растёт на 1 за каждые limit вызовов
+    без роста задержки, и умножается на backoff_ratio, если задержка
+    вызова больше базовой (наименьшей недавней) в latency_tolerance раз
+    или вызов завершился ошибкой перегрузки (is_failure). Вызов, ожидание
+    которого в очереди не уложится в оставшийся срок запроса, отклоняется
+    сразу, а не после срока. Задержки замеряются по clock.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            initial_limit: int,
+            min_limit: int,
+            max_limit: int,
+            max_queue: int,
+            latency_tolerance: float = 2.0,
+            backoff_ratio: float = 0.9,
+            is_failure: Callable[[Exception], bool] = lambda exc: True,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.is_failure = is_failure
+        self.clock = clock
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._queue: Deque[asyncio.Future] = deque()
+        self._latency: Optional[float] = None
+        self._base_latency: Optional[float] = None
+        self._sampled_at = 0.0
+        self._decreased_at = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def expected_wait(self, position: int) -> float:
+        """Ожидание в очереди на позиции position (с 1), оценка по сглаженной задержке."""
+        if self._latency is None:
+            return 0.0
+        return math.ceil(position / self.limit) * self._latency
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Вызов в пределах лимита.
+
+        :raises LimitExceededError: очередь заполнена или срок запроса
+            истечёт раньше, чем до вызова дойдёт очередь
+        """
+        await self._acquire()
+        started = self.clock()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # отменённый вызов ничего не говорит о задержке хранилища
+            self._release()
+            raise
+        except Exception as exc:
+            self._on_sample(self.clock() - started, self.is_failure(exc))
+            self._release()
+            raise
+        self._on_sample(self.clock() - started, False)
+        self._release()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queued": len(self._queue),
+            "latency_ms": None if self._latency is None else round(self._latency * 1000, 3),
+            "base_latency_ms": None if self._base_latency is None else round(self._base_latency * 1000, 3),
+        }
+
+    async def _acquire(self):
+        if self._in_flight < self.limit and not self._queue:
+            self._in_flight += 1
+            return
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full", self.expected_wait(len(self._queue) + 1))
+        expected_wait = self.expected_wait(len(self._queue) + 1)
+        budget = deadline.remaining()
+        # после очереди нужно успеть выполнить и сам вызов
+        if budget is not None and expected_wait + (self._latency or 0.0) >= budget:
+            self._reject("deadline", expected_wait)
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._queue.append(waiter)
+        started = self.clock()
+        try:
+            await asyncio.wait_for(waiter, deadline.timeout())
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # место уже выдано, но ждавший вызов не состоится
+                self._release()
+            else:
+                self._remove(waiter)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            self._reject("deadline", self.expected_wait(len(self._queue) + 1))
+        finally:
+            CONCURRENCY_LIMIT_QUEUE_WAIT.observe(self.clock() - started, self.name)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._queue and self._in_flight < self.limit:
+            waiter = self._queue.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def _remove(self, waiter: asyncio.Future):
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            pass
+
+    def _reject(self, reason: str, retry_after: float):
+        CONCURRENCY_LIMIT_REJECTED.inc(self.name, reason)
+        raise LimitExceededError(self.name, max(retry_after, self._latency or 0.0))
+
+    def _on_sample(self, latency: float, failed: bool):
+        now = self.clock()
+        if self._latency is None:
+            self._latency = self._base_latency = latency
+        else:
+            self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+            drift = BASE_LATENCY_DRIFT_PER_SECOND ** (now - self._sampled_at)
+            self._base_latency = min(latency, self._base_latency * drift)
+        self._sampled_at = now
+
+        if failed or latency > self._base_latency * self.latency_tolerance:
+            # одна перегрузка замечается всеми вызовами, выполнявшимися
+            # в это время: лимит уменьшается не чаще раза за задержку
+            if now - self._decreased_at >= self._latency:
+                self._decreased_at = now
+                self._set_limit(self._limit * self.backoff_ratio)
+        elif self._in_flight * 2 >= self._limit:
+            self._set_limit(self._limit + 1 / self._limit)
+
+    def _set_limit(self, limit: float):
+        previous = self.limit
+        self._limit = min(max(limit, self.min_limit), self.max_limit)
+        if self.limit != previous:
+            logger.debug(f"concurrency limit {self.name}: {previous} -> {self.limit}")
+            self._wake()
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from http import HTTPStatus
+from typing import Dict, Optional, Union
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = b"x-request-timeout"
+DEADLINE_EXCEEDED_BODY = orjson.dumps({"detail": "Request deadline exceeded"})
+
+
+class DeadlineExceededError(Exception):
+    """Время, отведённое на обработку запроса, истекло."""
+
+
+class SharedDeadline:
+    """Срок работы, общей для нескольких запросов (single flight):
+    наибольший из их сроков, None - без срока.
+    """
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: Optional[float]) -> None:
+        self.at = at
+
+    def extend(self, at: Optional[float]):
+        """Продление до срока ещё одного запроса."""
+        if self.at is not None:
+            self.at = None if at is None else max(self.at, at)
+
+
+# момент (time.monotonic), после которого ответ клиенту уже не нужен
+_deadline: ContextVar[Optional[Union[float, SharedDeadline]]] = ContextVar("deadline", default=None)
+
+
+def set_timeout(timeout: Optional[float]):
+    """Срок обработки текущего запроса через timeout секунд, None - без срока."""
+    _deadline.set(None if timeout is None else time.monotonic() + timeout)
+
+
+def set_shared(deadline: SharedDeadline):
+    """Срок текущей задачи - общий срок, продлеваемый другими запросами."""
+    _deadline.set(deadline)
+
+
+def current() -> Optional[float]:
+    """Срок текущего запроса (по time.monotonic), None - срок не задан."""
+    deadline = _deadline.get()
+    if isinstance(deadline, SharedDeadline):
+        return deadline.at
+    return deadline
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось до срока, None - срок не задан."""
+    deadline = current()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check():
+    """:raises DeadlineExceededError: срок уже истёк"""
+    if expired():
+        raise DeadlineExceededError()
+
+
+def timeout(default: Optional[float] = None) -> Optional[float]:
+    """Таймаут обращения к внешнему сервису: не дольше оставшегося срока."""
+    left = remaining()
+    if left is None:
+        return default
+    left = max(left, 0.0)
+    return left if default is None else min(left, default)
+
+
+def giveup(exc: Exception) -> bool:
+    """Для backoff: повторять, только пока срок не истёк."""
+    return expired()
+
+
+def parse_timeout(value: bytes) -> Optional[float]:
+    """Значение заголовка X-Request-Timeout: секунды ("2.5") или миллисекунды ("2500ms")."""
+    try:
+        text = value.decode("latin-1").strip().lower()
+        if text.endswith("ms"):
+            return float(text[:-2]) / 1000
+        return float(text.rstrip("s"))
+    except ValueError:
+        return None
+
+
+class DeadlineMiddleware:
+    """Срок обработки запроса: из заголовка X-Request-Timeout (не больше
+    max_timeout) или по префиксу пути, иначе default_timeout.
+
+    Срок доступен сервисам и хранилищам через remaining и timeout.
+    После срока или отключения клиента обработка запроса отменяется,
+    если ответ ещё не начат - клиент получает 504.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            default_timeout: float,
+            max_timeout: float,
+            timeout_by_path: Optional[Dict[str, float]] = None) -> None:
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        # более длинные префиксы проверяются первыми
+        self.timeout_by_path = sorted(
+            (timeout_by_path or {}).items(),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+
+    def timeout_for(self, scope: Scope) -> float:
+        for name, value in scope.get("headers", []):
+            if name == TIMEOUT_HEADER:
+                requested = parse_timeout(value)
+                if requested is not None and requested > 0:
+                    return min(requested, self.max_timeout)
+        for prefix, value in self.timeout_by_path:
+            if scope["path"].startswith(prefix):
+                return value
+        return self.default_timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_timeout = self.timeout_for(scope)
+        set_timeout(request_timeout)
+        response_started = False
+        disconnected = asyncio.Event()
+        messages: "asyncio.Queue[Message]" = asyncio.Queue()
+
+        async def listen_for_disconnect():
+            # сообщения клиента читаются здесь, чтобы заметить отключение
+            # и во время обработки, приложение получает их из очереди
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        # задача копирует контекст со сроком запроса
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send_wrapper))
+        listener = asyncio.ensure_future(listen_for_disconnect())
+        waiter = asyncio.ensure_future(disconnected.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {handler, waiter},
+                timeout=request_timeout,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        except asyncio.CancelledError:
+            handler.cancel()
+            raise
+        finally:
+            listener.cancel()
+            waiter.cancel()
+
+        if handler in done:
+            handler.result()
+            return
+
+        handler.cancel()
+        try:
+            await handler
+        except asyncio.CancelledError:
+            pass
+        if disconnected.is_set():
+            logger.info(f"client disconnected, request {scope['path']} cancelled")
+            return
+        logger.warning(f"request {scope['path']} exceeded its deadline of {request_timeout:.3f}s")
+        if not response_started:
+            await send_deadline_exceeded(send)
+
+
+async def send_deadline_exceeded(send: Send):
+    await send({
+        "type": "http.response.start",
+        "status": HTTPStatus.GATEWAY_TIMEOUT,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(DEADLINE_EXCEEDED_BODY)).encode())],
+    })
+    await send({"type": "http.response.body", "body": DEADLINE_EXCEEDED_BODY})
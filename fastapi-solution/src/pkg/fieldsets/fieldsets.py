@@ -0,0 +1,64 @@
+from typing import Iterable, Optional, Tuple, Type
+
+from fastapi import Query
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel
+from pydantic.error_wrappers import ErrorWrapper
+
+# поля, которые всегда запрашиваются из хранилища (нужны моделям сервисов)
+REQUIRED_SOURCE_FIELDS = ("id",)
+
+
+class SparseFields:
+    """Зависимость для параметра fields - списка полей ответа через запятую.
+
+    Поля проверяются по модели ответа (принимаются и имена, и алиасы полей),
+    результат - отсортированный кортеж ключей ответа или None, если
+    параметр не передан.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.response_keys = {}
+        for name, field in model.__fields__.items():
+            self.response_keys[name] = field.alias
+            self.response_keys[field.alias] = field.alias
+
+    def __call__(
+            self,
+            fields: Optional[str] = Query(
+                default=None,
+                title="Response fields",
+                description="Comma separated list of fields to include in response records.",
+                example="id,title",
+            )
+    ) -> Optional[Tuple[str, ...]]:
+        if not fields:
+            return None
+
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = sorted(names - self.response_keys.keys())
+        if unknown or not names:
+            raise RequestValidationError([
+                ErrorWrapper(
+                    ValueError(
+                        f"unknown fields: {', '.join(unknown)}; "
+                        f"allowed: {', '.join(sorted(set(self.response_keys.values())))}"
+                    ),
+                    loc=("query", "fields")
+                )
+            ])
+        return tuple(sorted({self.response_keys[name] for name in names}))
+
+
+def source_fields(fields: Iterable[str]) -> Tuple[str, ...]:
+    """Поля, которые нужно получить из хранилища для запрошенных полей ответа."""
+    return tuple(sorted(set(fields).union(REQUIRED_SOURCE_FIELDS)))
+
+
+def fields_cache_suffix(fields: Optional[Tuple[str, ...]]) -> str:
+    return f"_fields_{','.join(fields)}" if fields else ""
+
+
+def project(data: dict, fields: Iterable[str]) -> dict:
+    return {field: data.get(field) for field in fields}
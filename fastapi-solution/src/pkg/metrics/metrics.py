@@ -0,0 +1,229 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм задержек (сек)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# charset добавляется Response для text/*
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Префиксы ключей кэша для меток счётчиков (более длинные проверяются первыми),
+# чтобы количество значений метки не зависело от количества ключей
+CACHE_KEY_PREFIXES = (
+    "film_by_person",
+    "films_",
+    "film_",
+    "person_list",
+    "person_id_",
+    "person_",
+    "genre_list",
+    "genre_",
+    "response_",
+    "cache_generation",
+)
+OTHER_PREFIX = "other"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def cache_key_prefix(key: str) -> str:
+    """Префикс ключа кэша для метки счётчика.
+
+    Args:
+        key: ключ кэша
+    Returns: str, известный префикс без "_" на конце или "other"
+    """
+    for prefix in CACHE_KEY_PREFIXES:
+        if key.startswith(prefix):
+            return prefix.rstrip("_")
+    return OTHER_PREFIX
+
+
+class Counter:
+    """Счётчик с метками, значения хранятся в памяти процесса."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for labels, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram:
+    """Гистограмма с метками.
+
+    На каждое наблюдение увеличивается одна корзина, накопительные
+    значения (как того требует формат Prometheus) считаются при выдаче.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # по каждому набору меток: счётчики корзин (последняя - +Inf) и сумма
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def time(self, *labels: str) -> _Timer:
+        """Замер длительности блока with."""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        labelnames = self.labelnames + ("le",)
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(labelnames, labels + (_format_value(bound),)),
+                    cumulative
+                )
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total[0]
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    """Набор метрик, выдаваемых в текстовом формате Prometheus."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[object]:
+        return self._metrics.get(name)
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route"),
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total",
+    "HTTP requests by route and status code.",
+    ("method", "route", "status"),
+))
+ELASTIC_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "elastic_request_duration_seconds",
+    "Elasticsearch request latency by operation and index.",
+    ("operation", "index"),
+))
+CACHE_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "cache_request_duration_seconds",
+    "Redis cache request latency by operation.",
+    ("operation",),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total",
+    "Cache lookups by tier (l1, redis), key prefix and result (hit, tombstone, miss, error, set_error, skipped).",
+    ("tier", "prefix", "result"),
+))
+BACKOFF_RETRIES = REGISTRY.register(Counter(
+    "backoff_retries_total",
+    "Retries of backend calls by called function.",
+    ("target",),
+))
+CIRCUIT_BREAKER_TRANSITIONS = REGISTRY.register(Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes by breaker and new state.",
+    ("breaker", "state"),
+))
+CIRCUIT_BREAKER_REJECTED = REGISTRY.register(Counter(
+    "circuit_breaker_rejected_total",
+    "Calls rejected by an open circuit breaker.",
+    ("breaker",),
+))
+CACHE_HEALTH_TRANSITIONS = REGISTRY.register(Counter(
+    "cache_health_transitions_total",
+    "Cache storage availability changes by storage and new state (up, down).",
+    ("storage", "state"),
+))
+CONCURRENCY_LIMIT_REJECTED = REGISTRY.register(Counter(
+    "concurrency_limit_rejected_total",
+    "Calls rejected by a concurrency limiter by reason (queue_full, deadline).",
+    ("limiter", "reason"),
+))
+CONCURRENCY_LIMIT_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "concurrency_limit_queue_wait_seconds",
+    "Time calls spent waiting in a concurrency limiter queue.",
+    ("limiter",),
+))
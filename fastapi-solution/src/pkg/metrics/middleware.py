@@ -0,0 +1,65 @@
+import time
+from typing import Callable, Dict, Optional
+
+from pkg.metrics.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# метка для запросов, не попавших ни в один маршрут
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """Замер задержки и подсчёт ответов HTTP запросов по маршрутам.
+
+    Метка route - шаблон пути маршрута (/api/v1/films/{film_id}), а не сам
+    путь, чтобы количество значений метки не зависело от id в запросах.
+    Должен подключаться последним, чтобы учитывать и ответы из кэша.
+    """
+
+    def __init__(self, app: ASGIApp, routes_provider: Callable[[], list], skip_paths=("/metrics",)) -> None:
+        self.app = app
+        self.routes_provider = routes_provider
+        self.skip_paths = frozenset(skip_paths)
+        self._route_by_endpoint: Optional[Dict[Callable, str]] = None
+
+    def route_name(self, scope: Scope) -> str:
+        routes = self.routes_provider()
+        # роутер сохраняет найденный обработчик в scope
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            if self._route_by_endpoint is None:
+                self._route_by_endpoint = {
+                    route.endpoint: route.path for route in routes if hasattr(route, "endpoint")
+                }
+            path = self._route_by_endpoint.get(endpoint)
+            if path is not None:
+                return path
+        # ответ отдан до роутера (например, из кэша ответов)
+        route: BaseRoute
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", UNMATCHED_ROUTE)
+        return UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self.route_name(scope)
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
@@ -0,0 +1,76 @@
+import base64
+import binascii
+import hashlib
+from typing import Any, List, NamedTuple, Optional
+
+import orjson
+
+# значение курсора для запроса первой страницы
+FIRST_PAGE_CURSOR = "*"
+# источник страниц курсора: поиск в ES по PIT
+ELASTIC_CURSOR_SOURCE = "es"
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class Cursor(NamedTuple):
+    """Позиция в выдаче: PIT, search_after и запрос, для которого она получена.
+
+    index и query (хэш тела запроса) не дают продолжить курсором
+    обход другого индекса или другого запроса, source - источник страниц,
+    которым курсор получен (ES или снимок индекса в памяти).
+    """
+    pit_id: str
+    search_after: List[Any]
+    index: str
+    query: str
+    source: str = ELASTIC_CURSOR_SOURCE
+
+
+def query_digest(body: dict) -> str:
+    """Хэш тела запроса для сверки курсора с запросом."""
+    return hashlib.sha1(orjson.dumps(body, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Упаковка позиции в непрозрачную для клиента строку."""
+    return base64.urlsafe_b64encode(
+        orjson.dumps({
+            "pit": cursor.pit_id,
+            "after": cursor.search_after,
+            "index": cursor.index,
+            "query": cursor.query,
+            "source": cursor.source,
+        })
+    ).decode("ascii")
+
+
+def decode_cursor(value: str) -> Optional[Cursor]:
+    """Распаковка курсора, None - запрос первой страницы.
+
+    :raises InvalidCursorError: курсор повреждён
+    """
+    if value == FIRST_PAGE_CURSOR:
+        return None
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+        cursor = Cursor(
+            pit_id=data["pit"],
+            search_after=data["after"],
+            index=data["index"],
+            query=data["query"],
+            source=data["source"]
+        )
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursorError(value)
+    if not (
+        isinstance(cursor.pit_id, str)
+        and isinstance(cursor.search_after, list)
+        and isinstance(cursor.index, str)
+        and isinstance(cursor.query, str)
+        and isinstance(cursor.source, str)
+    ):
+        raise InvalidCursorError(value)
+    return cursor
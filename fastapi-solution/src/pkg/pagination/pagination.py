@@ -1,5 +1,9 @@
+from typing import Optional
+
 from fastapi import Query
 
+from .cursor import FIRST_PAGE_CURSOR
+
 
 class Paginator:
     def __init__(
@@ -16,7 +20,19 @@ class Paginator:
                 title="Page number",
                 description="Pagination page number.",
                 alias="page[number]"
+            ),
+            cursor: Optional[str] = Query(
+                default=None,
+                title="Page cursor",
+                description=(
+                    "Cursor pagination for deep pages: pass "
+                    f"'{FIRST_PAGE_CURSOR}' for the first page, then "
+                    "next_cursor from the previous response. "
+                    "page[number] is ignored in this mode."
+                ),
+                alias="page[cursor]"
             )
     ):
         self.page_size = page_size
         self.page_number = page_number
+        self.cursor = cursor
@@ -0,0 +1,133 @@
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, urlencode
+
+import orjson
+from pkg.cache_storage.storage import ABSCacheStorage
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "response_"
+CACHE_STATUS_HEADER = b"x-cache"
+
+
+def encode_response(status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> bytes:
+    """Упаковка ответа: строка json с заголовками, затем тело как есть."""
+    meta = orjson.dumps({
+        "status": status,
+        "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+    })
+    return meta + b"\n" + body
+
+
+def decode_response(data: bytes) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    meta, body = data.split(b"\n", 1)
+    meta = orjson.loads(meta)
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in meta["headers"]]
+    return meta["status"], headers, body
+
+
+def query_param_prefixes(params: Iterable[str]) -> Tuple[bytes, ...]:
+    """Начала параметров в строке запроса: параметр может прийти
+    как в исходном, так и в url-кодированном виде."""
+    return tuple(
+        variant.encode("latin-1") + b"="
+        for param in params
+        for variant in {param, quote(param, safe="")}
+    )
+
+
+def has_query_param(query_string: bytes, prefixes: Tuple[bytes, ...]) -> bool:
+    if not prefixes or not query_string:
+        return False
+    query_string = b"&" + query_string
+    return any(b"&" + prefix in query_string for prefix in prefixes)
+
+
+class ResponseCacheMiddleware:
+    """Кэширование готовых (сериализованных) ответов GET запросов.
+
+    Ключ кэша - путь и отсортированные параметры запроса. Время жизни
+    задаётся по префиксу пути, пути без ttl (или с ttl 0) не кэшируются,
+    как и запросы с параметрами из skip_query_params.
+    key_suffix_provider добавляет к ключу версию данных (поколения кэша).
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            storage_provider: Callable[[], ABSCacheStorage],
+            ttl_by_path: Dict[str, int],
+            skip_query_params: Iterable[str] = (),
+            key_suffix_provider: Optional[Callable[[], Awaitable[str]]] = None,
+    ) -> None:
+        self.app = app
+        self.storage_provider = storage_provider
+        self.key_suffix_provider = key_suffix_provider
+        self.skip_query_params = query_param_prefixes(skip_query_params)
+        # более длинные префиксы проверяются первыми
+        self.ttl_by_path = sorted(ttl_by_path.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def ttl_for(self, path: str) -> int:
+        for prefix, ttl in self.ttl_by_path:
+            if path.startswith(prefix):
+                return ttl
+        return 0
+
+    @staticmethod
+    def cache_key(scope: Scope, suffix: str = "") -> str:
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        return f"{CACHE_KEY_PREFIX}{scope['method']}_{scope['path']}?{query}{suffix}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        ttl = self.ttl_for(scope["path"])
+        if ttl <= 0 or has_query_param(scope["query_string"], self.skip_query_params):
+            await self.app(scope, receive, send)
+            return
+
+        storage = self.storage_provider()
+        suffix = await self.key_suffix_provider() if self.key_suffix_provider else ""
+        key = self.cache_key(scope, suffix)
+        cached = await storage.get_data(key)
+        if cached:
+            status, headers, body = decode_response(cached)
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": headers + [(CACHE_STATUS_HEADER, b"HIT")],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        response_start: Optional[Message] = None
+        body_parts = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_start
+            if message["type"] == "http.response.start":
+                response_start = message
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(CACHE_STATUS_HEADER, b"MISS")],
+                }
+            elif message["type"] == "http.response.body":
+                body_parts.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        if response_start is None or response_start["status"] != 200:
+            return
+        headers = list(response_start.get("headers", []))
+        if any(name.lower() == b"set-cookie" for name, _ in headers):
+            return
+        await storage.set_data(
+            key,
+            encode_response(response_start["status"], headers, b"".join(body_parts)),
+            expire=ttl
+        )
@@ -0,0 +1,95 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING_HEADER = b"server-timing"
+TOTAL_METRIC = "total"
+
+# Длительности (мс) по этапам обработки текущего запроса, None - вне запроса
+# или заголовок отключен. Задачи, запущенные из запроса, пишут в тот же словарь.
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timings", default=None)
+
+
+def record(name: str, duration_ms: float) -> None:
+    """Учёт длительности этапа в текущем запросе, длительности одного этапа суммируются.
+
+    Args:
+        name: название этапа (cache, es, serialize ...)
+        duration_ms: длительность в миллисекундах
+    """
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + duration_ms
+
+
+class _Timed:
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Timed":
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.timings is not None:
+            duration_ms = (time.perf_counter() - self.started) * 1000
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + duration_ms
+
+
+def timed(name: str) -> _Timed:
+    """Замер длительности блока with как этапа текущего запроса."""
+    return _Timed(name)
+
+
+def format_header(timings: Dict[str, float]) -> bytes:
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items()).encode("latin-1")
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse, учитывающий сериализацию тела как этап serialize."""
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing с длительностями этапов обработки запроса.
+
+    Этапы записываются через record и timed в контекст запроса,
+    total - время от начала обработки до отправки заголовков ответа.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                header = dict(timings)
+                header[TOTAL_METRIC] = (time.perf_counter() - started) * 1000
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(SERVER_TIMING_HEADER, format_header(header))],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from pkg.deadline import deadline
+from pkg.deadline.deadline import DeadlineExceededError
+
+
+class _Call:
+    __slots__ = ("future", "deadline", "waiters")
+
+    def __init__(self, future: asyncio.Future, shared_deadline: deadline.SharedDeadline) -> None:
+        self.future = future
+        self.deadline = shared_deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Объединение одновременных вызовов с одинаковым ключом.
+
+    Пока вызов по ключу выполняется, остальные корутины с тем же ключом
+    не запускают свой, а ждут результат (или исключение) первого.
+    Срок общего вызова - наибольший из сроков ожидающих, а не срок
+    запроса, который его начал: каждый ожидающий ждёт не дольше своего
+    срока (DeadlineExceededError). Если все ожидающие отменены или их
+    сроки истекли, вызов тоже отменяется.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            # вызов выполняется отдельной задачей, чтобы отмена первого
+            # запроса (например, клиент отключился) не отменяла остальные
+            shared_deadline = deadline.SharedDeadline(deadline.current())
+            call = _Call(asyncio.ensure_future(self._run(func, shared_deadline)), shared_deadline)
+            self._calls[key] = call
+            call.future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            call.deadline.extend(deadline.current())
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.future), deadline.timeout())
+        except asyncio.CancelledError:
+            self._leave(call)
+            raise
+        except asyncio.TimeoutError:
+            if call.future.done():
+                # исключение самого вызова
+                raise
+            self._leave(call)
+            raise DeadlineExceededError() from None
+        finally:
+            call.waiters -= 1
+
+    @staticmethod
+    async def _run(func: Callable[[], Awaitable[Any]], shared_deadline: deadline.SharedDeadline) -> Any:
+        deadline.set_shared(shared_deadline)
+        return await func()
+
+    @staticmethod
+    def _leave(call: _Call):
+        """Ожидающий больше не ждёт: без ожидающих вызов не нужен."""
+        if call.waiters == 1 and not call.future.done():
+            call.future.cancel()
+
+    def _forget(self, key: str, future: asyncio.Future):
+        call = self._calls.get(key)
+        if call is not None and call.future is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # исключение уже получено ожидающими, помечаем его обработанным
+            future.exception()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pkg.cache_generation.generations import CacheGenerations
+from pkg.storage.storage import ABSStorage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Снимок индекса: записи, их json и поиск по id."""
+    records: List[dict]
+    by_id: Dict[str, dict]
+    serialized: List[bytes]
+    serialized_by_id: Dict[str, bytes]
+    generation: int
+    loaded_at: float
+
+
+class IndexSnapshot:
+    """Снимок небольшого индекса целиком в памяти процесса.
+
+    Загружается одним scroll и заменяется новым снимком целиком, так что
+    читатели всегда видят согласованные данные. Перезагружается раз в
+    refresh_interval секунд или при смене поколения кэша индекса.
+    """
+
+    def __init__(
+            self,
+            storage: ABSStorage,
+            generations: CacheGenerations,
+            index_name: str,
+            serializer: Callable[[dict], bytes],
+            refresh_interval: float,
+            source_includes: Optional[Sequence[str]] = None,
+    ) -> None:
+        self.storage = storage
+        self.generations = generations
+        self.index_name = index_name
+        self.serializer = serializer
+        self.refresh_interval = refresh_interval
+        self.source_includes = source_includes
+        self.current: Optional[Snapshot] = None
+        self.last_error_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def age_seconds(self) -> Optional[float]:
+        if self.current is None:
+            return None
+        return time.time() - self.current.loaded_at
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.current is not None,
+            "records": len(self.current.records) if self.current else 0,
+            "generation": self.current.generation if self.current else None,
+            "age_seconds": self.age_seconds(),
+            "last_error_at": self.last_error_at,
+        }
+
+    async def load(self):
+        async with self._lock:
+            # поколение до чтения: смена во время чтения вызовет ещё одну загрузку
+            generation = await self.generations.get(self.index_name)
+            try:
+                records = await self.storage.get_all(
+                    index_name=self.index_name,
+                    source_includes=self.source_includes
+                )
+            except Exception:
+                self.last_error_at = time.time()
+                raise
+            serialized = [self.serializer(record) for record in records]
+            self.current = Snapshot(
+                records=records,
+                by_id={record["id"]: record for record in records},
+                serialized=serialized,
+                serialized_by_id={
+                    record["id"]: data for record, data in zip(records, serialized)
+                },
+                generation=generation,
+                loaded_at=time.time(),
+            )
+        logger.info(f"snapshot of index {self.index_name} loaded: {len(records)} records")
+
+    async def refresh_periodically(self, check_interval: float):
+        while True:
+            try:
+                if await self._needs_reload():
+                    await self.load()
+            except Exception:
+                logger.exception(f"error while loading snapshot of index {self.index_name}")
+            await asyncio.sleep(check_interval)
+
+    async def _needs_reload(self) -> bool:
+        if self.current is None or self.age_seconds() >= self.refresh_interval:
+            return True
+        return await self.generations.get(self.index_name) != self.current.generation
@@ -1,45 +1,231 @@
+import asyncio
 import logging
-from functools import lru_cache
-from typing import Dict, Union
+import time
+from functools import lru_cache, partial, wraps
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import backoff
-from db import elastic_queries
+import orjson
+from core import config
 from db.elastic import get_elastic
-from elasticsearch import ConnectionError, Elasticsearch, NotFoundError
+from elasticsearch import (ConnectionError, ConnectionTimeout, Elasticsearch,
+                           NotFoundError, RequestError, TransportError)
+from elasticsearch.exceptions import HTTP_EXCEPTIONS
+from elasticsearch.helpers import async_scan
 from fastapi import Depends
+from pkg.circuit_breaker.circuit_breaker import CircuitBreaker
+from pkg.concurrency_limit.limiter import AdaptiveLimiter
+from pkg.deadline import deadline
+from pkg.deadline.deadline import DeadlineExceededError
+from pkg.metrics.metrics import ELASTIC_REQUEST_DURATION
+from pkg.server_timing import server_timing
 from pkg.storage.storage import ABSStorage
 
 from ..backoff_handlers.req_handler import create_backoff_hdlr
 
 logger = logging.getLogger(__name__)
 
+# Части ответа на поиск, которые используются сервисами
+SEARCH_FILTER_PATH = (
+    "took",
+    "pit_id",
+    "hits.total.value",
+    "hits.hits._source",
+    "hits.hits.sort",
+)
+
 BACKOFF_MAX_TIME = 60  # sec
 back_off_hdlr = create_backoff_hdlr(logger)
 
 
+def is_elastic_failure(exc: Exception) -> bool:
+    """Ошибка недоступности или перегрузки ES, а не ответ на запрос."""
+    if isinstance(exc, ConnectionError):
+        return True
+    if isinstance(exc, TransportError):
+        return not isinstance(exc.status_code, int) or exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def request_params(**params) -> dict:
+    """Параметры запроса к ES с таймаутом по оставшемуся сроку запроса."""
+    request_timeout = deadline.timeout()
+    if request_timeout is not None:
+        params["request_timeout"] = request_timeout
+    return params
+
+
+async def _call_within_deadline(method, *args, **kwargs):
+    try:
+        return await method(*args, **kwargs)
+    except ConnectionTimeout as exc:
+        # ES не ответил за оставшийся срок запроса: это не ошибка ES
+        if deadline.expired():
+            raise DeadlineExceededError() from exc
+        raise
+
+
+def guarded(method):
+    """Вызов метода в пределах срока запроса, через self.breaker
+    и self.limiter, если они заданы.
+
+    Применяется под backoff: повторы идут, только пока автомат закрыт
+    и срок не истёк, CircuitOpenError, LimitExceededError
+    и DeadlineExceededError не повторяются. Открытый автомат отклоняет
+    вызов до очереди ограничителя.
+    """
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        deadline.check()
+        call = _call_within_deadline
+        if self.limiter is not None:
+            call = partial(self.limiter.call, call)
+        if self.breaker is not None:
+            call = partial(self.breaker.call, call)
+        return await call(method, self, *args, **kwargs)
+    return wrapper
+
+
+class MSearchBatcher:
+    """Объединение параллельных поисков в один запрос _msearch.
+
+    Поиски, пришедшие в течение окна window_seconds (или пока их меньше
+    max_batch_size), отправляются одним запросом, ответы раздаются
+    ожидающим корутинам. Ошибка отдельного поиска достаётся только ему.
+    Поиски с разным filter_path попадают в разные пачки. Таймаут запроса
+    пачки - наименьший оставшийся срок запросов, чьи поиски в ней.
+    """
+
+    def __init__(self, elastic: Elasticsearch, window_seconds: float, max_batch_size: int) -> None:
+        self.elastic = elastic
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        # по filter_path: заголовок, тело, срок запроса и ожидающий результат
+        self._batches: Dict[Tuple[str, ...], List[Tuple[dict, dict, Optional[float], asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[str, ...], asyncio.TimerHandle] = {}
+        self._send_tasks: Set[asyncio.Task] = set()
+
+    async def search(
+            self,
+            index_name: str,
+            body: dict,
+            filter_path: Optional[Sequence[str]] = None) -> Dict:
+        loop = asyncio.get_event_loop()
+        key = tuple(filter_path or ())
+        future = loop.create_future()
+        batch = self._batches.setdefault(key, [])
+        batch.append(({"index": index_name}, body, deadline.current(), future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window_seconds, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Tuple[str, ...]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(key, batch))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _send(
+            self,
+            filter_path: Tuple[str, ...],
+            batch: List[Tuple[dict, dict, Optional[float], asyncio.Future]]):
+        logger.debug(f"sending {len(batch)} searches in one msearch")
+        body = []
+        for header, item, _, _ in batch:
+            body.extend((header, item))
+        params = {}
+        # поиски отменённых запросов (истёк срок, клиент отключился) не в счёт
+        deadlines = [
+            request_deadline for _, _, request_deadline, future in batch
+            if request_deadline is not None and not future.done()
+        ]
+        if deadlines:
+            # нулевой таймаут транспорт считает отсутствием таймаута
+            params["request_timeout"] = max(min(deadlines) - time.monotonic(), 0.001)
+        if filter_path:
+            # status остаётся в каждом ответе, чтобы ES не выкинул
+            # пустые элементы и ответы совпадали с запросами по позиции
+            params["filter_path"] = [
+                f"responses.{path}" for path in filter_path + ("status", "error")
+            ]
+
+        try:
+            response = await self.elastic.msearch(body=body, **params)
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, _, future), item in zip(batch, response["responses"]):
+            if future.done():
+                continue
+            if "error" in item:
+                status = item.get("status", 500)
+                error = item["error"]
+                error_type = error.get("type") if isinstance(error, dict) else error
+                future.set_exception(
+                    HTTP_EXCEPTIONS.get(status, TransportError)(status, error_type, item)
+                )
+            else:
+                future.set_result(item)
+
+
 class ElasticService(ABSStorage):
-    def __init__(self, elastic: Elasticsearch) -> None:
+    def __init__(self,
+                 elastic: Elasticsearch,
+                 batcher: Optional[MSearchBatcher] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 limiter: Optional[AdaptiveLimiter] = None) -> None:
         self.elastic = elastic
-        self.queries = elastic_queries
+        self.batcher = batcher
+        self.breaker = breaker
+        self.limiter = limiter
 
     @backoff.on_exception(
         backoff.fibo,
         ConnectionError,
         max_time=BACKOFF_MAX_TIME,
         on_backoff=back_off_hdlr,
+        giveup=deadline.giveup,
     )
+    @guarded
     async def get_by_id(self,
                         id: str,
-                        index_name: str) -> Union[Dict, None]:
+                        index_name: str,
+                        source_includes: Optional[Sequence[str]] = None,
+                        source_excludes: Optional[Sequence[str]] = None,
+                        filter_path: Optional[Sequence[str]] = None) -> Union[Dict, None]:
         """Получения записи из эластика по id.
 
         :param id:
         :param index_name:
+        :param source_includes: поля _source, которые нужно вернуть
+        :param source_excludes: поля _source, которые возвращать не нужно
+        :param filter_path: части ответа, которые нужно вернуть
         :return:
         """
         logger.info(f"getting data from elastic index:{index_name} by id:{id}")
         try:
-            doc = await self.elastic.get(index_name, id)
+            with ELASTIC_REQUEST_DURATION.time("get", index_name), server_timing.timed("es"):
+                doc = await self.elastic.get(
+                    index_name,
+                    id,
+                    **request_params(
+                        _source_includes=source_includes,
+                        _source_excludes=source_excludes,
+                        filter_path=filter_path
+                    )
+                )
         except NotFoundError:
             logger.info(f"data not found.")
             return None
@@ -50,30 +236,230 @@ class ElasticService(ABSStorage):
         ConnectionError,
         max_time=BACKOFF_MAX_TIME,
         on_backoff=back_off_hdlr,
+        giveup=deadline.giveup,
     )
+    @guarded
+    async def get_by_ids(self,
+                         ids: List[str],
+                         index_name: str,
+                         source_includes: Optional[Sequence[str]] = None,
+                         source_excludes: Optional[Sequence[str]] = None) -> List[Optional[Dict]]:
+        """Получение записей из эластика по списку id одним запросом (_mget).
+
+        :param ids:
+        :param index_name:
+        :param source_includes: поля _source, которые нужно вернуть
+        :param source_excludes: поля _source, которые возвращать не нужно
+        :return: записи в порядке ids, None для ненайденных
+        """
+        logger.info(f"getting {len(ids)} docs from elastic index:{index_name}")
+        with ELASTIC_REQUEST_DURATION.time("mget", index_name), server_timing.timed("es"):
+            response = await self.elastic.mget(
+                body={"ids": ids},
+                index=index_name,
+                **request_params(
+                    _source_includes=source_includes,
+                    _source_excludes=source_excludes
+                )
+            )
+        return [
+            doc if doc.get("found") else None
+            for doc in response["docs"]
+        ]
+
+    @backoff.on_exception(
+        backoff.fibo,
+        ConnectionError,
+        max_time=BACKOFF_MAX_TIME,
+        on_backoff=back_off_hdlr,
+        giveup=deadline.giveup,
+    )
+    @guarded
     async def search(
             self,
-            query: Dict,
-            index_name: str) -> Union[Dict, None]:
+            query: Union[Dict, str],
+            index_name: str,
+            source_includes: Optional[Sequence[str]] = None,
+            source_excludes: Optional[Sequence[str]] = None,
+            filter_path: Optional[Sequence[str]] = SEARCH_FILTER_PATH) -> Union[Dict, None]:
         """Поиск в эластике c использованием запроса.
 
-        :param query:
+        :param query: тело запроса, dict или уже сериализованное
         :param index_name:
+        :param source_includes: поля _source, которые нужно вернуть
+        :param source_excludes: поля _source, которые возвращать не нужно
+        :param filter_path: части ответа, которые нужно вернуть,
+            без найденных записей ответ не содержит hits.hits
         :return:
         """
         logger.info(f"searching data in elastic index:{index_name}")
-        doc = await self.elastic.search(
-            index=index_name,
-            body=query
+        params = request_params(
+            _source_includes=source_includes,
+            _source_excludes=source_excludes,
+            filter_path=filter_path
         )
+        search_timeout = self._search_timeout()
+        if search_timeout is not None:
+            params["timeout"] = search_timeout
+        if isinstance(query, dict) and "pit" in query:
+            # запрос с point in time не должен указывать индекс,
+            # а истёкший или неверный PIT (и не подходящий к сортировке
+            # search_after из курсора клиента) считается ненайденными данными
+            try:
+                with ELASTIC_REQUEST_DURATION.time("search", index_name), server_timing.timed("es"):
+                    return await self.elastic.search(body=query, **params)
+            except NotFoundError:
+                logger.info(f"point in time not found.")
+                return None
+            except RequestError as exc:
+                logger.info(f"point in time search rejected: {exc.error}")
+                return None
+        # при объединении в _msearch замеряется ожидание всей пачки
+        with ELASTIC_REQUEST_DURATION.time("search", index_name), server_timing.timed("es"):
+            if self.batcher is not None:
+                body = self._msearch_body(query, source_includes, source_excludes)
+                if search_timeout is not None:
+                    body["timeout"] = search_timeout
+                doc = await self.batcher.search(index_name, body, filter_path)
+            else:
+                doc = await self.elastic.search(
+                    index=index_name,
+                    body=query,
+                    **params
+                )
+        if "took" in doc:
+            server_timing.record("es_took", doc["took"])
         total_count = doc.get('hits', {}).get('total', {}).get('value')
         if not total_count:
-            logger.info(f"searched data not found")       
+            logger.info(f"searched data not found")
         return doc
 
+    @staticmethod
+    def _search_timeout() -> Optional[str]:
+        """Таймаут поиска на стороне ES: оставшийся срок запроса."""
+        search_timeout = deadline.timeout()
+        if search_timeout is None:
+            return None
+        return f"{max(1, int(search_timeout * 1000))}ms"
+
+    @staticmethod
+    def _msearch_body(
+            query: Union[Dict, str],
+            source_includes: Optional[Sequence[str]],
+            source_excludes: Optional[Sequence[str]]) -> dict:
+        """Тело поиска для _msearch: фильтрация _source задаётся в самом теле."""
+        body = orjson.loads(query) if isinstance(query, (str, bytes)) else dict(query)
+        source = {}
+        if source_includes:
+            source["includes"] = list(source_includes)
+        if source_excludes:
+            source["excludes"] = list(source_excludes)
+        if source:
+            body["_source"] = source
+        return body
+
+    @backoff.on_exception(
+        backoff.fibo,
+        ConnectionError,
+        max_time=BACKOFF_MAX_TIME,
+        on_backoff=back_off_hdlr,
+        giveup=deadline.giveup,
+    )
+    @guarded
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        """Открытие point in time для постраничного поиска через search_after.
+
+        :param index_name:
+        :param keep_alive: время жизни PIT между запросами, например "1m"
+        :return: id PIT
+        """
+        logger.info(f"opening point in time for elastic index:{index_name}")
+        response = await self.elastic.transport.perform_request(
+            "POST",
+            f"/{index_name}/_pit",
+            params=request_params(keep_alive=keep_alive)
+        )
+        return response["id"]
+
+    @guarded
+    async def close_point_in_time(self, pit_id: str):
+        """Закрытие point in time после последней страницы, чтобы ES
+        не держал контекст поиска до истечения keep_alive.
+
+        :param pit_id: id PIT
+        """
+        logger.info(f"closing point in time")
+        try:
+            await self.elastic.transport.perform_request(
+                "DELETE",
+                "/_pit",
+                body={"id": pit_id},
+                params=request_params()
+            )
+        except NotFoundError:
+            logger.info(f"point in time already closed.")
+
+    @backoff.on_exception(
+        backoff.fibo,
+        ConnectionError,
+        max_time=BACKOFF_MAX_TIME,
+        on_backoff=back_off_hdlr,
+        giveup=deadline.giveup,
+    )
+    @guarded
+    async def get_all(self,
+                      index_name: str,
+                      source_includes: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Получение всех записей индекса через scroll.
+
+        Подходит только для небольших индексов (справочников).
+
+        :param index_name:
+        :param source_includes: поля _source, которые нужно вернуть
+        :return: _source всех записей
+        """
+        logger.info(f"scrolling all docs from elastic index:{index_name}")
+        return [
+            doc["_source"]
+            async for doc in async_scan(
+                self.elastic,
+                index=index_name,
+                query={"query": {"match_all": {}}},
+                _source_includes=source_includes,
+                scroll="1m"
+            )
+        ]
+
 
 @lru_cache()
 def get_elastic_storage_service(
         elastic: Elasticsearch = Depends(get_elastic),
 ) -> ElasticService:
-    return ElasticService(elastic)
+    batcher = None
+    if config.ELASTIC_MSEARCH_ENABLED:
+        batcher = MSearchBatcher(
+            elastic,
+            window_seconds=config.ELASTIC_MSEARCH_WINDOW_MS / 1000,
+            max_batch_size=config.ELASTIC_MSEARCH_MAX_BATCH_SIZE
+        )
+    breaker = None
+    if config.ELASTIC_BREAKER_ENABLED:
+        breaker = CircuitBreaker(
+            "elastic",
+            failure_threshold=config.ELASTIC_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=config.ELASTIC_BREAKER_RECOVERY_SECONDS,
+            half_open_max_calls=config.ELASTIC_BREAKER_HALF_OPEN_CALLS,
+            is_failure=is_elastic_failure
+        )
+    limiter = None
+    if config.ELASTIC_LIMIT_ENABLED:
+        limiter = AdaptiveLimiter(
+            "elastic",
+            initial_limit=config.ELASTIC_LIMIT_INITIAL,
+            min_limit=config.ELASTIC_LIMIT_MIN,
+            max_limit=config.ELASTIC_LIMIT_MAX,
+            max_queue=config.ELASTIC_LIMIT_QUEUE_SIZE,
+            latency_tolerance=config.ELASTIC_LIMIT_LATENCY_TOLERANCE,
+            is_failure=is_elastic_failure
+        )
+    return ElasticService(elastic, batcher, breaker, limiter)
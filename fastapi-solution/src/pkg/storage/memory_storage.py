@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import orjson
+from core import config
+from pkg.storage.storage import ABSStorage
+
+logger = logging.getLogger(__name__)
+
+# Количество одновременно открытых point in time, старые забываются
+MAX_POINTS_IN_TIME = 1000
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _tokens(value: Any) -> set:
+    return set(_TOKEN_RE.findall(str(value).lower()))
+
+
+def _field_values(doc: Any, path: Sequence[str]) -> List[Any]:
+    """Значения поля документа по пути, списки раскрываются."""
+    if isinstance(doc, list):
+        return [value for item in doc for value in _field_values(item, path)]
+    if not path:
+        return [doc]
+    if not isinstance(doc, dict) or path[0] not in doc:
+        return []
+    return _field_values(doc[path[0]], path[1:])
+
+
+class _NestedDoc(dict):
+    """Вложенный документ: поля ищутся по полному пути без разбиения на части."""
+
+
+def _lookup(doc: dict, field: str) -> List[Any]:
+    if isinstance(doc, _NestedDoc):
+        return [doc[field]] if field in doc else []
+    return _field_values(doc, field.split("."))
+
+
+def _match_score(doc: dict, field: str, value: Any) -> float:
+    """Приближение match запроса ES: совпадение значения целиком
+    или хотя бы одного слова (как у standard анализатора)."""
+    query_tokens = _tokens(value)
+    score = 0.0
+    for field_value in _lookup(doc, field):
+        if field_value == value:
+            score += len(query_tokens) or 1
+            continue
+        score += len(query_tokens & _tokens(field_value))
+    return score
+
+
+def _clause_score(doc: dict, clause: dict) -> Optional[float]:
+    """Оценка условия запроса для документа, None - документ не подходит.
+
+    Поддерживаются условия, которые строит db.query_builder:
+    match_all, match, nested, bool (must, filter, should).
+    """
+    if "match_all" in clause:
+        return 1.0
+    if "match" in clause:
+        field, value = next(iter(clause["match"].items()))
+        if isinstance(value, dict):
+            value = value.get("query")
+        score = _match_score(doc, field, value)
+        return score or None
+    if "nested" in clause:
+        path = clause["nested"]["path"]
+        prefix = f"{path}."
+        best = None
+        for item in _field_values(doc, path.split(".")):
+            if not isinstance(item, dict):
+                continue
+            # поля вложенного документа в запросе указаны с путём
+            nested_doc = {f"{prefix}{key}": value for key, value in item.items()}
+            score = _clause_score(_NestedDoc(nested_doc), clause["nested"]["query"])
+            if score is not None and (best is None or score > best):
+                best = score
+        return best
+    if "bool" in clause:
+        return _bool_score(doc, clause["bool"])
+    raise ValueError(f"unsupported query clause: {list(clause)}")
+
+
+def _bool_score(doc: dict, bool_query: dict) -> Optional[float]:
+    score = 0.0
+    for clause in bool_query.get("must", []):
+        clause_score = _clause_score(doc, clause)
+        if clause_score is None:
+            return None
+        score += clause_score
+    for clause in bool_query.get("filter", []):
+        if _clause_score(doc, clause) is None:
+            return None
+    should = bool_query.get("should", [])
+    if should:
+        matched = [
+            clause_score for clause_score in (_clause_score(doc, clause) for clause in should)
+            if clause_score is not None
+        ]
+        default_minimum = 0 if bool_query.get("must") or bool_query.get("filter") else 1
+        if len(matched) < bool_query.get("minimum_should_match", default_minimum):
+            return None
+        score += sum(matched)
+    return score or 1.0
+
+
+def _project(source: dict,
+             source_includes: Optional[Sequence[str]],
+             source_excludes: Optional[Sequence[str]]) -> dict:
+    if source_includes:
+        source = {key: value for key, value in source.items() if key in source_includes}
+    if source_excludes:
+        source = {key: value for key, value in source.items() if key not in source_excludes}
+    return source
+
+
+def _sort_spec(sort: list) -> List[Tuple[str, str]]:
+    """Сортировка запроса в виде списка (поле, порядок)."""
+    spec = []
+    for item in sort:
+        if isinstance(item, str):
+            # как в ES: по релевантности по убыванию, по остальным полям по возрастанию
+            spec.append((item, "desc" if item == "_score" else "asc"))
+            continue
+        field, options = next(iter(item.items()))
+        spec.append((field, options.get("order", "asc") if isinstance(options, dict) else options))
+    return spec
+
+
+def _sort_key(value: Any, order: str) -> Tuple:
+    # документы без значения поля идут последними при любом порядке
+    if value is None:
+        return (1, 0)
+    return (0, -value if order == "desc" else value)
+
+
+class InMemoryStorage(ABSStorage):
+    """Хранилище в памяти процесса вместо Elasticsearch.
+
+    Понимает запросы, которые строит db.query_builder, и отвечает в том же
+    формате, что и ES (с учётом filter_path по умолчанию), включая
+    постраничный поиск в рамках point in time. latency - задержка
+    (сек) каждого обращения, имитирующая сетевой запрос.
+    Предназначено для замеров и профилирования без внешних сервисов.
+    """
+
+    def __init__(self, indexes: Dict[str, List[dict]], latency: float = 0) -> None:
+        self.indexes = {index_name: list(docs) for index_name, docs in indexes.items()}
+        self.by_id = {
+            index_name: {str(doc["id"]): doc for doc in docs}
+            for index_name, docs in self.indexes.items()
+        }
+        self.latency = latency
+        self._points_in_time: "OrderedDict[str, Tuple[str, List[dict]]]" = OrderedDict()
+
+    async def _wait(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    async def get_by_id(self,
+                        id: str,
+                        index_name: str,
+                        source_includes: Optional[Sequence[str]] = None,
+                        source_excludes: Optional[Sequence[str]] = None,
+                        filter_path: Optional[Sequence[str]] = None) -> Union[Dict, None]:
+        await self._wait()
+        source = self.by_id.get(index_name, {}).get(id)
+        if source is None:
+            return None
+        return {
+            "_index": index_name,
+            "_id": id,
+            "found": True,
+            "_source": _project(source, source_includes, source_excludes),
+        }
+
+    async def get_by_ids(self,
+                         ids: List[str],
+                         index_name: str,
+                         source_includes: Optional[Sequence[str]] = None,
+                         source_excludes: Optional[Sequence[str]] = None) -> List[Optional[Dict]]:
+        await self._wait()
+        docs = self.by_id.get(index_name, {})
+        return [
+            {"_index": index_name, "_id": id, "found": True,
+             "_source": _project(docs[id], source_includes, source_excludes)}
+            if id in docs else None
+            for id in ids
+        ]
+
+    async def search(
+            self,
+            query: Union[Dict, str],
+            index_name: str,
+            source_includes: Optional[Sequence[str]] = None,
+            source_excludes: Optional[Sequence[str]] = None,
+            filter_path: Optional[Sequence[str]] = None) -> Union[Dict, None]:
+        await self._wait()
+        started = time.perf_counter()
+        body = orjson.loads(query) if isinstance(query, (str, bytes)) else query
+
+        pit_id = None
+        docs = self.indexes.get(index_name, [])
+        if "pit" in body:
+            pit_id = body["pit"]["id"]
+            point_in_time = self._points_in_time.get(pit_id)
+            if point_in_time is None:
+                # как истёкший PIT в ElasticService
+                return None
+            _, docs = point_in_time
+
+        scored = []
+        query_clause = body.get("query", {"match_all": {}})
+        for position, doc in enumerate(docs):
+            score = _clause_score(doc, query_clause)
+            if score is not None:
+                scored.append((position, score, doc))
+
+        sort_values = None
+        if body.get("sort"):
+            spec = _sort_spec(body["sort"])
+            if pit_id is not None and "_shard_doc" not in (field for field, _ in spec):
+                # неявный тай-брейкер _shard_doc в рамках PIT
+                spec.append(("_shard_doc", "asc"))
+            sort_values = {}
+            for position, score, doc in scored:
+                values = []
+                for field, _ in spec:
+                    if field == "_shard_doc":
+                        values.append(position)
+                        continue
+                    if field == "_score":
+                        values.append(score)
+                        continue
+                    field_values = _lookup(doc, field)
+                    values.append(field_values[0] if field_values else None)
+                sort_values[position] = values
+
+            def sort_key(values: list) -> Tuple:
+                return tuple(_sort_key(value, order) for value, (_, order) in zip(values, spec))
+
+            scored.sort(key=lambda hit: sort_key(sort_values[hit[0]]))
+            if "search_after" in body:
+                after = sort_key(body["search_after"])
+                scored = [hit for hit in scored if sort_key(sort_values[hit[0]]) > after]
+        else:
+            scored.sort(key=lambda hit: -hit[1])
+
+        offset_from = body.get("from", 0)
+        page = scored[offset_from:offset_from + body.get("size", 10)]
+        hits = []
+        for position, score, doc in page:
+            hit = {"_id": str(doc["id"]), "_source": _project(doc, source_includes, source_excludes)}
+            if sort_values is not None:
+                hit["sort"] = sort_values[position]
+            hits.append(hit)
+
+        response = {
+            "took": int((time.perf_counter() - started) * 1000),
+            "hits": {"total": {"value": len(scored)}, "hits": hits},
+        }
+        if pit_id is not None:
+            response["pit_id"] = pit_id
+        return response
+
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        await self._wait()
+        pit_id = uuid.uuid4().hex
+        self._points_in_time[pit_id] = (index_name, list(self.indexes.get(index_name, [])))
+        while len(self._points_in_time) > MAX_POINTS_IN_TIME:
+            self._points_in_time.popitem(last=False)
+        return pit_id
+
+    async def close_point_in_time(self, pit_id: str):
+        await self._wait()
+        self._points_in_time.pop(pit_id, None)
+
+    async def get_all(self,
+                      index_name: str,
+                      source_includes: Optional[Sequence[str]] = None) -> List[Dict]:
+        await self._wait()
+        return [_project(doc, source_includes, None) for doc in self.indexes.get(index_name, [])]
+
+
+def load_dataset(path: str) -> Dict[str, List[dict]]:
+    """Данные хранилища из json файла вида {"индекс": [документы]}."""
+    with open(path, "rb") as dataset_file:
+        return orjson.loads(dataset_file.read())
+
+
+def generate_dataset(films: int, persons: int, genres: int, seed: int = 0) -> Dict[str, List[dict]]:
+    """Синтетические данные индексов movies, person и genres.
+
+    Данные одинаковые при одинаковых параметрах, чтобы замеры были сравнимы.
+    """
+    rnd = random.Random(seed)
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+    words = ("star", "wars", "night", "city", "last", "dream", "river", "storm",
+             "shadow", "king", "love", "war", "space", "time", "lost", "home")
+    genre_names = ("Action", "Adventure", "Animation", "Biography", "Comedy", "Crime",
+                   "Documentary", "Drama", "Family", "Fantasy", "History", "Horror",
+                   "Music", "Mystery", "Romance", "Sci-Fi", "Sport", "Thriller", "War", "Western")
+    genre_docs = [
+        {"id": new_id(), "name": genre_names[number % len(genre_names)] + str(number // len(genre_names) or "")}
+        for number in range(genres)
+    ]
+    person_docs = [
+        {"id": new_id(), "full_name": f"{rnd.choice(words).title()} {rnd.choice(words).title()} {number}"}
+        for number in range(persons)
+    ]
+    film_docs = []
+    for number in range(films):
+        actors = rnd.sample(person_docs, min(len(person_docs), 4))
+        writers = rnd.sample(person_docs, min(len(person_docs), 2))
+        title = " ".join(rnd.choice(words) for _ in range(3)).title()
+        film_docs.append({
+            "id": new_id(),
+            "imdb_rating": round(rnd.uniform(1, 10), 1),
+            "genre": [genre["name"] for genre in rnd.sample(genre_docs, min(len(genre_docs), 3))],
+            "title": f"{title} {number}",
+            "description": " ".join(rnd.choice(words) for _ in range(30)),
+            "director": rnd.choice(person_docs)["full_name"] if person_docs else None,
+            "actors_names": [actor["full_name"] for actor in actors],
+            "writers_names": [writer["full_name"] for writer in writers],
+            "actors": [{"id": actor["id"], "name": actor["full_name"]} for actor in actors],
+            "writers": [{"id": writer["id"], "name": writer["full_name"]} for writer in writers],
+        })
+    return {"movies": film_docs, "person": person_docs, "genres": genre_docs}
+
+
+@lru_cache()
+def get_memory_storage_service() -> InMemoryStorage:
+    if config.MEMORY_STORAGE_DATA_PATH:
+        dataset = load_dataset(config.MEMORY_STORAGE_DATA_PATH)
+    else:
+        dataset = generate_dataset(
+            films=config.MEMORY_STORAGE_FILMS,
+            persons=config.MEMORY_STORAGE_PERSONS,
+            genres=config.MEMORY_STORAGE_GENRES,
+        )
+    logger.info(f"in-memory storage with {', '.join(f'{len(docs)} {name}' for name, docs in dataset.items())}")
+    return InMemoryStorage(dataset, latency=config.MEMORY_STORAGE_LATENCY_MS / 1000)
@@ -7,6 +7,22 @@ class ABSStorage(ABC):
     def get_by_id(self, **kwargs):
         pass
 
+    @abstractmethod
+    def get_by_ids(self, **kwargs):
+        pass
+
     @abstractmethod
     def search(self, **kwargs):
         pass
+
+    @abstractmethod
+    def open_point_in_time(self, **kwargs):
+        pass
+
+    @abstractmethod
+    def close_point_in_time(self, **kwargs):
+        pass
+
+    @abstractmethod
+    def get_all(self, **kwargs):
+        pass
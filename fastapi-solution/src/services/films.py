@@ -1,53 +1,130 @@
-import json
 import logging
-from functools import lru_cache
+from functools import lru_cache, partial
 from typing import List, Optional, Tuple
 
+from db.query_builder import SORT_ASC, SORT_DESC, SearchQuery, films_query
 from fastapi import Depends
 from models.film import FilmFull
-from pkg.cache_storage.redis_storage import get_redis_storage_service
+from pkg.cache_generation.generations import (CacheGenerations,
+                                              get_cache_generations)
+from pkg.cache_storage.lru_storage import get_cache_storage_service
 from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.fieldsets.fieldsets import fields_cache_suffix, source_fields
 from pkg.storage.elastic_storage import get_elastic_storage_service
 from pkg.storage.storage import ABSStorage
 
-from .service import ABSService
+from .service import CachedService
 
 logger = logging.getLogger(__name__)
 
 FILMS_INDEX_NAME = "movies"
+# поля фильма, которые не используются в ответах API
+FILM_SOURCE_EXCLUDES = ("actors_names", "writers_names")
 
 
-class FilmService(ABSService):
+def film_source_filter(fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """Фильтрация _source: только запрошенные поля или все, кроме неиспользуемых."""
+    if fields:
+        return {"source_includes": source_fields(fields)}
+    return {"source_excludes": FILM_SOURCE_EXCLUDES}
+
+
+class FilmService(CachedService):
+    service_name = "films"
+    cached_models = (FilmFull,)
+
     def __init__(
         self,
         storage: ABSStorage,
-        cache_storage: ABSCacheStorage
+        cache_storage: ABSCacheStorage,
+        generations: CacheGenerations
     ):
-        self.cache_storage = cache_storage
+        super().__init__(cache_storage, generations)
         self.storage = storage
 
-    async def get_by_id(self, film_id: str) -> Optional[FilmFull]:
+    async def get_by_id(
+            self,
+            film_id: str,
+            fields: Optional[Tuple[str, ...]] = None
+    ) -> Optional[FilmFull]:
         """
         Get filmwork by id from es or cache.
+        With fields only these fields (and id) are fetched.
+        """
+        film_source = await self.get_source_by_id(film_id, fields)
+        if film_source:
+            return FilmFull.trusted(film_source)
+
+        return None
+
+    async def get_source_by_id(
+            self,
+            film_id: str,
+            fields: Optional[Tuple[str, ...]] = None
+    ) -> Optional[dict]:
+        """
+        Get filmwork document source, validated by FilmFull, by id from es
+        or cache. With fields only these fields (and id) are fetched.
         """
         logger.info("FilmService get_by_id started...")
 
-        logger.info("Trying to get film from cache.")
-        film_data = await self.cache_storage.get_data(f"film_{film_id}")
-        if film_data:
-            return FilmFull(**json.loads(film_data))
+        cache_key = await self._cache_key(
+            FILMS_INDEX_NAME,
+            f"film_{film_id}{fields_cache_suffix(fields)}"
+        )
+        film_source = await self._get_cached(
+            cache_key,
+            partial(self._load_by_id, cache_key, film_id, fields),
+            FilmFull.validated
+        )
+        return film_source or None
+
+    async def get_by_ids(self, film_ids: List[str]) -> List[Optional[FilmFull]]:
+        """
+        Get filmworks by ids list from cache and es, None for not found ones.
+        """
+        return [
+            FilmFull.trusted(film_source) if film_source else None
+            for film_source in await self.get_sources_by_ids(film_ids)
+        ]
 
+    async def get_sources_by_ids(self, film_ids: List[str]) -> List[Optional[dict]]:
+        """
+        Get filmworks document sources, validated by FilmFull, by ids list
+        from cache and es, None for not found ones.
+        """
+        logger.info("FilmService get_by_ids started...")
+
+        return await self._get_many_by_ids(
+            self.storage,
+            FILMS_INDEX_NAME,
+            await self._cache_keys(FILMS_INDEX_NAME, [f"film_{film_id}" for film_id in film_ids]),
+            film_ids,
+            self._load_by_id,
+            FilmFull.validated,
+            source_excludes=FILM_SOURCE_EXCLUDES
+        )
+
+    async def _load_by_id(
+            self,
+            cache_key: str,
+            film_id: str,
+            fields: Optional[Tuple[str, ...]] = None
+    ) -> Optional[dict]:
         logger.info("Trying to get film from elastic.")
-        film_doc = await self.storage.get_by_id(film_id, FILMS_INDEX_NAME)
-        if film_doc:
-            logger.info("Caching film that have been found in storage.")
-            await self.cache_storage.set_data(
-                f"film_{film_id}",
-                json.dumps(film_doc['_source'])
-            )
-            return FilmFull(**film_doc['_source'])
+        film_doc = await self.storage.get_by_id(
+            film_id,
+            FILMS_INDEX_NAME,
+            **film_source_filter(fields)
+        )
+        if not film_doc:
+            await self._set_missing(cache_key)
+            return None
 
-        return None
+        film_source = FilmFull.validated(film_doc['_source'])
+        logger.info("Caching film that have been found in storage.")
+        await self._set_cached(cache_key, film_source)
+        return film_source
 
     async def get_list(
             self,
@@ -55,15 +132,49 @@ class FilmService(ABSService):
             genres: Optional[List[str]],
             sort: str,
             page_number: int,
-            page_size: int
-    ) -> Tuple[int, List[FilmFull]]:
+            page_size: int,
+            cursor: Optional[str] = None,
+            fields: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[int, List[FilmFull], Optional[str]]:
+        """
+        Get filtred filmworks list from cache or es, see get_list_sources.
+        """
+        total_count, sources, next_cursor = await self.get_list_sources(
+            name, genres, sort, page_number, page_size, cursor, fields
+        )
+        return total_count, [FilmFull.trusted(source) for source in sources], next_cursor
+
+    async def get_list_sources(
+            self,
+            name: Optional[str],
+            genres: Optional[List[str]],
+            sort: str,
+            page_number: int,
+            page_size: int,
+            cursor: Optional[str] = None,
+            fields: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[int, List[dict], Optional[str]]:
         """
-        Get filtred filmworks list from cache or es
+        Get filtred filmworks document sources, validated by FilmFull,
+        from cache or es.
+        With cursor the page is searched after cursor position in es
+        and the next page cursor is returned.
+        With fields only these fields (and id) are fetched.
         """
         logger.info("FilmService get films list started...")
 
-        logger.info(f"Trying to get films from cache.")
-        cache_key = "films_{}".format(
+        if cursor is not None:
+            query = self._films_query(name, genres, sort, 1, page_size)
+            total_count, hits, next_cursor = await self._search_page(
+                self.storage,
+                FILMS_INDEX_NAME,
+                query.to_dict(),
+                cursor,
+                **film_source_filter(fields)
+            )
+            return total_count, [FilmFull.validated(hit['_source']) for hit in hits], next_cursor
+
+        cache_key = await self._cache_key(FILMS_INDEX_NAME, "films_{}".format(
             '_'.join(
                 filter(
                     None,
@@ -76,111 +187,92 @@ class FilmService(ABSService):
                     )
                 )
             )
+        ) + fields_cache_suffix(fields))
+        films_data = await self._get_cached(
+            cache_key,
+            partial(
+                self._load_list,
+                cache_key,
+                name,
+                genres,
+                sort,
+                page_number,
+                page_size,
+                fields
+            ),
+            self._validate_list
         )
-        films_bytes = await self.cache_storage.get_data(cache_key)
-        if films_bytes:
-            cached_json = json.loads(films_bytes.decode("utf-8"))
-            films = [
-                FilmFull(**film) for film in cached_json["source"]
-            ]
-            return cached_json["total_count"], films
+        if films_data is None:
+            # отметка пустого поиска
+            return 0, [], None
+        return films_data["total_count"], films_data["source"], None
 
+    async def _load_list(
+            self,
+            cache_key: str,
+            name: Optional[str],
+            genres: Optional[List[str]],
+            sort: str,
+            page_number: int,
+            page_size: int,
+            fields: Optional[Tuple[str, ...]] = None
+    ) -> dict:
         logger.info("Trying to get films from elastic.")
-        query_body = await self._create_films_req_body(
-            name,
-            genres,
-            sort,
-            page_number,
-            page_size
+        query = self._films_query(name, genres, sort, page_number, page_size)
+        doc = await self.storage.search(
+            index_name=FILMS_INDEX_NAME,
+            query=query.to_json(),
+            **film_source_filter(fields)
         )
-        doc = await self.storage.search(index_name='movies', query=query_body)
-        total_count = doc.get('hits', {}).get('total', {}).get('value')
-        hits_sources = [
-            hit['_source'] for hit in doc.get('hits', {}).get('hits', [])
-        ]
-        films = [FilmFull(**hit_source) for hit_source in hits_sources]
+        films_data = {
+            "total_count": doc.get('hits', {}).get('total', {}).get('value'),
+            "source": [
+                FilmFull.validated(hit['_source']) for hit in doc.get('hits', {}).get('hits', [])
+            ]
+        }
 
-        if films:
+        if films_data["source"]:
             logger.info("Caching films that have been found in storage.")
-            await self.cache_storage.set_data(
-                cache_key,
-                json.dumps({"total_count": total_count,
-                            "source": hits_sources})
-            )
+            await self._set_cached(cache_key, films_data)
+        elif not films_data["total_count"]:
+            # страница за последней (total_count больше 0) не кэшируется,
+            # отметка хранит только то, что фильмов нет совсем
+            await self._set_missing(cache_key)
 
-        return total_count, films
+        return films_data
 
-    async def _create_films_req_body(
-            self,
+    @staticmethod
+    def _validate_list(films_data: dict) -> dict:
+        return {
+            "total_count": films_data["total_count"],
+            "source": [FilmFull.validated(film) for film in films_data["source"]]
+        }
+
+    @staticmethod
+    def _films_query(
             name: Optional[str],
             genres: Optional[List[str]],
             sort: str,
             page_number: int,
             page_size: int
-    ) -> dict:
-        body = {
-            "query": {
-                "bool": {
-                    "must": [],
-                    "must_not": [],
-                    "should": []
-                }
-            },
-            "from": (page_number - 1) * page_size,
-            "size": page_size,
-            "sort": [],
-            "aggs": {}
-        }
-
-        if sort == "asc_rating":
-            order = "asc"
-        else:
-            order = "desc"
-        body["sort"].append(
-            {
-                "imdb_rating": {
-                    "order": order
-                }
-            }
+    ) -> SearchQuery:
+        return films_query(
+            name,
+            tuple(genres) if genres else None,
+            SORT_ASC if sort == "asc_rating" else SORT_DESC,
+            (page_number - 1) * page_size,
+            page_size
         )
 
-        if name:
-            body["query"]["bool"]["must"].append(
-                {
-                    "match": {
-                        "title": name
-                    }
-                }
-            )
-        else:
-            body["query"]["bool"]["must"].append(
-                {
-                    "match_all": {}
-                }
-            )
-
-        if genres:
-            genres_body = {
-                "bool": {
-                    "should": []
-                }
-            }
-            for genre in genres:
-                genres_body["bool"]["should"].append(
-                    {
-                        "match": {
-                            "genre": genre
-                        }
-                    },
-                )
-
-            body["query"]["bool"]["must"].append(genres_body)
-        return body
-
 
 @lru_cache()
 def get_film_service(
-        cache_storage: ABSCacheStorage = Depends(get_redis_storage_service),
+        cache_storage: ABSCacheStorage = Depends(get_cache_storage_service),
         elastic: ABSStorage = Depends(get_elastic_storage_service),
+        generations: CacheGenerations = Depends(get_cache_generations),
 ) -> FilmService:
-    return FilmService(storage=elastic, cache_storage=cache_storage)
+    return FilmService(
+        storage=elastic,
+        cache_storage=cache_storage,
+        generations=generations
+    )
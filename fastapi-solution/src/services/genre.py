@@ -1,55 +1,215 @@
-import json
-from functools import lru_cache
-from typing import List, Optional, Tuple, Union
+from functools import lru_cache, partial
+from typing import List, Optional, Tuple
 
-from db.elastic_queries import match_query
+import orjson
+from core import config
+from db.query_builder import match_all
 from fastapi import Depends
 from models.genre import Genres
-from pkg.cache_storage.redis_storage import get_redis_storage_service
+from pkg.cache_generation.generations import (CacheGenerations,
+                                              get_cache_generations)
+from pkg.cache_storage.lru_storage import get_cache_storage_service
 from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.pagination.cursor import (Cursor, InvalidCursorError, decode_cursor,
+                                   encode_cursor)
+from pkg.snapshot.index_snapshot import IndexSnapshot
 from pkg.storage.elastic_storage import get_elastic_storage_service
 from pkg.storage.storage import ABSStorage
 
+from .service import CachedService, validated_hits
 
-class GenreService:
+GENRES_INDEX_NAME = 'genres'
+GENRE_SOURCE_INCLUDES = ("id", "name")
+# источник курсоров страниц снимка: они содержат смещение вместо search_after
+SNAPSHOT_CURSOR_SOURCE = 'genres-snapshot'
 
-    def __init__(self, elastic: ABSStorage, cache_storage: ABSCacheStorage):
-        self.cache_storage = cache_storage
+
+def serialize_genre(source: dict) -> bytes:
+    """Жанр в json в том виде, в котором он отдаётся API."""
+    return orjson.dumps({"id": source["id"], "name": source.get("name")})
+
+
+class GenreService(CachedService):
+    """Жанры отдаются из снимка индекса в памяти без обращений к Redis и ES,
+    пока снимок не загружен - через кэш и хранилище.
+    """
+    service_name = 'genres'
+    cached_models = (Genres,)
+
+    def __init__(self,
+                 elastic: ABSStorage,
+                 cache_storage: ABSCacheStorage,
+                 generations: CacheGenerations,
+                 snapshot: Optional[IndexSnapshot] = None):
+        super().__init__(cache_storage, generations)
         self.elastic = elastic
+        self.snapshot = snapshot
+
+    @property
+    def snapshot_loaded(self) -> bool:
+        return self.snapshot is not None and self.snapshot.current is not None
+
+    def get_serialized_by_id(self, genre_id: str) -> Optional[bytes]:
+        """Жанр в json из снимка.
+
+        Args:
+            genre_id: str
+        Returns: Optional[bytes], None если жанра нет
+        """
+        return self.snapshot.current.serialized_by_id.get(genre_id)
+
+    def serves_from_snapshot(self, cursor: Optional[str] = None) -> bool:
+        """Отдаётся ли страница из снимка.
+
+        Курсор поиска в ES продолжает обход в ES и при загруженном снимке.
+
+        Args:
+            cursor: курсор страницы
+        Returns: bool
+        :raises InvalidCursorError: курсор повреждён
+        """
+        if not self.snapshot_loaded:
+            return False
+        if cursor is None:
+            return True
+        position = decode_cursor(cursor)
+        return position is None or position.source == SNAPSHOT_CURSOR_SOURCE
+
+    def get_serialized_list(self,
+                            page_size: int,
+                            offset_from: int,
+                            cursor: Optional[str] = None,
+                            ) -> Tuple[int, List[bytes], Optional[str]]:
+        """Страница жанров в json из снимка.
+
+        Args:
+            page_size: int
+            offset_from: int
+            cursor: курсор страницы снимка, если задан - offset_from не используется
+
+        Returns: общее количество, жанры в json, курсор следующей страницы
+        """
+        return self._snapshot_page(self.snapshot.current.serialized, page_size, offset_from, cursor)
+
+    @classmethod
+    def _snapshot_page(cls,
+                       items: list,
+                       page_size: int,
+                       offset_from: int,
+                       cursor: Optional[str]) -> Tuple[int, list, Optional[str]]:
+        next_cursor = None
+        if cursor is not None:
+            offset_from = cls._snapshot_offset(cursor, decode_cursor(cursor))
+            next_cursor = cls._snapshot_cursor(offset_from, page_size, len(items))
+        return len(items), items[offset_from:offset_from + page_size], next_cursor
+
+    @staticmethod
+    def _snapshot_offset(cursor: str, position: Optional[Cursor]) -> int:
+        """Смещение страницы из курсора снимка.
+
+        :raises InvalidCursorError: курсор не является курсором снимка
+        """
+        if position is None:
+            return 0
+        if (
+            position.source != SNAPSHOT_CURSOR_SOURCE
+            or position.index != GENRES_INDEX_NAME
+            or len(position.search_after) != 1
+            or not isinstance(position.search_after[0], int)
+            or position.search_after[0] < 0
+        ):
+            raise InvalidCursorError(cursor)
+        return position.search_after[0]
+
+    @staticmethod
+    def _snapshot_cursor(offset_from: int, page_size: int, total: int) -> Optional[str]:
+        if offset_from + page_size >= total:
+            return None
+        return encode_cursor(Cursor(
+            pit_id="",
+            search_after=[offset_from + page_size],
+            index=GENRES_INDEX_NAME,
+            query="",
+            source=SNAPSHOT_CURSOR_SOURCE
+        ))
 
     async def get_list(self,
                        page_size: int,
-                       offset_from: int) -> Union[Tuple[Optional[int], Optional[List[Genres]]], Tuple[None, None]]:
+                       offset_from: int,
+                       cursor: Optional[str] = None,
+                       ) -> Tuple[Optional[int], Optional[List[Genres]], Optional[str]]:
         """Получение списка жанров.
 
+        Курсор снимка, пока снимок не загружен, продолжает обход
+        чтением из ES по смещению.
+
         Args:
             page_size: int
             offset_from: int
+            cursor: курсор страницы, если задан - offset_from не используется
 
-        Returns: Optional[List[Genres]]
+        Returns: общее количество, Optional[List[Genres]], курсор следующей страницы
         """
-        cashed_data = await self.cache_storage.get_data(key=f'genre_list{page_size}{offset_from}')
-        if cashed_data:
-            genre_list = [Genres(**d['_source']) for d in json.loads(cashed_data.decode('utf8'))['data']]
-            total = json.loads(cashed_data.decode('utf8'))['total']
-            return total, genre_list
-
-        query = match_query(match_value={"match_all": {}}, offset_from=offset_from, page_size=page_size)
-        elastic_response = await self.elastic.search(index_name='genres', query=query)
-        total = elastic_response['hits']['total']['value']
-        genre_list = [Genres(**p['_source']) for p in elastic_response['hits']['hits']]
-
-        redis_json = {
-            'total': total,
-            'data': elastic_response['hits']['hits']
-        }
-        await self.cache_storage.set_data(key=f'genre_list{page_size}{offset_from}',
-                                          data=json.dumps(redis_json))
+        if self.serves_from_snapshot(cursor):
+            total, records, next_cursor = self._snapshot_page(
+                self.snapshot.current.records, page_size, offset_from, cursor
+            )
+            if not records:
+                return None, None, None
+            return total, [Genres(**record) for record in records], next_cursor
+
+        position = decode_cursor(cursor) if cursor is not None else None
+        if position is not None and position.source == SNAPSHOT_CURSOR_SOURCE:
+            offset_from = self._snapshot_offset(cursor, position)
+            total, genre_list, _ = await self._get_cached_list(page_size, offset_from)
+            if not genre_list:
+                return None, None, None
+            return total, genre_list, self._snapshot_cursor(offset_from, page_size, total)
+
+        if cursor is not None:
+            query = match_all(offset_from=offset_from, page_size=page_size)
+            total, hits, next_cursor = await self._search_page(
+                self.elastic, GENRES_INDEX_NAME, query.to_dict(), cursor,
+                source_includes=GENRE_SOURCE_INCLUDES
+            )
+            if not hits:
+                return None, None, None
+            return total, [Genres(**hit['_source']) for hit in hits], next_cursor
+
+        return await self._get_cached_list(page_size, offset_from)
+
+    async def _get_cached_list(self,
+                               page_size: int,
+                               offset_from: int,
+                               ) -> Tuple[Optional[int], Optional[List[Genres]], Optional[str]]:
+        cache_key = await self._cache_key(GENRES_INDEX_NAME, f'genre_list{page_size}{offset_from}')
+        cashed_data = await self._get_cached(
+            cache_key,
+            partial(self._load_list, cache_key, page_size, offset_from),
+            partial(validated_hits, Genres)
+        )
+        genre_list = [Genres.trusted(d['_source']) for d in cashed_data['data']]
 
         if not genre_list:
-            return None, None
+            return None, None, None
+
+        return cashed_data['total'], genre_list, None
+
+    async def _load_list(self, cache_key: str, page_size: int, offset_from: int) -> dict:
+        query = match_all(offset_from=offset_from, page_size=page_size)
+        elastic_response = await self.elastic.search(
+            index_name=GENRES_INDEX_NAME,
+            query=query.to_json(),
+            source_includes=GENRE_SOURCE_INCLUDES
+        )
 
-        return total, genre_list
+        redis_json = validated_hits(Genres, {
+            'total': elastic_response['hits']['total']['value'],
+            'data': elastic_response['hits'].get('hits', [])
+        })
+        await self._set_cached(cache_key, redis_json)
+
+        return redis_json
 
     async def get_by_id(self, genre_id: str) -> Optional[Genres]:
         """Получение жанров по ID
@@ -58,25 +218,77 @@ class GenreService:
             genre_id: str
         Returns: Optional[Genres]
         """
+        if self.snapshot_loaded:
+            genre_source = self.snapshot.current.by_id.get(genre_id)
+            return Genres(**genre_source) if genre_source else None
+
+        cache_key = await self._cache_key(GENRES_INDEX_NAME, f'genre_{genre_id}')
+        genre_source = await self._get_cached(
+            cache_key,
+            partial(self._load_by_id, cache_key, genre_id),
+            Genres.validated
+        )
+        if not genre_source:
+            return None
+
+        return Genres.trusted(genre_source)
+
+    async def get_by_ids(self, genre_ids: List[str]) -> List[Optional[Genres]]:
+        """Получение жанров по списку ID.
+
+        Args:
+            genre_ids: List[str]
+        Returns: List[Optional[Genres]] в порядке genre_ids
+        """
+        if self.snapshot_loaded:
+            by_id = self.snapshot.current.by_id
+            return [Genres(**by_id[genre_id]) if genre_id in by_id else None for genre_id in genre_ids]
 
-        cashed_data = await self.cache_storage.get_data(key=genre_id)
-        if cashed_data:
-            genre = Genres.parse_raw(cashed_data)
-            return genre
+        cache_keys = await self._cache_keys(GENRES_INDEX_NAME, [f'genre_{genre_id}' for genre_id in genre_ids])
+        sources = await self._get_many_by_ids(
+            self.elastic, GENRES_INDEX_NAME, cache_keys, genre_ids, self._load_by_id,
+            Genres.validated, source_includes=GENRE_SOURCE_INCLUDES
+        )
+        return [Genres.trusted(source) if source else None for source in sources]
 
-        doc = await self.elastic.get_by_id(id=genre_id, index_name='genres')
+    async def _load_by_id(self, cache_key: str, genre_id: str) -> Optional[dict]:
+        doc = await self.elastic.get_by_id(
+            id=genre_id,
+            index_name=GENRES_INDEX_NAME,
+            source_includes=GENRE_SOURCE_INCLUDES
+        )
 
         if not doc:
+            await self._set_missing(cache_key)
             return None
-        genre = Genres(**doc['_source'])
-        await self.cache_storage.set_data(key=f"{genre_id}", data=json.dumps(doc['_source']))
+        genre_source = Genres.validated(doc['_source'])
+        await self._set_cached(cache_key, genre_source)
+
+        return genre_source
 
-        return genre
+
+@lru_cache()
+def get_genre_snapshot(
+        elastic: ABSStorage = Depends(get_elastic_storage_service),
+        generations: CacheGenerations = Depends(get_cache_generations),
+) -> Optional[IndexSnapshot]:
+    if not config.GENRE_SNAPSHOT_ENABLED:
+        return None
+    return IndexSnapshot(
+        elastic,
+        generations,
+        GENRES_INDEX_NAME,
+        serialize_genre,
+        refresh_interval=config.GENRE_SNAPSHOT_REFRESH_SECONDS,
+        source_includes=GENRE_SOURCE_INCLUDES
+    )
 
 
 @lru_cache()
 def get_genre_service(
-        redis: ABSCacheStorage = Depends(get_redis_storage_service),
+        redis: ABSCacheStorage = Depends(get_cache_storage_service),
         elastic: ABSStorage = Depends(get_elastic_storage_service),
+        generations: CacheGenerations = Depends(get_cache_generations),
+        snapshot: Optional[IndexSnapshot] = Depends(get_genre_snapshot),
 ) -> GenreService:
-    return GenreService(elastic, redis)
+    return GenreService(elastic, redis, generations, snapshot)
@@ -1,164 +1,254 @@
-import json
-from functools import lru_cache
-from typing import Optional, Tuple, Union
+from functools import lru_cache, partial
+from typing import List, Optional, Tuple, Type
 
-from db.elastic_queries import *
+from db.query_builder import (SearchQuery, films_by_person_query, match_all,
+                              persons_by_name_query)
 from fastapi import Depends
+from models.config import Base
 from models.film import FilmFull
 from models.person import Person
-from pkg.cache_storage.redis_storage import get_redis_storage_service
+from pkg.cache_generation.generations import (CacheGenerations,
+                                              get_cache_generations)
+from pkg.cache_storage.lru_storage import get_cache_storage_service
 from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.fieldsets.fieldsets import fields_cache_suffix, source_fields
 from pkg.storage.elastic_storage import get_elastic_storage_service
 from pkg.storage.storage import ABSStorage
 
+from .service import CachedService, validated_hits
 
-class PersonService:
+PERSON_SOURCE_INCLUDES = ("id", "full_name")
+# фильмам персоны в ответе нужны только эти поля
+FILM_BY_PERSON_SOURCE_INCLUDES = ("id", "title", "imdb_rating")
 
-    def __init__(self, elastic: ABSStorage, cache_storage: ABSCacheStorage):
-        self.cache_storage = cache_storage
+
+def person_source_includes(fields: Optional[Tuple[str, ...]] = None) -> Tuple[str, ...]:
+    """Поля персоны, которые нужно получить из хранилища."""
+    return source_fields(fields) if fields else PERSON_SOURCE_INCLUDES
+
+
+class PersonService(CachedService):
+    service_name = 'person'
+    cached_models = (Person, FilmFull)
+
+    def __init__(self,
+                 elastic: ABSStorage,
+                 cache_storage: ABSCacheStorage,
+                 generations: CacheGenerations):
+        super().__init__(cache_storage, generations)
         self.elastic = elastic
 
-    async def get_by_id(self, person_id: str) -> Optional[Person]:
+    async def get_by_id(self,
+                        person_id: str,
+                        fields: Optional[Tuple[str, ...]] = None) -> Optional[Person]:
         """Получение персоны по ID.
 
         :param person_id: str
+        :param fields: поля ответа, если заданы - получаются только они (и id)
         :return: Optional[Person]
         """
-        cashed_data = await self.cache_storage.get_data(key=person_id)
-        if cashed_data:
-            person = Person.parse_raw(cashed_data)
-            return person
+        cache_key = await self._cache_key('person', f'person_id_{person_id}{fields_cache_suffix(fields)}')
+        person_source = await self._get_cached(
+            cache_key,
+            partial(self._load_by_id, cache_key, person_id, fields),
+            Person.validated
+        )
+        if not person_source:
+            return None
 
-        doc = await self.elastic.get_by_id(id=person_id, index_name='person')
+        return Person.trusted(person_source)
+
+    async def get_by_ids(self, person_ids: List[str]) -> List[Optional[Person]]:
+        """Получение персон по списку ID.
+
+        :param person_ids: List[str]
+        :return: List[Optional[Person]] в порядке person_ids
+        """
+        cache_keys = await self._cache_keys('person', [f'person_id_{person_id}' for person_id in person_ids])
+        sources = await self._get_many_by_ids(
+            self.elastic, 'person', cache_keys, person_ids, self._load_by_id,
+            Person.validated, source_includes=PERSON_SOURCE_INCLUDES
+        )
+        return [Person.trusted(source) if source else None for source in sources]
+
+    async def _load_by_id(self,
+                          cache_key: str,
+                          person_id: str,
+                          fields: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+        doc = await self.elastic.get_by_id(
+            id=person_id,
+            index_name='person',
+            source_includes=person_source_includes(fields)
+        )
 
         if not doc:
+            await self._set_missing(cache_key)
             return None
-        person = Person(**doc['_source'])
-        await self.cache_storage.set_data(key=f"{person_id}", data=json.dumps(doc['_source']))
+        person_source = Person.validated(doc['_source'])
+        await self._set_cached(cache_key, person_source)
 
-        return person
+        return person_source
 
     async def get_list(self,
                        page_size: int,
                        offset_from: int,
-                       ) -> Union[Tuple[Optional[int], Optional[List[Person]]], None]:
+                       cursor: Optional[str] = None,
+                       fields: Optional[Tuple[str, ...]] = None,
+                       ) -> Tuple[Optional[int], Optional[List[Person]], Optional[str]]:
         """Получение списка персон.
 
         :param page_size: int
         :param offset_from: int
-        :return:List[Person]
+        :param cursor: курсор страницы, если задан - offset_from не используется
+        :param fields: поля ответа, если заданы - получаются только они (и id)
+        :return: общее количество, List[Person], курсор следующей страницы
         """
-
-        cashed_data = await self.cache_storage.get_data(key=f'person_list{page_size}{offset_from}')
-        if cashed_data:
-            person_list = [Person(**d['_source']) for d in json.loads(cashed_data.decode('utf8'))['data']]
-            total = json.loads(cashed_data.decode('utf8'))['total']
-            return total, person_list
-
-        query = match_query(match_value={"match_all": {}}, offset_from=offset_from, page_size=page_size)
-        elastic_response = await self.elastic.search(index_name='person', query=json.dumps(query))
-        total = elastic_response['hits']['total']['value']
-        person_list = [Person(**p['_source']) for p in elastic_response['hits']['hits']]
-
-        redis_json = {
-            'total': total,
-            'data': elastic_response['hits']['hits']
-        }
-        await self.cache_storage.set_data(
-            key=f'person_list{page_size}{offset_from}',
-            data=json.dumps(redis_json))
+        query = match_all(offset_from=offset_from, page_size=page_size)
+        if cursor is not None:
+            return await self._search_persons_page(query, cursor, fields)
+        cache_key = await self._cache_key(
+            'person',
+            f'person_list{page_size}{offset_from}{fields_cache_suffix(fields)}'
+        )
+        cashed_data = await self._get_cached(
+            cache_key,
+            partial(
+                self._search_and_cache, cache_key, 'person', Person, query, person_source_includes(fields)
+            ),
+            partial(validated_hits, Person)
+        )
+        person_list = [Person.trusted(d['_source']) for d in cashed_data['data']]
 
         if not person_list:
-            return None, None
+            return None, None, None
 
-        return total, person_list
+        return cashed_data['total'], person_list, None
 
     async def get_by_name(self,
                           name: str,
                           page_size: int,
-                          offset_from: int) -> Union[Tuple[Optional[int], Optional[List[Person]]], None]:
+                          offset_from: int,
+                          cursor: Optional[str] = None,
+                          fields: Optional[Tuple[str, ...]] = None,
+                          ) -> Tuple[Optional[int], Optional[List[Person]], Optional[str]]:
         """Поиск персон по имени.
 
         :param name: str
         :param page_size: int
         :param offset_from: int
-        :return: Optional[List[Person], None]
+        :param cursor: курсор страницы, если задан - offset_from не используется
+        :param fields: поля ответа, если заданы - получаются только они (и id)
+        :return: общее количество, Optional[List[Person]], курсор следующей страницы
         """
-
-        cashed_data = await self.cache_storage.get_data(key=f'person_{name}_{page_size}{offset_from}')
-        if cashed_data:
-            person_list = [Person(**d['_source']) for d in json.loads(cashed_data.decode('utf8'))['data']]
-            total = json.loads(cashed_data.decode('utf8'))['total']
-            return total, person_list
-
-        query = match_query(match_value={"match": {'full_name': name}},
-                            offset_from=offset_from,
-                            page_size=page_size)
-        elastic_response = await self.elastic.search(index_name='person', query=json.dumps(query))
-        total = elastic_response['hits']['total']['value']
-        person_list = [Person(**p['_source']) for p in elastic_response['hits']['hits']]
-
-        redis_json = {
-            'total': total,
-            'data': elastic_response['hits']['hits']
-        }
-        await self.cache_storage.set_data(
-            key=f'person_{name}_{page_size}{offset_from}',
-            data=json.dumps(redis_json))
+        query = persons_by_name_query(name=name, offset_from=offset_from, page_size=page_size)
+        if cursor is not None:
+            return await self._search_persons_page(query, cursor, fields)
+        cache_key = await self._cache_key(
+            'person',
+            f'person_{name}_{page_size}{offset_from}{fields_cache_suffix(fields)}'
+        )
+        cashed_data = await self._get_cached(
+            cache_key,
+            partial(
+                self._search_and_cache, cache_key, 'person', Person, query, person_source_includes(fields)
+            ),
+            partial(validated_hits, Person)
+        )
+        person_list = [Person.trusted(d['_source']) for d in cashed_data['data']]
 
         if not person_list:
-            return None, None
+            return None, None, None
+
+        return cashed_data['total'], person_list, None
 
-        return total, person_list
+    async def _search_persons_page(
+            self,
+            query: SearchQuery,
+            cursor: str,
+            fields: Optional[Tuple[str, ...]] = None,
+    ) -> Tuple[Optional[int], Optional[List[Person]], Optional[str]]:
+        total, hits, next_cursor = await self._search_page(
+            self.elastic, 'person', query.to_dict(), cursor,
+            source_includes=person_source_includes(fields)
+        )
+        if not hits:
+            return None, None, None
+        return total, [Person(**hit['_source']) for hit in hits], next_cursor
 
     async def get_film_by_person(
             self,
             person_id: str,
             page_size: int = 10,
-            offset_from: int = 0) -> Union[Tuple[Optional[int], Optional[List[FilmFull]]], Tuple[None, None]]:
-        """Поиск персон по имени.
+            offset_from: int = 0,
+            cursor: Optional[str] = None,
+    ) -> Tuple[Optional[int], Optional[List[FilmFull]], Optional[str]]:
+        """Поиск фильмов по персоне.
 
         :param person_id: str
         :param page_size: int
         :param offset_from: int
-        :return: Optional[List[FilmFull]]
+        :param cursor: курсор страницы, если задан - offset_from не используется
+        :return: общее количество, Optional[List[FilmFull]], курсор следующей страницы
         """
-
-        cashed_data = await self.cache_storage.get_data(key=f'film_by_person{person_id}{page_size}{offset_from}')
-        if cashed_data:
-            film_list = [FilmFull(**d['_source']) for d in json.loads(cashed_data.decode('utf8'))['data']]
-            total = json.loads(cashed_data.decode('utf8'))['total']
-            return total, film_list
-
-        query = nested_query(condition="should",
-                             nested_filter=[
-                                 {"path": "actors", "value": {"actors.id": person_id}},
-                                 {"path": "writers", "value": {"writers.id": person_id}},
-                             ],
-                             page_size=page_size,
-                             offset_from=offset_from,
-                             )
-        elastic_response = await self.elastic.search(index_name='movies', query=json.dumps(query))
-        total = elastic_response['hits']['total']['value']
-        film_list = [FilmFull(**p['_source']) for p in elastic_response['hits']['hits']]
-
-        redis_json = {
-            'total': total,
-            'data': elastic_response['hits']['hits']
-        }
-        await self.cache_storage.set_data(
-            key=f'film_by_person{person_id}{page_size}{offset_from}',
-            data=json.dumps(redis_json))
+        query = films_by_person_query(person_id=person_id, offset_from=offset_from, page_size=page_size)
+        if cursor is not None:
+            total, hits, next_cursor = await self._search_page(
+                self.elastic, 'movies', query.to_dict(), cursor,
+                source_includes=FILM_BY_PERSON_SOURCE_INCLUDES
+            )
+            if not hits:
+                return None, None, None
+            return total, [FilmFull(**hit['_source']) for hit in hits], next_cursor
+
+        cache_key = await self._cache_key('movies', f'film_by_person{person_id}{page_size}{offset_from}')
+        cashed_data = await self._get_cached(
+            cache_key,
+            partial(
+                self._search_and_cache, cache_key, 'movies', FilmFull, query, FILM_BY_PERSON_SOURCE_INCLUDES
+            ),
+            partial(validated_hits, FilmFull)
+        )
+        film_list = [FilmFull.trusted(d['_source']) for d in cashed_data['data']]
 
         if not film_list:
-            return None, None
+            return None, None, None
+
+        return cashed_data['total'], film_list, None
+
+    async def _search_and_cache(
+            self,
+            cache_key: str,
+            index_name: str,
+            model: Type[Base],
+            query: SearchQuery,
+            source_includes: Tuple[str, ...]) -> dict:
+        """Поиск в хранилище с записью результата в кэш.
+
+        :param cache_key: str
+        :param index_name: str
+        :param model: модель найденных записей, которой они проверяются
+        :param query: SearchQuery
+        :param source_includes: поля записей, которые нужно получить
+        :return: dict
+        """
+        elastic_response = await self.elastic.search(
+            index_name=index_name,
+            query=query.to_json(),
+            source_includes=source_includes
+        )
+        redis_json = validated_hits(model, {
+            'total': elastic_response['hits']['total']['value'],
+            'data': elastic_response['hits'].get('hits', [])
+        })
+        await self._set_cached(cache_key, redis_json)
 
-        return total, film_list
+        return redis_json
 
 
 @lru_cache()
 def get_person_service(
-        redis: ABSCacheStorage = Depends(get_redis_storage_service),
+        redis: ABSCacheStorage = Depends(get_cache_storage_service),
         elastic: ABSStorage = Depends(get_elastic_storage_service),
+        generations: CacheGenerations = Depends(get_cache_generations),
 ) -> PersonService:
-    return PersonService(elastic, redis)
+    return PersonService(elastic, redis, generations)
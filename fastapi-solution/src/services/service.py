@@ -1,4 +1,36 @@
+import asyncio
+import logging
 from abc import ABC, abstractmethod
+from functools import partial
+from typing import (Awaitable, Callable, List, Optional, Sequence, Set,
+                    Tuple, Type)
+
+from core import config
+from models.config import Base, schema_version
+from pkg.cache_generation.generations import CacheGenerations
+from pkg.cache_storage.codec import (TOMBSTONE, decode_entry, encode_entry,
+                                    is_tombstone)
+from pkg.cache_storage.storage import ABSCacheStorage
+from pkg.circuit_breaker.circuit_breaker import CircuitOpenError
+from pkg.concurrency_limit.limiter import LimitExceededError
+from pkg.deadline import deadline
+from pkg.pagination.cursor import (ELASTIC_CURSOR_SOURCE, Cursor,
+                                   InvalidCursorError, decode_cursor,
+                                   encode_cursor, query_digest)
+from pkg.storage.storage import ABSStorage
+from pkg.single_flight.single_flight import SingleFlight
+from pydantic import ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+def validated_hits(model: Type[Base], data: dict) -> dict:
+    """Проверка результата поиска {'total', 'data'} моделью записей,
+    от найденных документов остаётся только _source."""
+    return {
+        'total': data['total'],
+        'data': [{'_source': model.validated(hit['_source'])} for hit in data['data']]
+    }
 
 
 class ABSService(ABC):
@@ -10,3 +42,270 @@ class ABSService(ABC):
     @abstractmethod
     def get_list(self, **kwargs):
         pass
+
+
+class CachedService(ABSService):
+    """Сервис, читающий данные из хранилища через кэш.
+
+    Промахи кэша по одному ключу объединяются: в хранилище идёт
+    только один запрос, остальные ждут его результат.
+    Устаревшие записи отдаются сразу, а обновляются в фоне, в том числе
+    когда хранилище недоступно (открыт circuit breaker): тогда до удаления
+    из кэша отдаются последние полученные данные.
+    Ключи кэша содержат поколение индекса, из которого получены данные.
+    В кэш записываются данные, уже проверенные моделями cached_models:
+    при чтении записи той же версии схемы модели создаются без проверки
+    (Base.trusted), записи другой версии проверяются заново.
+    Ненайденные записи и пустые результаты поиска кэшируются отметкой
+    TOMBSTONE на CACHE_NEGATIVE_TTL_SECONDS: до её истечения повторные
+    запросы получают None без обращения к хранилищу.
+    """
+
+    service_name: str = ""
+    cached_models: Tuple[Type[Base], ...] = ()
+
+    def __init__(
+            self,
+            cache_storage: ABSCacheStorage,
+            generations: CacheGenerations):
+        self.cache_storage = cache_storage
+        self.generations = generations
+        self.schema_version = schema_version(*self.cached_models)
+        self.single_flight = SingleFlight()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+
+    async def _cache_key(self, index_name: str, key: str) -> str:
+        """Ключ кэша с текущим поколением индекса.
+
+        :param index_name: индекс хранилища, из которого получены данные
+        :param key: ключ без поколения
+        :return: str
+        """
+        return f"{key}:g{await self.generations.get(index_name)}"
+
+    async def _cache_keys(self, index_name: str, keys: List[str]) -> List[str]:
+        generation = await self.generations.get(index_name)
+        return [f"{key}:g{generation}" for key in keys]
+
+    async def _get_cached(
+            self,
+            key: str,
+            loader: Callable[[], Awaitable[Optional[dict]]],
+            validate: Callable[[dict], dict]) -> Optional[dict]:
+        """Получение данных из кэша, при промахе - через loader.
+
+        :param key: ключ кэша
+        :param loader: загрузка проверенных данных из хранилища с записью в кэш
+        :param validate: проверка записи кэша другой версии схемы
+        :return: Optional[dict], None и для отметки "не найдено"
+        """
+        data = await self.cache_storage.get_data(key)
+        if data:
+            if is_tombstone(data):
+                return None
+            entry = decode_entry(data, self.schema_version)
+            if entry.trusted:
+                if entry.stale:
+                    self._refresh(key, loader)
+                return entry.payload
+            payload = self._revalidate(key, entry.payload, validate)
+            if payload is not None:
+                self._refresh(key, loader)
+                return payload
+        return await self.single_flight.do(key, loader)
+
+    @staticmethod
+    def _revalidate(key: str, payload: dict, validate: Callable[[dict], dict]) -> Optional[dict]:
+        """Проверка записи кэша, сохранённой при другой версии схемы.
+
+        :return: проверенные данные, None если запись не соответствует схеме
+        """
+        try:
+            return validate(payload)
+        except (ValidationError, KeyError, TypeError):
+            logger.info(f"cache entry {key} does not match current schema")
+            return None
+
+    async def _get_many_by_ids(
+            self,
+            storage: ABSStorage,
+            index_name: str,
+            keys: List[str],
+            ids: List[str],
+            loader: Callable[[str, str], Awaitable[Optional[dict]]],
+            validate: Callable[[dict], dict],
+            source_includes: Optional[Sequence[str]] = None,
+            source_excludes: Optional[Sequence[str]] = None) -> List[Optional[dict]]:
+        """Получение записей по списку id: одно чтение из кэша,
+        затем один запрос в хранилище за теми, которых нет в кэше.
+
+        :param storage: хранилище
+        :param index_name: индекс хранилища
+        :param keys: ключи кэша, по одному на каждый id
+        :param ids: id записей
+        :param loader: загрузка одной записи (key, id), для фонового обновления
+        :param validate: проверка записи моделью
+        :param source_includes: поля записи, которые нужно получить из хранилища
+        :param source_excludes: поля записи, которые получать не нужно
+        :return: записи в порядке ids, None для ненайденных
+        """
+        result = []
+        missed = []
+        for position, data in enumerate(await self.cache_storage.get_many_data(keys)):
+            if not data:
+                result.append(None)
+                missed.append(position)
+                continue
+            if is_tombstone(data):
+                result.append(None)
+                continue
+            entry = decode_entry(data, self.schema_version)
+            payload = entry.payload
+            if not entry.trusted:
+                payload = self._revalidate(keys[position], payload, validate)
+                if payload is None:
+                    result.append(None)
+                    missed.append(position)
+                    continue
+            if entry.stale or not entry.trusted:
+                self._refresh(keys[position], partial(loader, keys[position], ids[position]))
+            result.append(payload)
+
+        if not missed:
+            return result
+
+        docs = await storage.get_by_ids(
+            ids=[ids[position] for position in missed],
+            index_name=index_name,
+            source_includes=source_includes,
+            source_excludes=source_excludes
+        )
+        writes = []
+        for position, doc in zip(missed, docs):
+            if doc:
+                result[position] = validate(doc['_source'])
+                writes.append(self._set_cached(keys[position], result[position]))
+            else:
+                writes.append(self._set_missing(keys[position]))
+        await asyncio.gather(*writes)
+
+        return result
+
+    async def _search_page(
+            self,
+            storage: ABSStorage,
+            index_name: str,
+            query: dict,
+            cursor: str,
+            source_includes: Optional[Sequence[str]] = None,
+            source_excludes: Optional[Sequence[str]] = None) -> Tuple[Optional[int], List[dict], Optional[str]]:
+        """Поиск страницы по курсору (search_after в рамках point in time).
+
+        Такие страницы не кэшируются: курсор привязан к PIT. После
+        последней страницы PIT закрывается.
+
+        :param storage: хранилище
+        :param index_name: индекс хранилища
+        :param query: запрос с from/size
+        :param cursor: курсор из запроса клиента
+        :param source_includes: поля записи, которые нужно получить из хранилища
+        :param source_excludes: поля записи, которые получать не нужно
+        :return: общее количество, найденные записи, курсор следующей страницы
+        :raises InvalidCursorError: курсор повреждён, получен для другого
+            запроса или его PIT истёк
+        """
+        page_size = query["size"]
+        body = {key: value for key, value in query.items() if key not in ("from", "size")}
+        # порядок в рамках PIT дополняется неявным тай-брейкером _shard_doc,
+        # без сортировки запроса - по релевантности
+        body["sort"] = [sort for sort in query.get("sort", []) if sort] or ["_score", "_shard_doc"]
+        digest = query_digest(body)
+
+        position = decode_cursor(cursor)
+        if position is None:
+            pit_id = await storage.open_point_in_time(
+                index_name=index_name,
+                keep_alive=config.ELASTIC_PIT_KEEP_ALIVE
+            )
+        else:
+            if (
+                position.source != ELASTIC_CURSOR_SOURCE
+                or position.index != index_name
+                or position.query != digest
+                or len(position.search_after) != self._sort_values_count(body["sort"])
+            ):
+                raise InvalidCursorError(cursor)
+            pit_id = position.pit_id
+
+        # запись сверх страницы показывает, есть ли следующая
+        body["size"] = page_size + 1
+        body["pit"] = {"id": pit_id, "keep_alive": config.ELASTIC_PIT_KEEP_ALIVE}
+        if position is not None:
+            body["search_after"] = position.search_after
+
+        response = await storage.search(
+            query=body,
+            index_name=index_name,
+            source_includes=source_includes,
+            source_excludes=source_excludes
+        )
+        if response is None:
+            raise InvalidCursorError(cursor)
+
+        hits = response['hits'].get('hits', [])
+        pit_id = response.get("pit_id", pit_id)
+        next_cursor = None
+        if len(hits) > page_size:
+            hits = hits[:page_size]
+            next_cursor = encode_cursor(Cursor(
+                pit_id=pit_id,
+                search_after=hits[-1]["sort"],
+                index=index_name,
+                query=digest
+            ))
+        else:
+            await self._close_point_in_time(storage, pit_id)
+        return response['hits']['total']['value'], hits, next_cursor
+
+    @staticmethod
+    def _sort_values_count(sort: list) -> int:
+        """Количество значений sort у записей: ES добавляет _shard_doc,
+        если его нет в сортировке запроса."""
+        has_shard_doc = any(
+            item == "_shard_doc" or (isinstance(item, dict) and "_shard_doc" in item)
+            for item in sort
+        )
+        return len(sort) if has_shard_doc else len(sort) + 1
+
+    @staticmethod
+    async def _close_point_in_time(storage: ABSStorage, pit_id: str):
+        # PIT истечёт и сам, ошибка закрытия не должна прерывать запрос
+        try:
+            await storage.close_point_in_time(pit_id=pit_id)
+        except Exception:
+            logger.exception(f"error while closing point in time")
+
+    async def _set_cached(self, key: str, payload: dict):
+        await self.cache_storage.set_data(
+            key,
+            encode_entry(payload, config.CACHE_SOFT_TTL_SECONDS, self.schema_version)
+        )
+
+    async def _set_missing(self, key: str):
+        await self.cache_storage.set_data(key, TOMBSTONE, expire=config.CACHE_NEGATIVE_TTL_SECONDS)
+
+    def _refresh(self, key: str, loader: Callable[[], Awaitable[Optional[dict]]]):
+        task = asyncio.ensure_future(self._refresh_entry(key, loader))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh_entry(self, key: str, loader: Callable[[], Awaitable[Optional[dict]]]):
+        # обновление в фоне не ограничено сроком запроса, который его запустил
+        deadline.set_timeout(None)
+        logger.info(f"refreshing stale cache entry {key}")
+        try:
+            await self.single_flight.do(key, loader)
+        except (CircuitOpenError, LimitExceededError):
+            logger.info(f"storage is unavailable, cache entry {key} is not refreshed")
+        except Exception:
+            logger.exception(f"error while refreshing cache entry {key}")
@@ -0,0 +1,35 @@
+"""Тестовые данные в виде набора документов индексов.
+
+Используется генератором нагрузки (id и имена для запросов) и как файл
+данных хранилища в памяти (MEMORY_STORAGE_DATA_PATH):
+
+    python -m benchmarks.dataset dataset.json
+"""
+import sys
+from typing import Dict, List
+
+import orjson
+from functional.testdata.film_test_data import film_test_doc
+from functional.testdata.films_list_data import \
+    test_films_list as films_list_data
+from functional.testdata.genredata_in import genre_list
+from functional.testdata.persondata_in import person_list
+from functional.testdata.persondata_in import \
+    test_films_list as person_films_data
+
+
+def build_dataset() -> Dict[str, List[dict]]:
+    """Документы индексов movies, person и genres из testdata."""
+    films = {}
+    for film in [film_test_doc, *films_list_data, *person_films_data]:
+        films.setdefault(film["id"], film)
+    return {
+        "movies": list(films.values()),
+        "person": [{"id": str(person["id"]), "full_name": person["full_name"]} for person in person_list],
+        "genres": [{"id": str(genre["id"]), "name": genre["name"]} for genre in genre_list],
+    }
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "wb") as dataset_file:
+        dataset_file.write(orjson.dumps(build_dataset(), option=orjson.OPT_INDENT_2))
@@ -0,0 +1,240 @@
+"""Генератор нагрузки на запущенный сервис и отчёт о задержках.
+
+Запросы к основным маршрутам API в заданной пропорции (--mix), с id и
+именами из testdata. Два режима:
+
+- --concurrency N: N клиентов отправляют запросы друг за другом;
+- --rps R: запросы отправляются с частотой R независимо от ответов
+  (задержка считается от запланированного времени отправки).
+
+Отчёт в json: пропускная способность и p50/p95/p99/max задержки
+по каждому маршруту и в целом.
+
+    python -m benchmarks.load --duration 30 --concurrency 20 --output report.json
+"""
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import orjson
+from functional.settings import API, SERVICE_URL
+
+from .dataset import build_dataset
+
+DEFAULT_MIX = "film_detail=4,films_list=3,person_search=1,person_films=1,genre_list=1"
+PERCENTILES = (50, 95, 99)
+
+# путь и параметры запроса: списком пар, чтобы список значений
+# (genres) передавался повторением параметра
+Request = Tuple[str, List[Tuple[str, str]]]
+
+
+@dataclass
+class Sample:
+    route: str
+    status: Optional[int]
+    latency: float
+
+
+class Scenarios:
+    """Запросы к маршрутам API со случайными параметрами из testdata."""
+
+    def __init__(self, rnd: random.Random) -> None:
+        dataset = build_dataset()
+        self.rnd = rnd
+        self.film_ids = [film["id"] for film in dataset["movies"]]
+        self.genres = sorted({genre for film in dataset["movies"] for genre in film.get("genre") or []})
+        self.person_ids = [person["id"] for person in dataset["person"]]
+        self.person_ids += [
+            person["id"]
+            for film in dataset["movies"]
+            for person in (film.get("actors") or []) + (film.get("writers") or [])
+        ]
+        self.person_names = [person["full_name"] for person in dataset["person"]]
+        self.routes: Dict[str, Callable[[], Request]] = {
+            "film_detail": self.film_detail,
+            "films_list": self.films_list,
+            "person_search": self.person_search,
+            "person_films": self.person_films,
+            "genre_list": self.genre_list,
+        }
+
+    def film_detail(self) -> Request:
+        return f"/films/{self.rnd.choice(self.film_ids)}", []
+
+    def films_list(self) -> Request:
+        params = [
+            ("sort", self.rnd.choice(("desc_rating", "asc_rating"))),
+            ("page[number]", str(self.rnd.randint(1, 3))),
+        ]
+        params += [("genres", genre) for genre in self.rnd.sample(self.genres, self.rnd.randint(0, 2))]
+        return "/films/", params
+
+    def person_search(self) -> Request:
+        name = self.rnd.choice(self.person_names).split()[0]
+        # маршрут берёт имя из параметра name, сегмент пути не используется
+        return "/person/search/person", [("name", name)]
+
+    def person_films(self) -> Request:
+        return f"/person/{self.rnd.choice(self.person_ids)}/film", []
+
+    def genre_list(self) -> Request:
+        return "/genre/", [("page[number]", str(self.rnd.randint(1, 2))), ("page[size]", "10")]
+
+
+def parse_mix(mix: str, routes: Dict[str, Callable[[], Request]]) -> List[Tuple[str, float]]:
+    weights = []
+    for item in mix.split(","):
+        route, _, weight = item.partition("=")
+        route = route.strip()
+        if route not in routes:
+            raise ValueError(f"unknown route {route}, known: {', '.join(routes)}")
+        weights.append((route, float(weight or 1)))
+    return weights
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Перцентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[Sample], duration: float) -> dict:
+    latencies = sorted(sample.latency * 1000 for sample in samples)
+    statuses = Counter(str(sample.status) if sample.status else "error" for sample in samples)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / duration, 2) if duration else 0.0,
+        "errors": sum(1 for sample in samples if not sample.status or sample.status >= 500),
+        "status": dict(sorted(statuses.items())),
+        "latency_ms": {
+            **{f"p{percent}": round(percentile(latencies, percent), 2) for percent in PERCENTILES},
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        },
+    }
+
+
+class LoadGenerator:
+    """Отправка запросов по сценариям и сбор задержек ответов."""
+
+    def __init__(self,
+                 base_url: str,
+                 scenarios: Scenarios,
+                 mix: List[Tuple[str, float]],
+                 timeout: float) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.scenarios = scenarios
+        self.route_names = [route for route, _ in mix]
+        self.route_weights = [weight for _, weight in mix]
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.samples: List[Sample] = []
+
+    async def _request(self, session: aiohttp.ClientSession, started: Optional[float] = None):
+        route = self.scenarios.rnd.choices(self.route_names, self.route_weights)[0]
+        path, params = self.scenarios.routes[route]()
+        if started is None:
+            started = time.perf_counter()
+        status = None
+        try:
+            async with session.get(self.base_url + path, params=params) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        self.samples.append(Sample(route, status, time.perf_counter() - started))
+
+    async def run_concurrency(self, concurrency: int, duration: float):
+        deadline = time.perf_counter() + duration
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=self.timeout) as session:
+            async def worker():
+                while time.perf_counter() < deadline:
+                    await self._request(session)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_rps(self, rps: float, duration: float, max_in_flight: int):
+        interval = 1 / rps
+        started = time.perf_counter()
+        connector = aiohttp.TCPConnector(limit=max_in_flight)
+        in_flight = set()
+        async with aiohttp.ClientSession(connector=connector, timeout=self.timeout) as session:
+            sent = 0
+            while True:
+                scheduled = started + sent * interval
+                if scheduled - started >= duration:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # задержка считается от запланированного времени, а не от фактической отправки
+                task = asyncio.ensure_future(self._request(session, scheduled))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                sent += 1
+            if in_flight:
+                await asyncio.wait(in_flight)
+
+    def report(self, duration: float, options: dict) -> dict:
+        by_route = defaultdict(list)
+        for sample in self.samples:
+            by_route[sample.route].append(sample)
+        return {
+            "options": options,
+            "duration_seconds": round(duration, 2),
+            "total": summarize(self.samples, duration),
+            "routes": {route: summarize(samples, duration) for route, samples in sorted(by_route.items())},
+        }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load generator for the cinema API")
+    parser.add_argument("--url", default=SERVICE_URL + API, help="API base url")
+    parser.add_argument("--duration", type=float, default=30, help="test duration, seconds")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=10, help="number of concurrent clients")
+    mode.add_argument("--rps", type=float, help="target requests per second (open loop)")
+    parser.add_argument("--max-in-flight", type=int, default=1000,
+                        help="connections limit in --rps mode")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="route weights, route=weight,...")
+    parser.add_argument("--timeout", type=float, default=10, help="request timeout, seconds")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of request parameters")
+    parser.add_argument("--output", help="report file, stdout by default")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    scenarios = Scenarios(random.Random(args.seed))
+    generator = LoadGenerator(args.url, scenarios, parse_mix(args.mix, scenarios.routes), args.timeout)
+
+    started = time.perf_counter()
+    if args.rps:
+        await generator.run_rps(args.rps, args.duration, args.max_in_flight)
+    else:
+        await generator.run_concurrency(args.concurrency, args.duration)
+    duration = time.perf_counter() - started
+
+    options = {key: value for key, value in vars(args).items() if key != "output"}
+    report = generator.report(duration, options)
+    data = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.output:
+        with open(args.output, "wb") as report_file:
+            report_file.write(data)
+    else:
+        sys.stdout.write(data.decode() + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
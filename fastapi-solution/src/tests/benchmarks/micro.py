@@ -0,0 +1,268 @@
+"""Микробенчмарки горячих путей обработки запроса.
+
+Сериализация и валидация моделей, кодек записей кэша, построение запросов
+к ES и разбор параметров Paginator на данных из testdata. Результаты
+сравниваются с сохранёнными в micro_baseline.json, замедление больше
+порога считается регрессией (код выхода 1).
+
+Запуск из каталога tests (код сервиса должен быть в PYTHONPATH):
+
+    PYTHONPATH=.. python -m benchmarks.micro
+    PYTHONPATH=.. python -m benchmarks.micro --update-baseline
+
+Базовые значения зависят от машины: их нужно обновлять на той же
+машине, на которой выполняется сравнение.
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import orjson
+from api.models.resp_models import (FilmRespModel, FilmsResponseModel,
+                                    ListResponseModel, Person)
+from api.v1 import films as films_api
+from db.query_builder import SORT_DESC, films_query, persons_by_name_query
+from fastapi.dependencies.utils import get_dependant, solve_dependencies
+from fastapi.routing import serialize_response
+from models.film import FilmFull
+from pkg.cache_storage.codec import decode_entry, encode_entry
+from pkg.pagination.pagination import Paginator
+from starlette.requests import Request
+
+from .dataset import build_dataset
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro_baseline.json")
+DEFAULT_THRESHOLD = 0.25
+PAGE_SIZE = 20
+# минимальная длительность одного замера и количество замеров
+MIN_RUN_SECONDS = 0.2
+REPEAT = 5
+
+BENCHMARKS: Dict[str, Callable[[], Callable]] = {}
+
+
+def benchmark(name: str):
+    """Регистрация бенчмарка: функция готовит данные и возвращает
+    замеряемый вызов без аргументов (обычный или async)."""
+    def decorator(setup: Callable[[], Callable]):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def _films_page() -> List[dict]:
+    films = build_dataset()["movies"]
+    return [films[position % len(films)] for position in range(PAGE_SIZE)]
+
+
+def _films_route(path: str):
+    return next(route for route in films_api.router.routes if route.path == path)
+
+
+@benchmark("codec_encode_films_page")
+def codec_encode_films_page():
+    payload = {"total_count": 1000, "source": _films_page()}
+    return lambda: encode_entry(payload, 300)
+
+
+@benchmark("codec_decode_films_page")
+def codec_decode_films_page():
+    data = encode_entry({"total_count": 1000, "source": _films_page()}, 300)
+    return lambda: decode_entry(data)
+
+
+@benchmark("film_full_from_source")
+def film_full_from_source():
+    source = _films_page()[0]
+    return lambda: FilmFull(**source)
+
+
+@benchmark("film_full_trusted")
+def film_full_trusted():
+    # попадание в кэш: данные уже проверены при записи
+    source = FilmFull.validated(_films_page()[0])
+    return lambda: FilmFull.trusted(source)
+
+
+@benchmark("film_full_dict")
+def film_full_dict():
+    film = FilmFull(**_films_page()[0])
+    return film.dict
+
+
+@benchmark("film_resp_model_parse_obj")
+def film_resp_model_parse_obj():
+    data = FilmFull(**_films_page()[0]).dict()
+    return lambda: FilmRespModel.parse_obj(data)
+
+
+@benchmark("films_list_response_model")
+def films_list_response_model():
+    films = [FilmFull(**source) for source in _films_page()]
+    page = dict(total_count=1000, page_count=50, page_number=1, page_size=PAGE_SIZE)
+
+    def run():
+        records = [FilmRespModel.parse_obj(film.dict()) for film in films]
+        return FilmsResponseModel(**page, records=records)
+    return run
+
+
+@benchmark("films_list_serialize_response")
+def films_list_serialize_response():
+    # проверка и сериализация ответа по response_model, как в FastAPI
+    route = _films_route("/")
+    films = [FilmRespModel.parse_obj(FilmFull(**source).dict()) for source in _films_page()]
+    content = FilmsResponseModel(total_count=1000, page_count=50, page_number=1,
+                                 page_size=PAGE_SIZE, records=films)
+
+    async def run():
+        return await serialize_response(
+            field=route.secure_cloned_response_field,
+            response_content=content,
+            exclude_unset=route.response_model_exclude_unset,
+        )
+    return run
+
+
+@benchmark("films_list_projection")
+def films_list_projection():
+    # текущий путь маршрута: _source из кэша сразу в словарь ответа
+    sources = _films_page()
+    page = dict(total_count=1000, page_count=50, page_number=1, page_size=PAGE_SIZE)
+
+    def run():
+        return orjson.dumps({**page, "records": [films_api.film_response(source) for source in sources]})
+    return run
+
+
+@benchmark("person_list_response_model")
+def person_list_response_model():
+    persons = build_dataset()["person"][:PAGE_SIZE]
+    page = dict(total_count=1000, current_page=1, total_page=50, page_size=PAGE_SIZE)
+    return lambda: ListResponseModel(
+        records=[Person(id=person["id"], full_name=person["full_name"]) for person in persons],
+        **page
+    )
+
+
+@benchmark("films_query_to_dict")
+def films_query_to_dict():
+    return lambda: films_query("star wars", ("Action", "Fantasy"), SORT_DESC, 20, PAGE_SIZE).to_dict()
+
+
+@benchmark("films_query_to_json_cached")
+def films_query_to_json_cached():
+    return lambda: films_query("star wars", ("Action", "Fantasy"), SORT_DESC, 20, PAGE_SIZE).to_json()
+
+
+@benchmark("persons_by_name_query_to_dict")
+def persons_by_name_query_to_dict():
+    return lambda: persons_by_name_query("George", 0, PAGE_SIZE).to_dict()
+
+
+@benchmark("paginator_dependency")
+def paginator_dependency():
+    dependant = get_dependant(path="/", call=Paginator)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/films/",
+        "query_string": b"page%5Bsize%5D=50&page%5Bnumber%5D=3",
+        "headers": [],
+    }
+
+    async def run():
+        return await solve_dependencies(request=Request(scope), dependant=dependant)
+    return run
+
+
+def measure(call: Callable) -> float:
+    """Время одного вызова (нс): минимум из REPEAT замеров, каждый
+    не короче MIN_RUN_SECONDS."""
+    if inspect.iscoroutinefunction(call):
+        loop = asyncio.get_event_loop()
+
+        async def batch(number: int):
+            for _ in range(number):
+                await call()
+
+        def run(number: int):
+            loop.run_until_complete(batch(number))
+    else:
+        def run(number: int):
+            for _ in range(number):
+                call()
+
+    number = 1
+    while True:
+        started = time.perf_counter()
+        run(number)
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_RUN_SECONDS:
+            break
+        number *= 10 if elapsed < MIN_RUN_SECONDS / 10 else 2
+
+    timings = [elapsed]
+    for _ in range(REPEAT - 1):
+        started = time.perf_counter()
+        run(number)
+        timings.append(time.perf_counter() - started)
+    return min(timings) / number * 1e9
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> Dict[str, dict]:
+    report = {}
+    for name, ns_per_op in results.items():
+        entry = {"ns_per_op": round(ns_per_op, 1)}
+        if name in baseline:
+            ratio = ns_per_op / baseline[name]
+            entry["baseline_ns_per_op"] = baseline[name]
+            entry["ratio"] = round(ratio, 3)
+            entry["regression"] = ratio > 1 + threshold
+        report[name] = entry
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of hot request paths")
+    parser.add_argument("--filter", default="", help="run only benchmarks containing this substring")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown relative to baseline, 0.25 = 25%%")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline json file")
+    parser.add_argument("--update-baseline", action="store_true", help="save results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = {
+        name: measure(setup())
+        for name, setup in BENCHMARKS.items()
+        if args.filter in name
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "rb") as baseline_file:
+            baseline = orjson.loads(baseline_file.read())
+
+    if args.update_baseline:
+        baseline.update({name: round(ns_per_op, 1) for name, ns_per_op in results.items()})
+        with open(args.baseline, "wb") as baseline_file:
+            baseline_file.write(orjson.dumps(baseline, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS) + b"\n")
+
+    report = compare(results, baseline, args.threshold)
+    sys.stdout.write(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode() + "\n")
+    regressions = [name for name, entry in report.items() if entry.get("regression")]
+    if regressions:
+        sys.stderr.write(f"regressions beyond {args.threshold:.0%}: {', '.join(regressions)}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
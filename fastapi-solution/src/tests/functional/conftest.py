@@ -110,10 +110,10 @@ async def session():
 
 @pytest.fixture
 def make_get_request(session):
-    async def inner(method: str, params: Optional[dict] = None) -> HTTPResponse:
+    async def inner(method: str, params: Optional[dict] = None, headers: Optional[dict] = None) -> HTTPResponse:
         params = params or {}
         url = SERVICE_URL + API + method
-        async with session.get(url, params=params) as response:
+        async with session.get(url, params=params, headers=headers) as response:
             logger.info(f"Got resp from {response.url}")
             return HTTPResponse(
                 body=await response.json(),
@@ -122,3 +122,29 @@ def make_get_request(session):
             )
 
     return inner
+
+
+@pytest.fixture
+def make_post_request(session):
+    async def inner(method: str, json: Optional[dict] = None, headers: Optional[dict] = None) -> HTTPResponse:
+        url = SERVICE_URL + API + method
+        async with session.post(url, json=json, headers=headers) as response:
+            logger.info(f"Got resp from {response.url}")
+            return HTTPResponse(
+                body=await response.json(),
+                headers=response.headers,
+                status=response.status,
+            )
+
+    return inner
+
+
+@pytest.fixture(scope='session')
+def reload_genres(session):
+    """Перезагрузка снимка жанров в памяти сервиса после изменения индекса."""
+    async def inner():
+        url = SERVICE_URL + API + '/admin/cache/generations/genres'
+        async with session.post(url, headers={'X-Admin-Token': ADMIN_API_TOKEN}) as response:
+            assert response.status == 200, "genres snapshot has not been reloaded"
+
+    return inner
@@ -12,6 +12,12 @@ ELASTIC_PORT = int(os.getenv('ES_PORT_TEST', 9201))
 ELASTIC_HOST_SOURCE = os.getenv('ES_HOST', '127.0.0.1')
 ELASTIC_PORT_SOURCE = int(os.getenv('ES_PORT', 9200))
 
+# Время жизни отметки "не найдено" в кэше приложения (сек)
+CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv('CACHE_NEGATIVE_TTL_SECONDS', 30))
+
+# Токен служебных (admin) методов приложения
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
 # URL приложения
 SERVICE_URL = os.getenv('SERVICE_URL', 'http://127.0.0.1:8000')
 
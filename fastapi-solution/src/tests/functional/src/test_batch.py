@@ -0,0 +1,73 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+
+from ..testdata.films_list_data import test_films_list
+from ..testdata.genredata_in import genre_list
+from ..testdata.persondata_in import person_list
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope='module', autouse=True)
+async def create_bulk(es_client, redis_client, reload_genres):
+    create_bulk = []
+    delete_bulk = []
+    dataset = {'movies': test_films_list,
+               'person': person_list[:5],
+               'genres': genre_list}
+    for index, rows in dataset.items():
+        for row in rows:
+            create_bulk.append({"index": {"_index": index, "_id": f"{row['id']}"}})
+            create_bulk.append(row)
+            delete_bulk.append({"delete": {"_index": index, "_id": f"{row['id']}"}})
+
+    await es_client.bulk(create_bulk, refresh="true")
+    await reload_genres()
+
+    yield
+    await redis_client.flushall(True)
+    await es_client.bulk(delete_bulk, refresh="true")
+    await reload_genres()
+
+
+async def test_films_batch(make_post_request):
+    """
+    endpoint POST /films/batch keeps request order and returns null for missing films
+    """
+    missing_id = str(uuid.uuid4())
+    ids = [test_films_list[2]["id"], missing_id, test_films_list[0]["id"]]
+
+    response = await make_post_request('/films/batch', {"ids": ids})
+
+    assert response.status == HTTPStatus.OK, "wrong status code"
+    assert response.body == {
+        "records": [test_films_list[2], None, test_films_list[0]]
+    }, "wrong films batch body"
+
+
+async def test_persons_batch(make_post_request):
+    ids = [str(person_list[1]['id']), str(uuid.uuid4()), str(person_list[0]['id'])]
+
+    response = await make_post_request('/person/batch', {"ids": ids})
+
+    assert response.status == HTTPStatus.OK
+    assert response.body['records'][1] is None
+    for record, row in zip((response.body['records'][0], response.body['records'][2]), (person_list[1], person_list[0])):
+        assert record == {'id': str(row['id']), 'full_name': row['full_name']}
+
+
+async def test_genres_batch(make_post_request):
+    ids = [genre_list[3]['id'], str(uuid.uuid4()), genre_list[1]['id']]
+
+    response = await make_post_request('/genre/batch', {"ids": ids})
+
+    assert response.status == HTTPStatus.OK
+    assert response.body == {'records': [genre_list[3], None, genre_list[1]]}
+
+
+async def test_batch_empty_ids(make_post_request):
+    response = await make_post_request('/films/batch', {"ids": []})
+
+    assert response.status == HTTPStatus.UNPROCESSABLE_ENTITY
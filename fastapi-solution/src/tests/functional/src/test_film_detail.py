@@ -1,5 +1,7 @@
+import asyncio
 from http import HTTPStatus
 import json
+import time
 import uuid
 
 import pytest
@@ -7,6 +9,8 @@ from elasticsearch import AsyncElasticsearch
 
 from api.errors.httperrors import FilmHTTPNotFoundError
 from ..testdata.film_test_data import film_test_doc
+from ..settings import ADMIN_API_TOKEN, CACHE_NEGATIVE_TTL_SECONDS
+from ..utils.cache_keys import TOMBSTONE, cache_key
 
 pytestmark = pytest.mark.asyncio
 
@@ -40,11 +44,11 @@ async def test_get_film_detail_positive(
     assert resp_body == film_test_doc, "wrong elastic resp body"
 
     # checking that film detail result has been cached
-    cache_key = f"film_{film_test_doc['id']}"
-    cashed_film_detail = await redis_client.get(cache_key)
-    assert cashed_film_detail != None, f"not found {cache_key} in redis"
+    film_cache_key = await cache_key(redis_client, "movies", f"film_{film_test_doc['id']}")
+    cashed_film_detail = await redis_client.get(film_cache_key)
+    assert cashed_film_detail != None, f"not found {film_cache_key} in redis"
 
-    film_res_json = json.loads(cashed_film_detail.decode('utf8'))
+    film_res_json = json.loads(cashed_film_detail.decode('utf8'))['payload']
     for key in ('actors_names', 'writers_names',):
         film_res_json.pop(key, None)
     film_res_json["actors"].sort(key=lambda x: x["id"])
@@ -53,7 +57,7 @@ async def test_get_film_detail_positive(
     assert film_res_json == film_test_doc, "wrong redis cache resp body"
 
     # removing result from cache
-    await redis_client.delete(cache_key)
+    await redis_client.delete(film_cache_key)
 
 
 async def test_get_film_detail_negative(make_get_request):
@@ -68,3 +72,117 @@ async def test_get_film_detail_negative(make_get_request):
     body_detail = response.body.get('detail')
 
     assert body_detail == FilmHTTPNotFoundError.detail, "wrong negative response body"
+
+
+async def test_get_film_detail_not_found_cached(
+    es_client: AsyncElasticsearch,
+    redis_client,
+    make_get_request
+):
+    """
+    endpoint /films/{film_id} caches not found film as a short-lived tombstone
+    """
+    film_doc = {**film_test_doc, "id": str(uuid.uuid4())}
+    response = await make_get_request(f'/films/{film_doc["id"]}')
+    assert response.status == FilmHTTPNotFoundError.status_code, "wrong status code"
+
+    film_cache_key = await cache_key(redis_client, "movies", f"film_{film_doc['id']}")
+    assert await redis_client.get(film_cache_key) == TOMBSTONE, "not found film is not cached"
+    assert 0 < await redis_client.ttl(film_cache_key) <= CACHE_NEGATIVE_TTL_SECONDS, "wrong tombstone ttl"
+
+    # until the tombstone expires the film is not looked up in elastic
+    await es_client.index(index="movies", id=film_doc["id"], body=film_doc, refresh=True)
+    response = await make_get_request(f'/films/{film_doc["id"]}')
+    await es_client.delete(index='movies', id=film_doc["id"])
+    await redis_client.delete(film_cache_key)
+
+    assert response.status == FilmHTTPNotFoundError.status_code, "tombstone not served"
+
+
+async def test_get_film_detail_stale_while_revalidate(
+    es_client: AsyncElasticsearch,
+    redis_client,
+    make_get_request
+):
+    """
+    endpoint /films/{film_id} returns stale cached film and refreshes it
+    """
+    film_doc = {**film_test_doc, "id": str(uuid.uuid4())}
+    await es_client.index(index="movies", id=film_doc["id"], body=film_doc)
+
+    # stale cache entry with outdated title
+    film_cache_key = await cache_key(redis_client, "movies", f"film_{film_doc['id']}")
+    await redis_client.set(
+        film_cache_key,
+        json.dumps({
+            "soft_expire": time.time() - 1,
+            "payload": {**film_doc, "title": "Outdated title"},
+        })
+    )
+
+    response = await make_get_request(f'/films/{film_doc["id"]}')
+    assert response.status == HTTPStatus.OK, "wrong status code"
+    assert response.body["title"] == "Outdated title", "stale value not served"
+
+    # cache entry has been refreshed in background
+    await asyncio.sleep(1)
+    cashed_film_detail = await redis_client.get(film_cache_key)
+    await es_client.delete(index='movies', id=film_doc["id"])
+    await redis_client.delete(film_cache_key)
+
+    cached_entry = json.loads(cashed_film_detail.decode('utf8'))
+    assert cached_entry["payload"]["title"] == film_doc["title"], "stale cache entry not refreshed"
+    assert cached_entry["soft_expire"] > time.time(), "refreshed entry already stale"
+
+
+async def test_get_film_detail_after_generation_bump(
+    es_client: AsyncElasticsearch,
+    redis_client,
+    make_get_request,
+    make_post_request
+):
+    """
+    endpoint /films/{film_id} skips cached film after movies index generation bump
+    """
+    film_doc = {**film_test_doc, "id": str(uuid.uuid4())}
+    await es_client.index(index="movies", id=film_doc["id"], body=film_doc)
+
+    # fresh cache entry with outdated title
+    film_cache_key = await cache_key(redis_client, "movies", f"film_{film_doc['id']}")
+    await redis_client.set(
+        film_cache_key,
+        json.dumps({
+            "soft_expire": time.time() + 60,
+            "payload": {**film_doc, "title": "Outdated title"},
+        })
+    )
+    response = await make_get_request(f'/films/{film_doc["id"]}')
+    assert response.body["title"] == "Outdated title", "cached value not served"
+
+    response = await make_post_request(
+        '/admin/cache/generations/movies', headers={'X-Admin-Token': ADMIN_API_TOKEN}
+    )
+    assert response.status == HTTPStatus.OK, "wrong status code generation bump"
+    assert film_cache_key != await cache_key(
+        redis_client, "movies", f"film_{film_doc['id']}"
+    ), "generation not changed"
+
+    response = await make_get_request(f'/films/{film_doc["id"]}')
+    await es_client.delete(index='movies', id=film_doc["id"])
+    await redis_client.delete(film_cache_key)
+
+    assert response.status == HTTPStatus.OK, "wrong status code"
+    assert response.body["title"] == film_doc["title"], "outdated cache entry served after bump"
+
+
+async def test_generation_bump_requires_admin_token(make_post_request):
+    """
+    Admin methods reject requests without a valid token
+    """
+    response = await make_post_request('/admin/cache/generations/movies')
+    assert response.status == HTTPStatus.FORBIDDEN, "admin method without token"
+
+    response = await make_post_request(
+        '/admin/cache/generations/movies', headers={'X-Admin-Token': 'wrong' + ADMIN_API_TOKEN}
+    )
+    assert response.status == HTTPStatus.FORBIDDEN, "admin method with wrong token"
@@ -1,3 +1,4 @@
+import base64
 from http import HTTPStatus
 import json
 
@@ -5,6 +6,7 @@ from elasticsearch import AsyncElasticsearch
 import pytest
 
 from ..testdata.films_list_data import test_films_list
+from ..utils.cache_keys import cache_key
 
 MOVIES_INDEX = "movies"
 pytestmark = pytest.mark.asyncio
@@ -86,13 +88,17 @@ async def test_get_films_list(redis_client, make_get_request):
     }
 
     # check that both pages have been cached
-    data = await redis_client.get("films_desc_rating_1_3")
+    data = await redis_client.get(
+        await cache_key(redis_client, MOVIES_INDEX, "films_desc_rating_1_3")
+    )
 
-    assert json.loads(data) == {"total_count": 6,
+    assert json.loads(data)["payload"] == {"total_count": 6,
                                 "source": test_films_list[:3]}, "wrong cache response page 1"
 
-    data = await redis_client.get("films_desc_rating_2_3")
-    assert json.loads(data) == {"total_count": 6,
+    data = await redis_client.get(
+        await cache_key(redis_client, MOVIES_INDEX, "films_desc_rating_2_3")
+    )
+    assert json.loads(data)["payload"] == {"total_count": 6,
                                 "source": test_films_list[3:]}, "wrong cache response page 2"
 
 
@@ -125,14 +131,121 @@ async def test_get_filtered_films_list(redis_client, make_get_request):
     }, "wrong filtered films list body"
 
     # check that query result has been cached
-    data = await redis_client.get("films_movie_Action_Fantasy_asc_rating_1_20")
+    data = await redis_client.get(
+        await cache_key(redis_client, MOVIES_INDEX, "films_movie_Action_Fantasy_asc_rating_1_20")
+    )
 
-    assert json.loads(data) == {
+    assert json.loads(data)["payload"] == {
         "total_count": 2,
         "source": sorted_res
     }, "wrong cache response filtered films list body"
 
 
+async def test_get_films_list_response_cached(make_get_request):
+    """
+    Test that repeated GET /films is served from response cache
+    regardless of query params order
+    """
+    first = await make_get_request(
+        f"/films",
+        params={"page[size]": 2, "page[number]": 3}
+    )
+    second = await make_get_request(
+        f"/films",
+        params={"page[number]": 3, "page[size]": 2}
+    )
+
+    assert first.status == second.status == HTTPStatus.OK, "wrong status code"
+    assert first.headers["x-cache"] == "MISS", "first response taken from cache"
+    assert second.headers["x-cache"] == "HIT", "second response not taken from cache"
+    assert first.body == second.body, "cached response body differs"
+
+
+async def test_get_films_list_by_cursor(make_get_request):
+    """
+    Test GET /films cursor pagination walks through the whole list
+    """
+    records = []
+    cursor = "*"
+    while cursor:
+        response = await make_get_request(
+            f"/films",
+            params={"page[size]": 4, "page[cursor]": cursor}
+        )
+        assert response.status == HTTPStatus.OK, "wrong status code cursor page"
+        assert response.body["total_count"] == 6, "wrong total count cursor page"
+        records.extend(response.body["records"])
+        cursor = response.body["next_cursor"]
+
+    assert records == test_films_list, "wrong films list by cursor"
+
+
+async def test_get_films_list_invalid_cursor(make_get_request):
+    """
+    Test GET /films with broken cursor
+    """
+    response = await make_get_request(
+        f"/films",
+        params={"page[cursor]": "broken"}
+    )
+
+    assert response.status == HTTPStatus.BAD_REQUEST, "wrong status code invalid cursor"
+
+
+
+async def test_get_films_list_forged_cursor(make_get_request):
+    """
+    Test GET /films with cursor that decodes but carries unknown PIT or belongs to another query
+    """
+    first_page = await make_get_request(
+        f"/films",
+        params={"page[size]": 4, "page[cursor]": "*"}
+    )
+    position = json.loads(base64.urlsafe_b64decode(first_page.body["next_cursor"]))
+    position["pit"] = base64.urlsafe_b64encode(b"unknown point in time").decode()
+    forged_cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    forged = await make_get_request(
+        f"/films",
+        params={"page[size]": 4, "page[cursor]": forged_cursor}
+    )
+    other_query = await make_get_request(
+        f"/films",
+        params={"page[size]": 4, "page[cursor]": first_page.body["next_cursor"], "sort": "asc_rating"}
+    )
+
+    assert first_page.status == HTTPStatus.OK, "wrong status code cursor page"
+    assert forged.status == HTTPStatus.BAD_REQUEST, "wrong status code cursor with unknown pit"
+    assert other_query.status == HTTPStatus.BAD_REQUEST, "wrong status code cursor of another query"
+
+async def test_get_films_list_sparse_fields(make_get_request):
+    """
+    Test GET /films returns only requested fields
+    """
+    response = await make_get_request(
+        f"/films",
+        params={"page[size]": 6, "fields": "title,imdb_rating"}
+    )
+
+    assert response.status == HTTPStatus.OK, "wrong status code sparse fields"
+    assert response.body["records"] == [
+        {"imdb_rating": film["imdb_rating"], "title": film["title"]}
+        for film in test_films_list
+    ], "wrong films list with sparse fields"
+
+
+async def test_get_films_list_unknown_fields(make_get_request):
+    """
+    Test GET /films with unknown field in fields
+    """
+    response = await make_get_request(
+        f"/films",
+        params={"fields": "title,budget"}
+    )
+
+    assert response.status == HTTPStatus.UNPROCESSABLE_ENTITY, "wrong status code unknown fields"
+
+
 async def test_get_empty_films_list(make_get_request):
     """
     Test that GET /films returns empty films list wo error
@@ -202,3 +315,34 @@ async def test_get_films_list_negative_page_size(make_get_request):
             }
         ]
     }, "wrong validation error page size body"
+
+
+async def test_get_films_list_server_timing(make_get_request):
+    """
+    Test GET /films reports processing stages in Server-Timing header
+    """
+    response = await make_get_request(
+        f"/films",
+        params={"page[size]": 5, "sort": "asc_rating"}
+    )
+
+    assert response.status == HTTPStatus.OK, "wrong status code server timing"
+    stages = {
+        stage.split(";")[0].strip()
+        for stage in response.headers["server-timing"].split(",")
+    }
+    assert {"es", "es_took", "serialize", "total"} <= stages, "wrong server timing stages"
+
+
+async def test_get_films_list_deadline_exceeded(make_get_request):
+    """
+    Test GET /films answers 504 when X-Request-Timeout budget is exceeded
+    """
+    response = await make_get_request(
+        f"/films",
+        params={"name": "deadline exceeded probe", "page[size]": 5},
+        headers={"X-Request-Timeout": "1ms"}
+    )
+
+    assert response.status == HTTPStatus.GATEWAY_TIMEOUT, "wrong status code deadline exceeded"
+    assert response.body == {"detail": "Request deadline exceeded"}, "wrong deadline exceeded resp body"
@@ -1,5 +1,4 @@
 import http
-import json
 from http import HTTPStatus
 
 import pytest
@@ -11,7 +10,7 @@ pytestmark = pytest.mark.asyncio
 
 
 @pytest.fixture(scope='module', autouse=True)
-async def create_bulk(es_client, redis_client):
+async def create_bulk(es_client, redis_client, reload_genres):
     create_bulk = []
     delete_bulk = []
     for row in genre_list:
@@ -35,10 +34,12 @@ async def create_bulk(es_client, redis_client):
         )
 
     await es_client.bulk(create_bulk, refresh="true")
+    await reload_genres()
 
     yield
     await redis_client.flushall(True)
     await es_client.bulk(delete_bulk, refresh="true")
+    await reload_genres()
 
 
 async def test_get_genre_list(es_client, make_get_request):
@@ -52,17 +53,36 @@ async def test_get_genre_list(es_client, make_get_request):
             assert str(row[keys]) == result_response_list[str(row['id'])][keys]
 
 
-async def test_get_genre_list_cached(es_client, redis_client,
-                                     make_get_request):
-    await make_get_request(f'/genre/',
-                           params={'page[size]': int(len(genre_list))})
-    response = await redis_client.get(f'genre_list{int(len(genre_list))}0')
-    result_response_list = {row['_source']['id']: row['_source'] for row in
-                            json.loads(response.decode('utf8'))['data']}
-    assert len(result_response_list) == len(genre_list)
-    for row in genre_list:
-        for keys in row.keys():
-            assert str(row[keys]) == result_response_list[str(row['id'])][keys]
+async def test_get_genre_list_not_cached(redis_client, make_get_request):
+    """
+    Test GET /genre is served from in-memory snapshot without redis
+    """
+    await redis_client.flushall(True)
+    response = await make_get_request(f'/genre/',
+                                      params={'page[size]': int(len(genre_list))})
+    assert response.status == HTTPStatus.OK
+    assert len(response.body['records']) == len(genre_list)
+    assert not await redis_client.keys('genre*')
+
+
+async def test_get_genre_list_by_cursor(make_get_request):
+    records = []
+    cursor = '*'
+    while cursor:
+        response = await make_get_request(f'/genre/',
+                                          params={'page[size]': 3, 'page[cursor]': cursor})
+        assert response.status == HTTPStatus.OK
+        records.extend(response.body['records'])
+        cursor = response.body['next_cursor']
+
+    assert {row['id'] for row in records} == {str(row['id']) for row in genre_list}
+
+
+async def test_genre_snapshot_stats(make_get_request):
+    response = await make_get_request('/health/snapshots')
+    assert response.status == HTTPStatus.OK
+    assert response.body['genres']['loaded'] is True
+    assert response.body['genres']['records'] == len(genre_list)
 
 
 async def test_wrong_get_genre_detailed(make_get_request, es_client):
@@ -79,14 +99,3 @@ async def test_get_genre_detailed(make_get_request, es_client):
     assert len(response.body) == 2
     assert response.body['id'] == genre_id
     assert response.body['name'] == name
-
-
-async def test_get_genre_detailed_cashed(make_get_request, es_client,
-                                         redis_client):
-    genre_id = str(genre_list[0]['id'])
-    name = genre_list[0]['name']
-    await make_get_request(f'/genre/{genre_id}')
-    cashed_data = await redis_client.get(genre_id)
-    cashed_data = json.loads(cashed_data.decode('utf8'))
-    assert cashed_data['id'] == genre_id
-    assert cashed_data['name'] == name
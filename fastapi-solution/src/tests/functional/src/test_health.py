@@ -0,0 +1,61 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+pytestmark = pytest.mark.asyncio
+
+# прогрев кэша ограничен по времени, после него сервис готов
+READINESS_TIMEOUT_SECONDS = 60
+
+
+async def test_readiness(make_get_request):
+    """
+    Test GET /health/ready reports ready after cache warm-up
+    """
+    for _ in range(READINESS_TIMEOUT_SECONDS):
+        response = await make_get_request('/health/ready')
+        if response.status == HTTPStatus.OK:
+            break
+        assert response.status == HTTPStatus.SERVICE_UNAVAILABLE, "wrong status code while warming up"
+        assert response.body == {"status": "warming_up"}, "wrong warming up resp body"
+        await asyncio.sleep(1)
+
+    assert response.status == HTTPStatus.OK, "service is not ready"
+    assert response.body == {"status": "ready"}, "wrong readiness resp body"
+
+
+async def test_caches(make_get_request):
+    """
+    Test GET /health/caches reports hits and misses of the in-process cache
+    """
+    await make_get_request('/films/', params={'page[size]': 1})
+    response = await make_get_request('/health/caches')
+
+    assert response.status == HTTPStatus.OK, "wrong status code"
+    l1 = response.body["l1"]
+    assert l1["hits"] + l1["misses"] > 0, "l1 lookups are not counted"
+    assert l1["entries"] > 0, "l1 cache is empty after a request"
+
+
+async def test_breakers(make_get_request):
+    """
+    Test GET /health/breakers reports closed elastic circuit breaker and redis up
+    """
+    response = await make_get_request('/health/breakers')
+
+    assert response.status == HTTPStatus.OK, "wrong status code"
+    assert response.body["elastic"]["state"] == "closed", "elastic breaker is not closed"
+    assert response.body["elastic"]["retry_after_seconds"] == 0, "wrong retry after of closed breaker"
+    assert response.body["redis"]["state"] == "up", "redis is not up"
+
+
+async def test_limits(make_get_request):
+    """
+    Test GET /health/limits reports elastic concurrency limit with an empty queue
+    """
+    response = await make_get_request('/health/limits')
+
+    assert response.status == HTTPStatus.OK, "wrong status code"
+    assert response.body["elastic"]["limit"] > 0, "wrong elastic concurrency limit"
+    assert response.body["elastic"]["queued"] == 0, "elastic queue is not empty"
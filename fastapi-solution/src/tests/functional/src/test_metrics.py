@@ -0,0 +1,25 @@
+from http import HTTPStatus
+
+import pytest
+
+from ..settings import SERVICE_URL
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_metrics(session, make_get_request):
+    """
+    Test GET /metrics exposes request latency by route template and cache lookups by tier
+    """
+    await make_get_request('/films/', params={'page[size]': 1})
+
+    async with session.get(SERVICE_URL + '/metrics') as response:
+        body = await response.text()
+
+    assert response.status == HTTPStatus.OK, "wrong status code metrics"
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4'), "wrong metrics content type"
+    assert '# TYPE http_request_duration_seconds histogram' in body, "no request latency histogram"
+    assert 'http_requests_total{method="GET",route="/api/v1/films/",status="200"}' in body, "no films list route metrics"
+    assert '# TYPE elastic_request_duration_seconds histogram' in body, "no elastic latency histogram"
+    assert 'cache_requests_total{tier="l1",prefix="response",' in body, "no l1 cache lookups"
+    assert 'cache_requests_total{tier="redis",prefix="response",' in body, "no redis cache lookups"
@@ -5,6 +5,7 @@ import pytest
 from api.errors import httperrors
 
 from ..testdata.persondata_in import person_list
+from ..utils.cache_keys import cache_key
 
 pytestmark = pytest.mark.asyncio
 
@@ -54,9 +55,10 @@ async def test_get_person_list_cached(es_client, redis_client,
                                       make_get_request):
     await make_get_request(f'/person/',
                            params={'page[size]': int(len(person_list))})
-    response = await redis_client.get(f'person_list{int(len(person_list))}0')
+    response = await redis_client.get(
+        await cache_key(redis_client, 'person', f'person_list{int(len(person_list))}0'))
     result_response_list = {row['_source']['id']: row['_source'] for row in
-                            json.loads(response.decode('utf8'))['data']}
+                            json.loads(response.decode('utf8'))['payload']['data']}
     assert len(result_response_list) == len(person_list)
     for row in person_list:
         for keys in row.keys():
@@ -84,7 +86,8 @@ async def test_get_person_detailed_cashed(make_get_request, es_client,
     person_id = str(person_list[0]['id'])
     full_name = person_list[0]['full_name']
     await make_get_request(f'/person/{person_id}')
-    cashed_data = await redis_client.get(person_id)
-    cashed_data = json.loads(cashed_data.decode('utf8'))
+    cashed_data = await redis_client.get(
+        await cache_key(redis_client, 'person', f'person_id_{person_id}'))
+    cashed_data = json.loads(cashed_data.decode('utf8'))['payload']
     assert cashed_data['id'] == person_id
     assert cashed_data['full_name'] == full_name
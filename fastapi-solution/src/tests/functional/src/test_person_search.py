@@ -5,6 +5,7 @@ import pytest
 
 from ..testdata.persondata_in import (person_list, response_film_by_id,
                                       search_by_name, test_films_list)
+from ..utils.cache_keys import cache_key
 
 pytestmark = pytest.mark.asyncio
 
@@ -63,9 +64,9 @@ async def test_search_film_by_person_id_cashed(es_client, redis_client,
         f'/person/8b223e9f-4782-489c-a277-80375aafdced/film',
         params={'page[size]': 100})
 
-    response = await redis_client.get(
-        f'film_by_person8b223e9f-4782-489c-a277-80375aafdced1000')
-    response = json.loads(response.decode('utf8'))
+    response = await redis_client.get(await cache_key(
+        redis_client, 'movies', f'film_by_person8b223e9f-4782-489c-a277-80375aafdced1000'))
+    response = json.loads(response.decode('utf8'))['payload']
     result_response_list = {row['_source']['id']: row['_source'] for row in
                             response['data']}
     assert response_film_by_id['total_count'] == response['total']
@@ -94,8 +95,9 @@ async def test_search_person_name_cashed(es_client, redis_client,
     await make_get_request('/person/search/{person_name}?name=Christopher',
                            params={'page[size]': 100})
 
-    response = await redis_client.get(f'person_Christopher_1000')
-    response = json.loads(response.decode('utf8'))
+    response = await redis_client.get(
+        await cache_key(redis_client, 'person', f'person_Christopher_1000'))
+    response = json.loads(response.decode('utf8'))['payload']
     result_response_list = {row['_source']['id']: row['_source'] for row in
                             response['data']}
     assert search_by_name['total_count'] == response['total']
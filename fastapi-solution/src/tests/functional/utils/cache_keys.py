@@ -0,0 +1,9 @@
+GENERATION_KEY_PREFIX = "cache_generation:"
+# отметка "не найдено", которую сервис записывает в кэш вместо данных
+TOMBSTONE = b"\x00tombstone"
+
+
+async def cache_key(redis_client, index_name: str, key: str) -> str:
+    """Ключ кэша сервиса с текущим поколением индекса."""
+    generation = await redis_client.get(f"{GENERATION_KEY_PREFIX}{index_name}")
+    return f"{key}:g{int(generation or 0)}"
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from pkg.circuit_breaker.circuit_breaker import (CLOSED, HALF_OPEN, OPEN,
+                                                 CircuitBreaker,
+                                                 CircuitOpenError)
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeClock:
+    """Часы, которые двигаются только вручную."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def ok():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("storage is down")
+
+
+def breaker(clock: FakeClock, half_open_max_calls: int = 1) -> CircuitBreaker:
+    return CircuitBreaker(
+        "test",
+        failure_threshold=3,
+        recovery_timeout=10,
+        half_open_max_calls=half_open_max_calls,
+        is_failure=lambda exc: isinstance(exc, ConnectionError),
+        clock=clock,
+    )
+
+
+async def open_breaker(circuit: CircuitBreaker):
+    for _ in range(circuit.failure_threshold):
+        with pytest.raises((ConnectionError, CircuitOpenError)):
+            await circuit.call(fail)
+
+
+async def test_opens_after_failure_threshold():
+    """
+    The breaker opens on the threshold failure in a row, not before
+    """
+    circuit = breaker(FakeClock())
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await circuit.call(fail)
+    assert circuit.state == CLOSED, "opened before threshold"
+
+    with pytest.raises(CircuitOpenError):
+        await circuit.call(fail)
+    assert circuit.state == OPEN, "not opened at threshold"
+
+
+async def test_success_resets_failures():
+    """
+    A success between failures starts the count again
+    """
+    circuit = breaker(FakeClock())
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await circuit.call(fail)
+    await circuit.call(ok)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await circuit.call(fail)
+
+    assert circuit.state == CLOSED, "failures not reset by success"
+
+
+async def test_non_failures_do_not_open():
+    """
+    Exceptions rejected by is_failure pass through without changing the state
+    """
+    circuit = breaker(FakeClock())
+
+    async def bad_request():
+        raise ValueError("bad request")
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            await circuit.call(bad_request)
+
+    assert circuit.state == CLOSED, "non-failure opened breaker"
+
+
+async def test_rejects_while_open():
+    """
+    An open breaker rejects calls without running them until recovery timeout
+    """
+    clock = FakeClock()
+    circuit = breaker(clock)
+    await open_breaker(circuit)
+    calls = 0
+
+    async def counted():
+        nonlocal calls
+        calls += 1
+
+    clock.now += 4
+    with pytest.raises(CircuitOpenError) as error:
+        await circuit.call(counted)
+
+    assert calls == 0, "call ran while open"
+    assert error.value.retry_after == pytest.approx(6), "wrong retry_after"
+
+    clock.now += 6
+    assert circuit.state == HALF_OPEN, "not half-open after recovery timeout"
+
+
+async def test_half_open_limits_probes():
+    """
+    Half-open lets at most half_open_max_calls probes run at once
+    """
+    clock = FakeClock()
+    circuit = breaker(clock, half_open_max_calls=2)
+    await open_breaker(circuit)
+    clock.now += 10
+    release = asyncio.Event()
+
+    async def probe():
+        await release.wait()
+        return "ok"
+
+    probes = [asyncio.ensure_future(circuit.call(probe)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpenError):
+        await circuit.call(ok)
+
+    release.set()
+    assert await asyncio.gather(*probes) == ["ok", "ok"], "probes failed"
+    assert circuit.state == CLOSED, "successful probe did not close"
+
+
+async def test_cancelled_probe_frees_slot():
+    """
+    A cancelled probe does not change the state and frees its slot
+    """
+    clock = FakeClock()
+    circuit = breaker(clock)
+    await open_breaker(circuit)
+    clock.now += 10
+
+    probe = asyncio.ensure_future(circuit.call(asyncio.sleep, 10))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert circuit.state == HALF_OPEN, "cancellation changed state"
+    assert await circuit.call(ok) == "ok", "slot of cancelled probe not freed"
+
+
+async def test_failed_probe_reopens():
+    """
+    A failed probe opens the breaker again for a full recovery timeout
+    """
+    clock = FakeClock()
+    circuit = breaker(clock)
+    await open_breaker(circuit)
+    clock.now += 10
+
+    with pytest.raises(CircuitOpenError):
+        await circuit.call(fail)
+
+    assert circuit.state == OPEN, "failed probe did not reopen"
+    assert circuit.retry_after() == pytest.approx(10), "recovery timeout not restarted"
+    clock.now += 9.9
+    assert circuit.state == OPEN, "half-open before recovery timeout"
@@ -0,0 +1,154 @@
+import pytest
+
+from pkg.cache_generation.generations import CacheGenerations
+from pkg.cache_storage.memory_storage import InMemoryCacheService
+from pkg.pagination.cursor import (FIRST_PAGE_CURSOR, InvalidCursorError,
+                                   decode_cursor, encode_cursor)
+from pkg.snapshot.index_snapshot import IndexSnapshot
+from pkg.storage.memory_storage import InMemoryStorage
+from services.genre import GenreService, serialize_genre
+from services.person import PersonService
+
+pytestmark = pytest.mark.asyncio
+
+PERSONS = [
+    {"id": "p1", "full_name": "Anna Smith"},
+    {"id": "p2", "full_name": "John Doe"},
+    {"id": "p3", "full_name": "Zed Smith"},
+    {"id": "p4", "full_name": "John Smith"},
+]
+
+
+def person_service(storage: InMemoryStorage) -> PersonService:
+    return PersonService(
+        elastic=storage,
+        cache_storage=InMemoryCacheService(),
+        generations=CacheGenerations(None, ("person",), refresh_interval=1),
+    )
+
+
+GENRES = [{"id": f"g{number}", "name": f"Genre {number}"} for number in range(5)]
+
+
+def genre_service(storage: InMemoryStorage) -> GenreService:
+    generations = CacheGenerations(None, ("genres",), refresh_interval=1)
+    return GenreService(
+        elastic=storage,
+        cache_storage=InMemoryCacheService(),
+        generations=generations,
+        snapshot=IndexSnapshot(storage, generations, "genres", serialize_genre, refresh_interval=60),
+    )
+
+
+async def read_pages(fetch) -> list:
+    return await read_pages_from(FIRST_PAGE_CURSOR, fetch)
+
+
+async def read_pages_from(cursor: str, fetch) -> list:
+    pages = []
+    while cursor is not None:
+        _, persons, cursor = await fetch(cursor)
+        pages.append([person.id for person in persons or []])
+    return pages
+
+
+async def test_exactly_full_last_page_has_no_cursor():
+    """
+    The last page gets no cursor even when it is full, and its PIT is closed
+    """
+    storage = InMemoryStorage({"person": PERSONS})
+    service = person_service(storage)
+
+    pages = await read_pages(lambda cursor: service.get_list(page_size=2, offset_from=0, cursor=cursor))
+
+    assert pages == [["p1", "p2"], ["p3", "p4"]], "wrong cursor pages"
+    assert not storage._points_in_time, "point in time is not closed after the last page"
+
+
+async def test_name_search_pages_by_relevance():
+    """
+    Cursor pages of a name search keep relevance order
+    """
+    storage = InMemoryStorage({"person": PERSONS})
+    service = person_service(storage)
+
+    pages = await read_pages(
+        lambda cursor: service.get_by_name(name="John Smith", page_size=2, offset_from=0, cursor=cursor)
+    )
+
+    assert pages[0][0] == "p4", "best match is not on the first page"
+    assert sorted(pages[0][1:] + sum(pages[1:], [])) == ["p1", "p2", "p3"], "wrong cursor pages"
+    assert not storage._points_in_time, "point in time is not closed after the last page"
+
+
+async def test_cursor_of_another_query_is_rejected():
+    """
+    A cursor is accepted only by the index and query it was created for
+    """
+    storage = InMemoryStorage({"person": PERSONS, "movies": []})
+    service = person_service(storage)
+
+    _, _, cursor = await service.get_list(page_size=2, offset_from=0, cursor=FIRST_PAGE_CURSOR)
+
+    with pytest.raises(InvalidCursorError):
+        await service.get_by_name(name="John Smith", page_size=2, offset_from=0, cursor=cursor)
+    with pytest.raises(InvalidCursorError):
+        await service.get_film_by_person(person_id="p1", page_size=2, offset_from=0, cursor=cursor)
+
+
+async def test_forged_cursor_is_rejected():
+    """
+    A cursor that decodes but has unknown PIT or wrong search_after is rejected
+    """
+    storage = InMemoryStorage({"person": PERSONS})
+    service = person_service(storage)
+
+    _, _, cursor = await service.get_list(page_size=2, offset_from=0, cursor=FIRST_PAGE_CURSOR)
+    position = decode_cursor(cursor)
+
+    for forged in (
+        position._replace(pit_id="unknown"),
+        position._replace(search_after=position.search_after[:1]),
+        position._replace(search_after=position.search_after + ["extra"]),
+    ):
+        with pytest.raises(InvalidCursorError):
+            await service.get_list(page_size=2, offset_from=0, cursor=encode_cursor(forged))
+
+
+async def test_snapshot_cursor_continues_before_snapshot_is_loaded():
+    """
+    A snapshot cursor on a worker without loaded snapshot continues by offset from storage
+    """
+    storage = InMemoryStorage({"genres": GENRES})
+    loaded = genre_service(storage)
+    await loaded.snapshot.load()
+    not_loaded = genre_service(storage)
+
+    _, first_page, cursor = await loaded.get_list(page_size=2, offset_from=0, cursor=FIRST_PAGE_CURSOR)
+    pages = [[genre.id for genre in first_page]]
+    pages += await read_pages_from(
+        cursor, lambda cursor: not_loaded.get_list(page_size=2, offset_from=0, cursor=cursor)
+    )
+
+    assert pages == [["g0", "g1"], ["g2", "g3"], ["g4"]], "wrong snapshot cursor pages"
+    assert not storage._points_in_time, "point in time opened for snapshot cursor"
+
+
+async def test_elastic_cursor_continues_after_snapshot_is_loaded():
+    """
+    A cursor from storage search continues in storage when the snapshot gets loaded
+    """
+    storage = InMemoryStorage({"genres": GENRES})
+    service = genre_service(storage)
+
+    _, first_page, cursor = await service.get_list(page_size=2, offset_from=0, cursor=FIRST_PAGE_CURSOR)
+    await service.snapshot.load()
+    assert not service.serves_from_snapshot(cursor), "storage cursor served from snapshot"
+
+    pages = [[genre.id for genre in first_page]]
+    pages += await read_pages_from(
+        cursor, lambda cursor: service.get_list(page_size=2, offset_from=0, cursor=cursor)
+    )
+
+    assert sorted(sum(pages, [])) == [genre["id"] for genre in GENRES], "wrong storage cursor pages"
+    assert not storage._points_in_time, "point in time is not closed after the last page"
@@ -0,0 +1,45 @@
+import pytest
+from pydantic import ValidationError
+
+from api.models.resp_models import FilmRespModel
+from api.v1.films import film_response
+from models.film import FilmFull
+
+# источники фильмов в кэше проверены FilmFull
+FILM = FilmFull.validated({
+    "id": "film-1",
+    "title": "Star Wars",
+    "imdb_rating": None,
+    "genre": ["Sci-Fi"],
+    "actors": [{"id": "person-1", "name": "Mark Hamill"}],
+    "actors_names": ["Mark Hamill"],
+})
+
+
+def test_projection_matches_response_model():
+    """
+    The projected film is what FilmRespModel serializes by alias
+    """
+    expected = FilmRespModel.parse_obj(FILM).dict(by_alias=True)
+
+    assert film_response(FILM) == expected, "projection differs from response model"
+
+
+def test_fields_projection():
+    """
+    With fields only these fields are returned
+    """
+    assert film_response(FILM, ("id", "title")) == {"id": "film-1", "title": "Star Wars"}, "wrong fields"
+
+
+def test_film_without_title_is_rejected():
+    """
+    A film without the required title fails as response validation did
+    """
+    film = {key: value for key, value in FILM.items() if key != "title"}
+
+    with pytest.raises(ValidationError):
+        film_response(film)
+    with pytest.raises(ValidationError):
+        film_response(film, ("id", "title"))
+    assert film_response(film, ("id",)) == {"id": "film-1"}, "title required when not requested"
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from pkg.circuit_breaker.circuit_breaker import retry_after_header
+from pkg.concurrency_limit.limiter import AdaptiveLimiter, LimitExceededError
+from pkg.deadline import deadline
+from pkg.metrics.metrics import CONCURRENCY_LIMIT_REJECTED
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeClock:
+    """Часы, которые двигаются только вручную."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def limiter(clock=None, **kwargs) -> AdaptiveLimiter:
+    params = dict(name="test", initial_limit=4, min_limit=1, max_limit=10, max_queue=10)
+    params.update(kwargs)
+    if clock is not None:
+        params["clock"] = clock
+    return AdaptiveLimiter(**params)
+
+
+async def calls(limit: AdaptiveLimiter, clock: FakeClock, count: int, latency: float, error: Exception = None):
+    """count одновременных вызовов, каждый длится latency по часам clock."""
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        if error is not None:
+            raise error
+
+    tasks = [asyncio.ensure_future(limit.call(work)) for _ in range(count)]
+    await asyncio.sleep(0)
+    clock.now += latency
+    release.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def test_limit_grows_additively_up_to_max():
+    """
+    Calls finished while the limit is at least half used grow it by 1/limit, up to max_limit
+    """
+    clock = FakeClock()
+    limit = limiter(clock, max_limit=5)
+
+    # из 4 одновременных вызовов 2 завершаются при занятой половине лимита
+    for _ in range(3):
+        await calls(limit, clock, 4, 0.01)
+    assert limit.limit == 5, "limit not increased additively"
+
+    for _ in range(10):
+        await calls(limit, clock, 5, 0.01)
+    assert limit.limit == 5, "limit above max_limit"
+
+
+async def test_limit_does_not_grow_when_underused():
+    """
+    Calls using less than half of the limit do not grow it
+    """
+    clock = FakeClock()
+    limit = limiter(clock)
+
+    for _ in range(20):
+        await calls(limit, clock, 1, 0.01)
+
+    assert limit.limit == 4, "limit grows without demand"
+
+
+async def test_latency_growth_decreases_limit_once_per_interval():
+    """
+    Latency above tolerance multiplies the limit by backoff_ratio once per latency interval
+    """
+    clock = FakeClock()
+    limit = limiter(clock, initial_limit=10, max_limit=20)
+    await calls(limit, clock, 1, 0.01)
+
+    await calls(limit, clock, 3, 0.05)
+    assert limit.limit == 9, "limit not decreased multiplicatively"
+
+    clock.now += 1
+    await calls(limit, clock, 1, 0.05)
+    assert limit.limit == 8, "limit not decreased in the next interval"
+
+
+async def test_failures_decrease_limit_to_min():
+    """
+    Overload failures decrease the limit, but not below min_limit
+    """
+    clock = FakeClock()
+    limit = limiter(clock, initial_limit=2, min_limit=2)
+
+    for _ in range(5):
+        clock.now += 1
+        await calls(limit, clock, 1, 0.01, ConnectionError("overloaded"))
+
+    assert limit.limit == 2, "limit below min_limit"
+
+
+async def test_full_queue_is_shed():
+    """
+    Calls beyond the queue are rejected at once with retry_after
+    """
+    clock = FakeClock()
+    limit = limiter(clock, initial_limit=1, max_limit=1, max_queue=1)
+    await calls(limit, clock, 1, 0.5)
+    rejected = CONCURRENCY_LIMIT_REJECTED.value("test", "queue_full")
+    release = asyncio.Event()
+
+    tasks = [asyncio.ensure_future(limit.call(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(LimitExceededError) as error:
+        await limit.call(release.wait)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert error.value.retry_after == pytest.approx(1.0), "wrong retry_after"
+    assert retry_after_header(error.value.retry_after) == "1", "wrong Retry-After"
+    assert CONCURRENCY_LIMIT_REJECTED.value("test", "queue_full") == rejected + 1, "rejection not counted"
+
+
+async def test_wait_beyond_deadline_is_rejected():
+    """
+    A call that would wait in the queue past its deadline is rejected before waiting
+    """
+    clock = FakeClock()
+    limit = limiter(clock, initial_limit=1, max_limit=1)
+    await calls(limit, clock, 1, 0.1)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(limit.call(release.wait))
+    await asyncio.sleep(0)
+
+    async def call_with_timeout(timeout):
+        deadline.set_timeout(timeout)
+        return await limit.call(asyncio.sleep, 0)
+
+    with pytest.raises(LimitExceededError):
+        await call_with_timeout(0.15)
+    queued = asyncio.ensure_future(call_with_timeout(10))
+    await asyncio.sleep(0)
+    assert limit.stats()["queued"] == 1, "call within deadline not queued"
+
+    release.set()
+    await asyncio.gather(running, queued)
+
+
+async def test_cancelled_calls_release_slots():
+    """
+    Cancelled running, queued and just woken calls give their slots back
+    """
+    limit = limiter(initial_limit=1, max_limit=1)
+    release = asyncio.Event()
+
+    running = asyncio.ensure_future(limit.call(release.wait))
+    queued = asyncio.ensure_future(limit.call(release.wait))
+    woken = asyncio.ensure_future(limit.call(release.wait))
+    await asyncio.sleep(0)
+    assert limit.stats()["queued"] == 2
+
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+    assert limit.stats()["queued"] == 1, "cancelled call left in queue"
+
+    # слот выдан ждущему вызову, но тот отменён до того, как начал работу
+    running.cancel()
+    await asyncio.gather(running, return_exceptions=True)
+    woken.cancel()
+    await asyncio.gather(woken, return_exceptions=True)
+
+    assert limit.stats()["in_flight"] == 0, "slot of cancelled call not released"
+    assert await limit.call(asyncio.sleep, 0, "ok") == "ok", "limiter blocked after cancellations"
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from core import config
+from pkg.cache_storage.codec import TOMBSTONE
+from pkg.cache_storage.lru_storage import LRUCacheService
+from pkg.cache_storage.memory_storage import InMemoryCacheService
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_backfilled_tombstone_keeps_negative_ttl():
+    """
+    A tombstone read from the backend is kept locally no longer than the negative TTL
+    """
+    backend = InMemoryCacheService()
+    await backend.set_data("film_missing", TOMBSTONE, expire=config.CACHE_NEGATIVE_TTL_SECONDS)
+    await backend.set_data("film_found", b"{}")
+    cache = LRUCacheService(backend, max_entries=10, max_bytes=1024, default_ttl=300)
+
+    assert await cache.get_data("film_missing") == TOMBSTONE, "tombstone not read from backend"
+    assert await cache.get_many_data(["film_found"]) == [b"{}"], "entry not read from backend"
+
+    now = time.monotonic()
+    tombstone_expires_at = cache._entries["film_missing"][0]
+    assert tombstone_expires_at <= now + config.CACHE_NEGATIVE_TTL_SECONDS, "tombstone outlives negative ttl"
+    assert cache._entries["film_found"][0] > now + config.CACHE_NEGATIVE_TTL_SECONDS, "entry got negative ttl"
+
+
+async def test_backfilled_tombstone_expires_with_backend_entry():
+    """
+    A tombstone read from the backend expires locally together with the backend entry
+    """
+    backend = InMemoryCacheService()
+    await backend.set_data("film_missing", TOMBSTONE, expire=1)
+    cache = LRUCacheService(backend, max_entries=10, max_bytes=1024, default_ttl=300)
+
+    assert await cache.get_many_data(["film_missing"]) == [TOMBSTONE], "tombstone not read from backend"
+    assert cache._entries["film_missing"][0] <= time.monotonic() + 1, "tombstone outlives backend entry"
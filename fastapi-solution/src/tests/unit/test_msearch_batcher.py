@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from elasticsearch import NotFoundError, RequestError, TransportError
+
+from pkg.deadline import deadline
+from pkg.storage.elastic_storage import MSearchBatcher
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeElastic:
+    """Elasticsearch с _msearch, отвечающим по телам поисков."""
+
+    def __init__(self, error: Exception = None) -> None:
+        self.error = error
+        self.calls = []
+
+    async def msearch(self, body, **params):
+        self.calls.append((body, params))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        responses = []
+        for search in body[1::2]:
+            if "error" in search:
+                status, error_type = search["error"]
+                responses.append({"status": status, "error": {"type": error_type}})
+            else:
+                responses.append({"status": 200, "hits": {"hits": [search["id"]]}})
+        return {"responses": responses}
+
+
+async def test_searches_within_window_share_one_msearch():
+    """
+    Searches started within the window are sent in one msearch, results in order
+    """
+    elastic = FakeElastic()
+    batcher = MSearchBatcher(elastic, window_seconds=0.01, max_batch_size=50)
+
+    results = await asyncio.gather(*[batcher.search("movies", {"id": i}) for i in range(3)])
+
+    assert len(elastic.calls) == 1, "searches are not batched"
+    body, _ = elastic.calls[0]
+    assert body[0::2] == [{"index": "movies"}] * 3, "wrong msearch headers"
+    assert [result["hits"]["hits"] for result in results] == [[0], [1], [2]], "results out of order"
+
+
+async def test_full_batch_is_sent_without_waiting_for_window():
+    """
+    A batch reaching max_batch_size is sent at once
+    """
+    elastic = FakeElastic()
+    batcher = MSearchBatcher(elastic, window_seconds=10, max_batch_size=2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*[batcher.search("movies", {"id": i}) for i in range(2)]), timeout=1
+    )
+
+    assert len(elastic.calls) == 1, "full batch is not sent"
+    assert len(results) == 2, "wrong number of results"
+
+
+async def test_different_filter_paths_are_separate_batches():
+    """
+    Searches with different filter_path are not mixed in one msearch
+    """
+    elastic = FakeElastic()
+    batcher = MSearchBatcher(elastic, window_seconds=0.01, max_batch_size=50)
+
+    await asyncio.gather(
+        batcher.search("movies", {"id": 0}, filter_path=["hits.hits._id"]),
+        batcher.search("movies", {"id": 1}),
+    )
+
+    filter_paths = sorted(str(params.get("filter_path")) for _, params in elastic.calls)
+    assert filter_paths == [
+        "None",
+        str(["responses.hits.hits._id", "responses.status", "responses.error"]),
+    ], "wrong batches by filter_path"
+
+
+async def test_item_errors_are_raised_to_their_callers():
+    """
+    An error item of msearch is raised to its caller as the matching TransportError
+    """
+    elastic = FakeElastic()
+    batcher = MSearchBatcher(elastic, window_seconds=0.01, max_batch_size=50)
+
+    results = await asyncio.gather(
+        batcher.search("movies", {"error": (404, "index_not_found_exception")}),
+        batcher.search("movies", {"error": (400, "search_phase_execution_exception")}),
+        batcher.search("movies", {"error": (503, "unavailable")}),
+        batcher.search("movies", {"id": 3}),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], NotFoundError), "404 is not NotFoundError"
+    assert isinstance(results[1], RequestError), "400 is not RequestError"
+    assert type(results[2]) is TransportError, "unknown status is not TransportError"
+    assert results[2].status_code == 503, "wrong status of error"
+    assert results[0].error == "index_not_found_exception", "wrong error type"
+    assert results[3]["hits"]["hits"] == [3], "error item breaks other results"
+
+
+async def test_msearch_error_is_raised_to_every_caller():
+    """
+    A failed msearch fails every search of the batch
+    """
+    error = TransportError("N/A", "connection refused")
+    batcher = MSearchBatcher(FakeElastic(error), window_seconds=0.01, max_batch_size=50)
+
+    results = await asyncio.gather(
+        *[batcher.search("movies", {"id": i}) for i in range(3)], return_exceptions=True
+    )
+
+    assert results == [error] * 3, "msearch error is not raised to every caller"
+
+
+async def test_msearch_timeout_is_smallest_remaining_budget():
+    """
+    The msearch request_timeout is the smallest remaining deadline of the batch
+    """
+    elastic = FakeElastic()
+    batcher = MSearchBatcher(elastic, window_seconds=0.01, max_batch_size=50)
+
+    async def search(timeout, search_id):
+        deadline.set_timeout(timeout)
+        return await batcher.search("movies", {"id": search_id})
+
+    await asyncio.gather(search(5, 0), search(1, 1), search(None, 2))
+
+    _, params = elastic.calls[0]
+    assert 0.9 < params["request_timeout"] <= 1, "request_timeout is not the smallest budget"
+
+
+async def test_msearch_without_deadlines_has_no_timeout():
+    """
+    A batch of searches without deadline uses the client default timeout
+    """
+    elastic = FakeElastic()
+    batcher = MSearchBatcher(elastic, window_seconds=0.01, max_batch_size=50)
+
+    await batcher.search("movies", {"id": 0})
+
+    _, params = elastic.calls[0]
+    assert "request_timeout" not in params, "request_timeout without deadline"
@@ -0,0 +1,84 @@
+import orjson
+
+from db.query_builder import (SORT_DESC, Match, SearchQuery,
+                              films_by_person_query, films_query,
+                              persons_by_name_query)
+
+
+def test_genres_in_filter_context():
+    """
+    Genre constraints of the films query land in bool.filter
+    """
+    body = films_query(None, ("Drama", "Comedy"), SORT_DESC, 0, 10).to_dict()
+
+    assert "must" not in body["query"]["bool"], "genres affect relevance"
+    assert body["query"]["bool"]["filter"] == [{
+        "bool": {
+            "should": [{"match": {"genre": "Comedy"}}, {"match": {"genre": "Drama"}}],
+            "minimum_should_match": 1
+        }
+    }], "wrong genres filter"
+
+
+def test_person_films_in_filter_context():
+    """
+    Person constraints of the films by person query land in bool.filter
+    """
+    body = films_by_person_query("person-1", 0, 10).to_dict()
+
+    assert "must" not in body["query"]["bool"], "person affects relevance"
+    nested = body["query"]["bool"]["filter"][0]["bool"]["should"]
+    assert [clause["nested"]["path"] for clause in nested] == ["actors", "writers"], "wrong person filter"
+
+
+def test_title_moves_to_filter_with_sort():
+    """
+    Title match is scored without sort and moves to filter with sort
+    """
+    unsorted = SearchQuery(must=(Match("title", "star"),)).to_dict()
+    assert unsorted["query"]["bool"] == {"must": [{"match": {"title": "star"}}]}, "title not in must"
+    assert "sort" not in unsorted, "unexpected sort"
+
+    body = films_query("star", None, SORT_DESC, 0, 10).to_dict()
+    assert body["query"]["bool"] == {"filter": [{"match": {"title": "star"}}]}, "title not in filter"
+    assert body["sort"] == [{"imdb_rating": {"order": "desc"}}], "wrong sort"
+
+
+def test_name_search_is_scored():
+    """
+    Person name match stays in must: pages are ordered by relevance
+    """
+    body = persons_by_name_query("John", 20, 10).to_dict()
+
+    assert body["query"]["bool"] == {"must": [{"match": {"full_name": "John"}}]}, "name not in must"
+    assert (body["from"], body["size"]) == (20, 10), "wrong page"
+
+
+def test_equal_parameters_share_serialized_query():
+    """
+    Equal parameters (genres in any order) give the same memoized json
+    """
+    first = films_query("star", ("Drama", "Comedy"), SORT_DESC, 0, 10).to_json()
+    second = films_query("star", ("Comedy", "Drama", "Drama"), SORT_DESC, 0, 10).to_json()
+
+    assert first is second, "serialized query is not memoized"
+    assert orjson.loads(first) == films_query("star", ("Drama", "Comedy"), SORT_DESC, 0, 10).to_dict()
+
+
+def test_cursor_params_do_not_alias_query():
+    """
+    Adding point in time params to a body does not change the query or its json
+    """
+    query = films_query("star", ("Drama",), SORT_DESC, 0, 10)
+    serialized = query.to_json()
+    expected = query.to_dict()
+
+    body = query.to_dict()
+    body["pit"] = {"id": "pit-1", "keep_alive": "1m"}
+    body["search_after"] = [8.5, 3]
+    body["sort"].append("_shard_doc")
+    body["query"]["bool"]["filter"].append({"match": {"genre": "Comedy"}})
+
+    assert query.to_dict() == expected, "query state changed by the cursor body"
+    assert query.to_json() == serialized, "memoized json changed by the cursor body"
+    assert orjson.loads(serialized) == expected, "memoized json differs from the query"
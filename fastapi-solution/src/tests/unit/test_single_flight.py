@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+from pkg.cache_generation.generations import CacheGenerations
+from pkg.cache_storage.memory_storage import InMemoryCacheService
+from pkg.deadline import deadline
+from pkg.deadline.deadline import DeadlineExceededError
+from pkg.single_flight.single_flight import SingleFlight
+from pkg.storage.memory_storage import InMemoryStorage
+from services.films import FilmService
+
+pytestmark = pytest.mark.asyncio
+
+FILM = {"id": "film-1", "title": "Star Wars", "imdb_rating": 8.6}
+
+
+class CountingStorage(InMemoryStorage):
+    """Хранилище в памяти, считающее обращения get_by_id."""
+
+    def __init__(self, error: Exception = None) -> None:
+        super().__init__({"movies": [FILM]}, latency=0.05)
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def get_by_id(self, *args, **kwargs):
+        self.calls += 1
+        try:
+            await self._wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return await super().get_by_id(*args, **kwargs)
+
+
+def film_service(storage: InMemoryStorage) -> FilmService:
+    return FilmService(
+        storage=storage,
+        cache_storage=InMemoryCacheService(),
+        generations=CacheGenerations(None, ("movies",), refresh_interval=1),
+    )
+
+
+async def test_concurrent_misses_load_once():
+    """
+    Concurrent cache misses on one key make a single storage call
+    """
+    storage = CountingStorage()
+    service = film_service(storage)
+
+    films = await asyncio.gather(*[service.get_by_id("film-1") for _ in range(10)])
+
+    assert storage.calls == 1, "concurrent misses are not coalesced"
+    assert [film.title for film in films] == ["Star Wars"] * 10, "wrong film for followers"
+
+
+async def test_leader_error_reaches_followers():
+    """
+    The storage error of the shared load is raised to every waiter
+    """
+    storage = CountingStorage(error=RuntimeError("storage failed"))
+    service = film_service(storage)
+
+    results = await asyncio.gather(
+        *[service.get_by_id("film-1") for _ in range(5)],
+        return_exceptions=True
+    )
+
+    assert storage.calls == 1, "concurrent misses are not coalesced"
+    assert all(isinstance(result, RuntimeError) for result in results), "error not raised to followers"
+
+
+async def test_cancelling_all_waiters_cancels_load():
+    """
+    The shared load is cancelled only when its last waiter is cancelled
+    """
+    storage = CountingStorage()
+    service = film_service(storage)
+    waiters = [asyncio.ensure_future(service.get_by_id("film-1")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    waiters[0].cancel()
+    await asyncio.sleep(0.01)
+    assert storage.cancelled == 0, "load cancelled while other waiters remain"
+
+    for waiter in waiters[1:]:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert storage.calls == 1, "concurrent misses are not coalesced"
+    assert storage.cancelled == 1, "load not cancelled after all waiters are gone"
+
+
+async def test_key_is_released_after_load():
+    """
+    After the shared call completes the next call with the key runs again
+    """
+    single_flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return len(calls)
+
+    assert await single_flight.do("key", load) == 1
+    assert await single_flight.do("key", load) == 2, "finished call is reused"
+
+
+async def test_leader_deadline_does_not_limit_followers():
+    """
+    The shared call runs under the longest deadline of its waiters,
+    not under the deadline of the request that started it
+    """
+    single_flight = SingleFlight()
+    load_budgets = []
+
+    async def load():
+        await asyncio.sleep(0.05)
+        # срок первого запроса истёк, общий вызов живёт по сроку второго
+        load_budgets.append(deadline.remaining())
+        return "loaded"
+
+    async def waiter(timeout):
+        deadline.set_timeout(timeout)
+        return await single_flight.do("key", load)
+
+    leader = asyncio.ensure_future(waiter(0.02))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(waiter(1))
+
+    with pytest.raises(DeadlineExceededError):
+        await leader
+    assert await follower == "loaded", "follower failed by leader deadline"
+    assert 0.5 < load_budgets[0] < 1, "shared call runs under leader deadline"
+
+
+async def test_expired_waiters_cancel_call():
+    """
+    The shared call is cancelled when the deadlines of all waiters expire
+    """
+    single_flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def load():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def waiter(timeout):
+        deadline.set_timeout(timeout)
+        return await single_flight.do("key", load)
+
+    results = await asyncio.gather(waiter(0.01), waiter(0.02), return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert all(isinstance(result, DeadlineExceededError) for result in results), "waiters not bounded"
+    assert cancelled.is_set(), "call not cancelled after all deadlines expired"